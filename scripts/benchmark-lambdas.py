@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Script: benchmark-lambdas.py
+Purpose: Offline benchmarks for the budget Lambda hot paths against local
+         stand-ins for EC2, SNS and the Slack webhook
+Usage: python3 benchmark-lambdas.py [--sizes 10,1000,10000,100000] [--json results.json]
+Author: Excipient Technologies Cloud Team
+
+Nothing here calls AWS or Slack. EC2 and SNS are replaced by in-process fake
+clients (with configurable per-call latency and throttling) placed in the
+functions' client pool, and SLACK_WEBHOOK_URL points at a local HTTP server
+that adds latency and answers a share of requests with 429 Retry-After.
+Each scenario reports throughput, latency percentiles over its runs and the
+peak traced memory of one extra run.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from fnmatch import fnmatchcase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sample_stats import percentile
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda')
+
+REGIONS = [
+    'us-east-1', 'us-west-2', 'eu-west-1', 'eu-central-1',
+    'ap-southeast-1', 'ap-northeast-1', 'sa-east-1', 'ca-central-1'
+]
+
+INSTANCE_TYPES = ['t3.micro', 't3.medium', 'm5.large', 'm5.xlarge', 'c5.2xlarge', 'r5.large']
+
+
+class FakeEC2:
+    """
+    Minimal thread-safe EC2 client holding one region's synthetic fleet
+
+    Supports the describe_instances paginator, stop_instances and
+    create_tags. Every call sleeps for latency seconds and fails with
+    RequestLimitExceeded at throttle_rate.
+    """
+
+    def __init__(self, region, instances, latency=0.0, throttle_rate=0.0, seed=0):
+        self.meta = type('Meta', (), {'region_name': region})()
+        self.region = region
+        self.instances = instances
+        self.by_id = {instance['InstanceId']: instance for instance in instances}
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.calls = {'describe_instances': 0, 'stop_instances': 0, 'create_tags': 0, 'throttled': 0}
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """Put every instance back into the running state"""
+        for instance in self.instances:
+            instance['State'] = {'Name': 'running'}
+        for name in self.calls:
+            self.calls[name] = 0
+
+    def _call(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+            throttled = self.throttle_rate and self.random.random() < self.throttle_rate
+            if throttled:
+                self.calls['throttled'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            from botocore.exceptions import ClientError
+            raise ClientError(
+                {'Error': {'Code': 'RequestLimitExceeded', 'Message': 'Request limit exceeded.'}},
+                operation
+            )
+
+    def get_paginator(self, operation):
+        return FakePaginator(self)
+
+    def describe_instances(self, Filters=(), InstanceIds=None):
+        matching = [self.by_id[i] for i in InstanceIds] if InstanceIds else self._filter(Filters)
+        self._call('describe_instances')
+        return {'Reservations': [{'Instances': matching}]}
+
+    def stop_instances(self, InstanceIds):
+        self._call('stop_instances')
+        with self.lock:
+            for instance_id in InstanceIds:
+                self.by_id[instance_id]['State'] = {'Name': 'stopping'}
+        return {'StoppingInstances': [{'InstanceId': i} for i in InstanceIds]}
+
+    def create_tags(self, Resources, Tags):
+        self._call('create_tags')
+        return {}
+
+    def _filter(self, filters):
+        matching = self.instances
+        for spec in filters:
+            name, values = spec['Name'], spec['Values']
+            if name == 'instance-state-name':
+                matching = [i for i in matching if i['State']['Name'] in values]
+            elif name.startswith('tag:'):
+                key = name[4:]
+                matching = [
+                    i for i in matching
+                    if any(t['Key'] == key and any(fnmatchcase(t['Value'], v) for v in values) for t in i['Tags'])
+                ]
+        return matching
+
+
+class FakePaginator:
+    """Yields describe_instances pages of PageSize reservations-worth of instances"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Filters=(), PaginationConfig=None):
+        page_size = (PaginationConfig or {}).get('PageSize', 1000)
+        matching = self.client._filter(Filters)
+        for start in range(0, max(len(matching), 1), page_size):
+            self.client._call('describe_instances')
+            yield {'Reservations': [{'Instances': matching[start:start + page_size]}]}
+
+
+class FakeSNS:
+    """SNS client that records published message sizes"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.message_bytes = []
+
+    def publish(self, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.message_bytes.append(len(kwargs['Message'].encode('utf-8')))
+        return {'MessageId': f'bench-{len(self.message_bytes)}'}
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Slack webhook stand-in: adds latency and answers some posts with 429"""
+
+    latency = 0.0
+    rate_limit_rate = 0.0
+    retry_after = '0.1'
+    counts = {'ok': 0, 'rate_limited': 0}
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.latency)
+
+        with self.lock:
+            limited = random.random() < self.rate_limit_rate
+            self.counts['rate_limited' if limited else 'ok'] += 1
+
+        body = b'rate_limited' if limited else b'ok'
+        self.send_response(429 if limited else 200)
+        if limited:
+            self.send_header('Retry-After', self.retry_after)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_webhook_server(latency, rate_limit_rate, retry_after):
+    """
+    Start the local webhook server on a free port
+
+    Returns:
+        tuple: (server, webhook URL)
+    """
+    WebhookHandler.latency = latency
+    WebhookHandler.rate_limit_rate = rate_limit_rate
+    WebhookHandler.retry_after = retry_after
+    server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/services/T000/B000/bench'
+
+
+def build_fleet(size, regions, seed=0):
+    """
+    Build a synthetic fleet spread evenly over regions
+
+    Roughly a fifth of the instances are tagged Production so the tag
+    filters have something to reject.
+
+    Returns:
+        dict: Region -> list of describe_instances entries
+    """
+    rng = random.Random(seed)
+    fleet = {region: [] for region in regions}
+    for index in range(size):
+        region = regions[index % len(regions)]
+        environment = 'Production' if rng.random() < 0.2 else rng.choice(['Development', 'Development', 'dev'])
+        fleet[region].append({
+            'InstanceId': f'i-{index:017x}',
+            'InstanceType': rng.choice(INSTANCE_TYPES),
+            'LaunchTime': datetime(2025, 1, 1),
+            'PrivateIpAddress': f'10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}',
+            'State': {'Name': 'running'},
+            'Tags': [
+                {'Key': 'Environment', 'Value': environment},
+                {'Key': 'Name', 'Value': f'bench-{index}'}
+            ]
+        })
+    return fleet
+
+
+def load_lambda(filename):
+    """
+    Import a Lambda source file (the names contain hyphens)
+
+    Returns:
+        module: The loaded function module
+    """
+    if LAMBDA_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_DIR)
+    name = filename[:-3].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(LAMBDA_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(name, size, iterations, run, setup=None, items=None, trace_memory=True):
+    """
+    Time a scenario over several runs, then trace one more run for peak memory
+
+    Args:
+        name: Scenario name
+        size: Fleet size (or message count) shown in the report
+        iterations: Timed runs
+        run: Callable returning the number of items processed (or None)
+        setup: Callable run untimed before every run
+        items: Items per run when run() doesn't return a count
+        trace_memory: Whether to do the tracemalloc run
+
+    Returns:
+        dict: Scenario result
+    """
+    durations = []
+    processed = 0
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        count = run()
+        durations.append(time.perf_counter() - started)
+        processed += count if count is not None else (items or 0)
+
+    peak = None
+    if trace_memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    total = sum(durations)
+    return {
+        'scenario': name,
+        'size': size,
+        'runs': iterations,
+        'p50_ms': round(percentile(durations, 50) * 1000, 2),
+        'p95_ms': round(percentile(durations, 95) * 1000, 2),
+        'p99_ms': round(percentile(durations, 99) * 1000, 2),
+        'throughput_per_s': round(processed / total, 1) if total else None,
+        'peak_mib': round(peak / 2 ** 20, 2) if peak is not None else None
+    }
+
+
+def benchmark_stop_function(args, sizes):
+    """Scenarios for budget-action-stop-dev.py"""
+    regions = REGIONS[:args.regions]
+    os.environ.update({
+        'SWEEP_REGIONS': ','.join(regions),
+        'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:123456789012:bench',
+        'API_RATE_PER_SECOND': str(args.api_rate),
+        'REGION_TIMEOUT_SECONDS': '600',
+        'COALESCE_WINDOW_SECONDS': '0',
+        'ALERT_STATE_BACKEND': 'memory',
+        'INVENTORY_ENABLED': 'false',
+        'ENFORCERS': 'ec2',
+        'RESUME_ENABLED': 'false',
+        'STOP_MODE': 'all'
+    })
+    module = load_lambda('budget-action-stop-dev.py')
+
+    sns = FakeSNS(args.api_latency)
+    module._client_pool[('sns', module.HOME_REGION, None)] = sns
+    results = []
+
+    for size in sizes:
+        fleet = build_fleet(size, regions, args.seed)
+        clients = {
+            region: FakeEC2(region, instances, args.api_latency, args.throttle_rate, args.seed)
+            for region, instances in fleet.items()
+        }
+        module._client_pool.update({('ec2', region, None): client for region, client in clients.items()})
+
+        def reset():
+            for client in clients.values():
+                client.reset()
+
+        def run_handler(event):
+            module.lambda_handler(event, None)
+            return sum(1 for c in clients.values() for i in c.instances if i['State']['Name'] == 'stopping')
+
+        # One region's sweep: discovery pages interleaved with stop chunks
+        first = regions[0]
+        results.append(measure(
+            'stop_development_instances', len(fleet[first]), args.iterations,
+            lambda: len(module.stop_development_instances(first)['stopped']),
+            setup=reset, trace_memory=not args.no_memory
+        ))
+
+        event = {'detail': {'budgetName': 'Bench-Budget', 'threshold': 100}}
+        results.append(measure(
+            'stop lambda_handler (all)', size, args.iterations,
+            lambda: run_handler(event),
+            setup=reset, trace_memory=not args.no_memory
+        ))
+
+        plan_event = {'detail': {'budgetName': 'Bench-Budget', 'threshold': 100, 'mode': 'dry-run',
+                                 'currentSpend': 4000, 'budgetAmount': 5000}}
+        results.append(measure(
+            'stop lambda_handler (dry-run)', size, args.iterations,
+            lambda: module.lambda_handler(plan_event, None) and None,
+            setup=reset, items=size, trace_memory=not args.no_memory
+        ))
+
+        reset()
+        details = [module.instance_details(i, region) for region, instances in fleet.items() for i in instances]
+        results.append(measure(
+            'send_notification', len(details), args.iterations,
+            lambda: module.send_notification(details, 'Bench-Budget', 100) and None,
+            items=len(details),
+            trace_memory=not args.no_memory
+        ))
+        results[-1]['message_kib'] = round(sns.message_bytes[-1] / 1024, 1) if sns.message_bytes else None
+
+    return results
+
+
+def benchmark_slack_function(args, webhook_url):
+    """Scenarios for budget-action-slack.py"""
+    spool_dir = tempfile.mkdtemp(prefix='slack-spool-bench-')
+    os.environ.update({
+        'SLACK_WEBHOOK_URL': webhook_url,
+        'SLACK_SPOOL_DIR': spool_dir,
+        'COALESCE_WINDOW_SECONDS': '0',
+        'ALERT_STATE_BACKEND': 'memory'
+    })
+    module = load_lambda('budget-action-slack.py')
+    results = []
+
+    budget_data = {
+        'budgetName': 'Bench-Budget',
+        'threshold': 95,
+        'budgetLimit': 5000,
+        'currentSpend': 4750
+    }
+    latencies = []
+
+    def send_all():
+        for _ in range(args.messages):
+            started = time.perf_counter()
+            module.send_slack_notification(budget_data)
+            latencies.append(time.perf_counter() - started)
+        return args.messages
+
+    result = measure('send_slack_notification', args.messages, 1, send_all, trace_memory=not args.no_memory)
+    # Percentiles per message are more useful here than per batch
+    result.update({
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2)
+    })
+    results.append(result)
+
+    runs = iter(range(10 ** 6))
+
+    def run_batch():
+        # Distinct budget names per run so monthly de-duplication doesn't suppress them
+        run = next(runs)
+        module.lambda_handler({'Records': [
+            {'Sns': {'Message': json.dumps(dict(budget_data, budgetName=f'Bench-{run}-{index}'))}}
+            for index in range(args.messages)
+        ]}, None)
+        return args.messages
+
+    results.append(measure(
+        'slack lambda_handler (batch)', args.messages, args.iterations, run_batch,
+        trace_memory=not args.no_memory
+    ))
+    results[-1]['spooled'] = len(os.listdir(spool_dir))
+    return results
+
+
+def print_report(results):
+    header = f"{'scenario':<32} {'size':>8} {'runs':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'items/s':>12} {'peak MiB':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        peak = '-' if r['peak_mib'] is None else f"{r['peak_mib']:.2f}"
+        rate = '-' if r['throughput_per_s'] is None else f"{r['throughput_per_s']:,.0f}"
+        print(f"{r['scenario']:<32} {r['size']:>8} {r['runs']:>5} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} "
+              f"{r['p99_ms']:>10.2f} {rate:>12} {peak:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the budget Lambda hot paths')
+    parser.add_argument('--sizes', default='10,1000,10000,100000', help='Comma-separated fleet sizes')
+    parser.add_argument('--regions', type=int, default=4, help='Regions the fleet is spread over (1-8)')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed runs per scenario')
+    parser.add_argument('--api-latency-ms', type=float, default=2.0, help='Simulated latency per EC2/SNS call')
+    parser.add_argument('--api-rate', type=float, default=1000.0,
+                        help='API_RATE_PER_SECOND for the run; the production default of 10 makes rate limiting dominate')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of EC2 calls that fail with RequestLimitExceeded')
+    parser.add_argument('--webhook-latency-ms', type=float, default=20.0, help='Mean latency of the local webhook')
+    parser.add_argument('--webhook-429-rate', type=float, default=0.1, help='Share of webhook posts answered with 429')
+    parser.add_argument('--retry-after', default='0.1', help='Retry-After value sent with 429 responses')
+    parser.add_argument('--messages', type=int, default=50, help='Slack messages per scenario run')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc run')
+    parser.add_argument('--skip', default='', help='Comma-separated functions to skip: stop, slack')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    args.regions = max(1, min(args.regions, len(REGIONS)))
+    args.api_latency = args.api_latency_ms / 1000
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    skip = set(filter(None, args.skip.split(',')))
+    random.seed(args.seed)
+
+    # Logs and EMF records would swamp the report; silence everything below ERROR
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ['ALERT_STATE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='alert-state-bench-'), 'state.json')
+
+    server, webhook_url = start_webhook_server(args.webhook_latency_ms / 1000, args.webhook_429_rate, args.retry_after)
+    results = []
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if 'stop' not in skip:
+                results.extend(benchmark_stop_function(args, sizes))
+            if 'slack' not in skip:
+                results.extend(benchmark_slack_function(args, webhook_url))
+    finally:
+        server.shutdown()
+
+    print_report(results)
+    print(f"\nWebhook responses: {WebhookHandler.counts['ok']} ok, {WebhookHandler.counts['rate_limited']} rate limited")
+
+    if args.json:
+        with open(args.json, 'w') as output_file:
+            json.dump({'arguments': vars(args), 'results': results}, output_file, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
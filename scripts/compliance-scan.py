@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Script: compliance-scan.py
+Purpose: On-demand required-tag compliance scan of EC2, RDS and S3, between
+         the 24 hour AWS Config evaluation cycles
+Usage: python3 compliance-scan.py [--regions us-east-1,us-west-2] [--output report.csv]
+       python3 compliance-scan.py --input inventory.json [--output report.npz]
+Author: Excipient Technologies Cloud Team
+
+Inventories are pulled concurrently, one task per service and region (S3
+buckets are listed once and their tags fetched in parallel), or read from an
+exported JSON file. Required keys and allowed values come from the same
+policies/ files as the Config rules and SCPs, through TagPolicyEngine. Tags
+are loaded into a resources x keys presence matrix, and compliance is
+computed with numpy over whole columns rather than resource by resource.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from tag_policy_engine import RESOURCE_TYPES, TagPolicyEngine, load_records, tag_dict
+
+SERVICES = ['ec2', 'rds', 's3']
+
+# Instance states worth reporting; terminated instances can't be tagged any more
+EC2_STATES = ['pending', 'running', 'stopping', 'stopped']
+
+# Per-key status codes in the report matrix
+STATUS_OK = 0
+STATUS_MISSING = 1
+STATUS_INVALID = 2
+STATUS_NOT_REQUIRED = 3
+STATUS_UNREADABLE = 4
+STATUS_LABELS = np.array(['ok', 'missing', 'invalid', '-', 'unreadable'])
+
+
+def create_session(profile=None):
+    """
+    Create a boto3 session; boto3 is only needed for live scans
+
+    Args:
+        profile: Optional AWS CLI profile name
+
+    Returns:
+        boto3.session.Session: Session
+    """
+    import boto3
+    return boto3.session.Session(profile_name=profile)
+
+
+def create_client(session, service, region, concurrency):
+    from botocore.config import Config
+    return session.client(service, region_name=region, config=Config(
+        retries={'mode': 'adaptive', 'max_attempts': 10},
+        max_pool_connections=max(10, concurrency)
+    ))
+
+
+def list_regions(session, concurrency):
+    """Regions enabled for the account"""
+    ec2 = create_client(session, 'ec2', session.region_name or 'us-east-1', concurrency)
+    return sorted(region['RegionName'] for region in ec2.describe_regions()['Regions'])
+
+
+def collect_ec2(session, region, concurrency):
+    """EC2 instances in one region as scan records"""
+    ec2 = create_client(session, 'ec2', region, concurrency)
+    records = []
+    paginator = ec2.get_paginator('describe_instances')
+    for page in paginator.paginate(Filters=[{'Name': 'instance-state-name', 'Values': EC2_STATES}],
+                                   PaginationConfig={'PageSize': 1000}):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                records.append({
+                    'resource_type': 'ec2',
+                    'region': region,
+                    'id': instance['InstanceId'],
+                    'tags': instance.get('Tags', [])
+                })
+    return records
+
+
+def collect_rds(session, region, concurrency):
+    """RDS DB instances and clusters in one region as scan records"""
+    rds = create_client(session, 'rds', region, concurrency)
+    records = []
+    for page in rds.get_paginator('describe_db_instances').paginate(PaginationConfig={'PageSize': 100}):
+        for db in page['DBInstances']:
+            records.append({
+                'resource_type': 'rds',
+                'region': region,
+                'id': db['DBInstanceIdentifier'],
+                'arn': db['DBInstanceArn'],
+                'tags': db.get('TagList', [])
+            })
+    for page in rds.get_paginator('describe_db_clusters').paginate(PaginationConfig={'PageSize': 100}):
+        for cluster in page['DBClusters']:
+            records.append({
+                'resource_type': 'rds-cluster',
+                'region': region,
+                'id': cluster['DBClusterIdentifier'],
+                'arn': cluster['DBClusterArn'],
+                'tags': cluster.get('TagList', [])
+            })
+    return records
+
+
+def collect_s3(session, regions, concurrency):
+    """
+    S3 buckets in the scanned regions as scan records
+
+    Buckets are listed once (the listing is global) and each bucket's
+    location and tags are fetched in parallel. A bucket whose location or
+    tags can't be read (e.g. AccessDenied) is still returned, flagged
+    'unreadable', so one bucket doesn't abort the whole inventory.
+    """
+    from botocore.exceptions import ClientError
+
+    s3 = create_client(session, 's3', 'us-east-1', concurrency)
+    buckets = [bucket['Name'] for bucket in s3.list_buckets()['Buckets']]
+    wanted = set(regions)
+
+    def describe(name):
+        try:
+            region = s3.get_bucket_location(Bucket=name).get('LocationConstraint') or 'us-east-1'
+        except ClientError as e:
+            return {'resource_type': 's3', 'region': 'unknown', 'id': name, 'tags': [], 'unreadable': str(e)}
+        if region not in wanted:
+            return None
+        try:
+            tags = s3.get_bucket_tagging(Bucket=name)['TagSet']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'NoSuchTagSet':
+                return {'resource_type': 's3', 'region': region, 'id': name, 'tags': [], 'unreadable': str(e)}
+            tags = []
+        return {'resource_type': 's3', 'region': region, 'id': name, 'tags': tags}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return [record for record in executor.map(describe, buckets) if record]
+
+
+def collect_inventory(session, regions, services, concurrency):
+    """
+    Pull every requested inventory concurrently
+
+    Args:
+        session: boto3 session
+        regions: Regions to scan
+        services: Subset of SERVICES
+        concurrency: Parallel API tasks
+
+    Returns:
+        tuple: (records, errors) where errors maps 'service/region' to a message
+    """
+    collectors = {'ec2': collect_ec2, 'rds': collect_rds}
+    tasks = {
+        f'{service}/{region}': (collectors[service], (session, region, concurrency))
+        for service in services if service in collectors
+        for region in regions
+    }
+    if 's3' in services:
+        tasks['s3/global'] = (collect_s3, (session, regions, concurrency))
+
+    records = []
+    errors = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {name: executor.submit(function, *arguments) for name, (function, arguments) in tasks.items()}
+        for name, future in futures.items():
+            try:
+                records.extend(future.result())
+            except Exception as e:
+                errors[name] = str(e)
+    return records, errors
+
+
+def build_matrix(records, engine):
+    """
+    Evaluate records as a resources x keys status matrix
+
+    Args:
+        records: Scan records with resource_type, region, id and tags;
+                 records flagged 'unreadable' report every required key
+                 as STATUS_UNREADABLE
+        engine: TagPolicyEngine supplying required keys and value tests
+
+    Returns:
+        dict: 'keys', 'resource_type', 'region', 'id' columns, the 'status'
+              matrix (STATUS_* codes) and the 'compliant' column
+    """
+    types = sorted({record['resource_type'] for record in records})
+    required_by_type = {resource_type: engine.required_keys(resource_type) for resource_type in types}
+    keys = list(dict.fromkeys(key for resource_type in types for key in required_by_type[resource_type]))
+    key_index = {key: column for column, key in enumerate(keys)}
+    type_index = {resource_type: code for code, resource_type in enumerate(types)}
+
+    count = len(records)
+    type_codes = np.empty(count, dtype=np.int16)
+    values = np.full((count, len(keys)), None, dtype=object)
+    rows = []
+    columns = []
+
+    # The only per-resource pass: scatter tag values into the matrix
+    for row, record in enumerate(records):
+        type_codes[row] = type_index[record['resource_type']]
+        for key, value in tag_dict(record['tags']).items():
+            column = key_index.get(key)
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+                values[row, column] = value
+
+    presence = np.zeros((count, len(keys)), dtype=bool)
+    presence[rows, columns] = True
+
+    required_table = np.array(
+        [[key in required_by_type[resource_type] for key in keys] for resource_type in types],
+        dtype=bool
+    ).reshape(len(types), len(keys))
+    required = required_table[type_codes]
+
+    # Value checks run once per distinct value, then broadcast back
+    invalid = np.zeros_like(presence)
+    for resource_type, code in type_index.items():
+        for key, allowed in engine.value_tests(resource_type).items():
+            column = key_index.get(key)
+            if column is None:
+                continue
+            selected = np.flatnonzero((type_codes == code) & presence[:, column])
+            if not len(selected):
+                continue
+            distinct, inverse = np.unique(values[selected, column].astype(str), return_inverse=True)
+            verdicts = np.array([allowed(value) for value in distinct], dtype=bool)
+            invalid[selected, column] = ~verdicts[inverse]
+
+    status = np.where(
+        presence,
+        np.where(invalid, STATUS_INVALID, STATUS_OK),
+        np.where(required, STATUS_MISSING, STATUS_NOT_REQUIRED)
+    ).astype(np.uint8)
+
+    # Resources whose tags couldn't be read are neither compliant nor missing
+    unreadable = np.array([bool(record.get('unreadable')) for record in records], dtype=bool)
+    status[unreadable[:, None] & required] = STATUS_UNREADABLE
+    return {
+        'keys': keys,
+        'resource_type': np.array([record['resource_type'] for record in records], dtype=str),
+        'region': np.array([record.get('region', 'unknown') for record in records], dtype=str),
+        'id': np.array([str(record.get('id', '')) for record in records], dtype=str),
+        'status': status,
+        'compliant': ~np.isin(status, (STATUS_MISSING, STATUS_INVALID, STATUS_UNREADABLE)).any(axis=1) & ~unreadable
+    }
+
+
+def summarize(matrix):
+    """Counts per resource type, region and key, computed over whole columns"""
+    status = matrix['status']
+    noncompliant = ~matrix['compliant']
+
+    def counts_by(column):
+        names, inverse = np.unique(column, return_inverse=True)
+        totals = np.bincount(inverse, minlength=len(names))
+        failing = np.bincount(inverse, weights=noncompliant, minlength=len(names)).astype(int)
+        return {name: {'resources': int(total), 'noncompliant': int(fail)}
+                for name, total, fail in zip(names.tolist(), totals, failing)}
+
+    return {
+        'resources': int(len(status)),
+        'noncompliant': int(noncompliant.sum()),
+        'by_type': counts_by(matrix['resource_type']),
+        'by_region': counts_by(matrix['region']),
+        'by_key': {
+            key: {
+                'missing': int(np.count_nonzero(status[:, column] == STATUS_MISSING)),
+                'invalid': int(np.count_nonzero(status[:, column] == STATUS_INVALID)),
+                'unreadable': int(np.count_nonzero(status[:, column] == STATUS_UNREADABLE))
+            }
+            for column, key in enumerate(matrix['keys'])
+        }
+    }
+
+
+def write_report(matrix, path, only_noncompliant=False):
+    """
+    Write the report as CSV (one row per resource, one column per key) or,
+    for .npz paths, as compressed numpy columns
+
+    Returns:
+        int: Rows written
+    """
+    selected = np.flatnonzero(~matrix['compliant']) if only_noncompliant else np.arange(len(matrix['status']))
+
+    if path.endswith('.npz'):
+        np.savez_compressed(
+            path,
+            keys=np.array(matrix['keys'], dtype=str),
+            status_labels=STATUS_LABELS,
+            resource_type=matrix['resource_type'][selected],
+            region=matrix['region'][selected],
+            id=matrix['id'][selected],
+            status=matrix['status'][selected],
+            compliant=matrix['compliant'][selected]
+        )
+        return len(selected)
+
+    labels = STATUS_LABELS[matrix['status'][selected]]
+    with open(path, 'w', newline='') as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(['resource_type', 'region', 'id', 'compliant'] + matrix['keys'])
+        writer.writerows(zip(
+            matrix['resource_type'][selected].tolist(),
+            matrix['region'][selected].tolist(),
+            matrix['id'][selected].tolist(),
+            np.where(matrix['compliant'][selected], 'yes', 'no').tolist(),
+            *labels.T.tolist()
+        ))
+    return len(selected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='On-demand required-tag compliance scan of EC2, RDS and S3')
+    parser.add_argument('--input', help="Scan an exported inventory instead of AWS ('-' for stdin)")
+    parser.add_argument('--type', choices=sorted(RESOURCE_TYPES), help='Type for --input records that do not set resource_type')
+    parser.add_argument('--regions', help='Comma-separated regions (default: every enabled region)')
+    parser.add_argument('--services', default=','.join(SERVICES), help='Comma-separated services to scan: ec2, rds, s3')
+    parser.add_argument('--profile', help='AWS CLI profile for live scans')
+    parser.add_argument('--concurrency', type=int, default=16, help='Parallel inventory API tasks')
+    parser.add_argument('--policy-dir', help='Directory holding the policies (default: TAG_POLICY_DIR or ../policies)')
+    parser.add_argument('--output', default='compliance-report.csv', help='Report path (.csv, or .npz for numpy columns)')
+    parser.add_argument('--only-noncompliant', action='store_true', help='Leave compliant resources out of the report')
+    parser.add_argument('--json', help='Also write the summary to this JSON file')
+    args = parser.parse_args()
+
+    engine = TagPolicyEngine.from_directory(args.policy_dir)
+    timings = {}
+    errors = {}
+
+    started = time.perf_counter()
+    if args.input:
+        records = []
+        for record in load_records(args.input):
+            if 'tags' not in record:
+                record = {'tags': record}
+            record.setdefault('resource_type', args.type)
+            if record['resource_type'] not in RESOURCE_TYPES:
+                parser.error(f"Record {record.get('id')!r} has no valid resource_type; pass --type")
+            records.append(record)
+    else:
+        session = create_session(args.profile)
+        regions = [r.strip() for r in args.regions.split(',') if r.strip()] if args.regions else list_regions(session, args.concurrency)
+        services = [s.strip() for s in args.services.split(',') if s.strip()]
+        print(f"Scanning {', '.join(services)} in {len(regions)} regions...")
+        records, errors = collect_inventory(session, regions, services, args.concurrency)
+    timings['inventory'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matrix = build_matrix(records, engine)
+    summary = summarize(matrix)
+    timings['evaluate'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = write_report(matrix, args.output, args.only_noncompliant)
+    timings['report'] = time.perf_counter() - started
+
+    print(f"Scanned {summary['resources']} resources: {summary['noncompliant']} non-compliant")
+    for resource_type, counts in summary['by_type'].items():
+        print(f"  {resource_type:<12} {counts['resources']:>8} resources  {counts['noncompliant']:>8} non-compliant")
+    for key, counts in summary['by_key'].items():
+        print(f"  {key:<20} {counts['missing']:>8} missing  {counts['invalid']:>8} invalid  {counts['unreadable']:>8} unreadable")
+    for name, message in sorted(errors.items()):
+        print(f"  WARNING {name}: {message}", file=sys.stderr)
+    print(f"Report: {args.output} ({rows} rows)")
+    print('Timings: ' + ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()))
+
+    if args.json:
+        with open(args.json, 'w') as summary_file:
+            json.dump(dict(summary, errors=errors, timings_seconds=timings), summary_file, indent=2)
+
+    return 1 if summary['noncompliant'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
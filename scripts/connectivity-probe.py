@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Script: connectivity-probe.py
+Purpose: Measure latency, loss, TCP connect time and throughput across the
+         VPC peering link for every instance pair, replacing test-connectivity.sh
+Usage: python3 connectivity-probe.py [--instances instance-ids.txt] [--output connectivity-report.json]
+       python3 connectivity-probe.py --local
+Author: Excipient Technologies Cloud Team
+
+Instances are read from instance-ids.txt (written by launch-instances.sh)
+and every ordered pair is probed concurrently. One SSH master connection is
+opened per instance (ControlMaster) and all probe commands are multiplexed
+over it. The probes themselves are a small Python script piped to the
+instance, so nothing has to be installed there: RTT comes from ping (or TCP
+handshakes where ICMP is unavailable), connect times from repeated TCP
+connects to sshd, and throughput from a bulk transfer to a temporary sink on
+the target. --local runs the same probes on this machine against a local
+stand-in target, to check the tool without AWS. Results are summarised as
+percentiles and written to a JSON report; --baseline compares them with an
+earlier report and flags regressions.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import permutations
+
+from sample_stats import percentile
+
+# Runs on the instance (Amazon Linux 2 ships python2 only, so keep it 2/3
+# compatible) and prints one JSON line
+PROBE_SCRIPT = r'''
+import json, re, socket, subprocess, sys, time
+
+def tcp_connect(target, port, count, interval, timeout=3.0):
+    times, failures = [], 0
+    for i in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        started = time.time()
+        try:
+            sock.connect((target, port))
+            times.append((time.time() - started) * 1000.0)
+        except (socket.error, socket.timeout):
+            failures += 1
+        finally:
+            sock.close()
+        if i + 1 < count:
+            time.sleep(interval)
+    return times, failures
+
+def rtt(target, count, interval, port):
+    try:
+        output = subprocess.Popen(
+            ['ping', '-n', '-c', str(count), '-i', str(interval), '-W', '2', target],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        ).communicate()[0].decode('utf-8', 'replace')
+    except OSError:
+        output = None
+    if output and 'packets transmitted' in output:
+        times = [float(value) for value in re.findall(r'time[=<]([\d.]+) ?ms', output)]
+        sent = int(re.search(r'(\d+) packets transmitted', output).group(1))
+        return {'method': 'icmp', 'sent': sent, 'received': len(times), 'rtt_ms': times}
+    times, failures = tcp_connect(target, port, count, interval)
+    return {'method': 'tcp', 'sent': count, 'received': count - failures, 'rtt_ms': times}
+
+def sink(port, timeout):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('0.0.0.0', port))
+    server.listen(1)
+    server.settimeout(timeout)
+    print('ready')
+    sys.stdout.flush()
+    conn = server.accept()[0]
+    conn.settimeout(timeout)
+    received = 0
+    while True:
+        chunk = conn.recv(262144)
+        if not chunk:
+            break
+        received += len(chunk)
+    conn.sendall(str(received).encode())
+    conn.close()
+    return {'bytes': received}
+
+def send(target, port, total, timeout):
+    sock = socket.create_connection((target, port), timeout)
+    sock.settimeout(timeout)
+    block = b'\0' * 262144
+    started = time.time()
+    remaining = total
+    while remaining > 0:
+        sent = sock.send(block[:min(remaining, len(block))])
+        remaining -= sent
+    sock.shutdown(socket.SHUT_WR)
+    acknowledged = int(sock.recv(64).decode() or 0)
+    seconds = time.time() - started
+    sock.close()
+    return {'bytes': acknowledged, 'seconds': seconds}
+
+mode, args = sys.argv[1], sys.argv[2:]
+if mode == 'rtt':
+    result = rtt(args[0], int(args[1]), float(args[2]), int(args[3]))
+elif mode == 'connect':
+    times, failures = tcp_connect(args[0], int(args[1]), int(args[2]), float(args[3]))
+    result = {'connect_ms': times, 'failures': failures}
+elif mode == 'sink':
+    result = sink(int(args[0]), float(args[1]))
+else:
+    result = send(args[0], int(args[1]), int(args[2]), float(args[3]))
+print(json.dumps(result))
+'''
+
+# Picks python3 when the instance has it, python (2.7 on Amazon Linux 2) otherwise
+REMOTE_PYTHON = 'if command -v python3 >/dev/null 2>&1; then exec python3 - "$@"; else exec python - "$@"; fi'
+
+DEFAULT_INSTANCE_FILE = 'instance-ids.txt'
+DEFAULT_THROUGHPUT_PORT = 5201
+
+
+def summarize_samples(samples):
+    """Count, min/max, mean, standard deviation and p50/p90/p99 of samples in ms"""
+    if not samples:
+        return {'count': 0}
+    mean = sum(samples) / len(samples)
+    variance = sum((value - mean) ** 2 for value in samples) / len(samples)
+    summary = {'count': len(samples), 'min': min(samples), 'mean': mean}
+    summary.update({f'p{pct}': percentile(samples, pct) for pct in (50, 90, 99)})
+    summary.update({'max': max(samples), 'stdev': variance ** 0.5})
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in summary.items()}
+
+
+def load_instances(path, key_dir):
+    """
+    Instances listed in instance-ids.txt
+
+    Every PREFIX_PRIVATE_IP entry is an instance; its PREFIX_PUBLIC_IP and
+    PREFIX_KEY_NAME are used to reach it over SSH.
+
+    Returns:
+        list: Dicts with name, public_ip, private_ip and key_path
+    """
+    variables = {}
+    with open(path) as instance_file:
+        for line in instance_file:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                variables[key] = value.strip('"\'')
+
+    instances = []
+    for key in variables:
+        if key.endswith('_PRIVATE_IP'):
+            prefix = key[:-len('_PRIVATE_IP')]
+            key_name = variables.get(f'{prefix}_KEY_NAME')
+            instances.append({
+                'name': prefix.lower(),
+                'public_ip': variables.get(f'{prefix}_PUBLIC_IP'),
+                'private_ip': variables[key],
+                'key_path': os.path.join(os.path.expanduser(key_dir), f'{key_name}.pem') if key_name else None
+            })
+    return instances
+
+
+class SSHTransport:
+    """
+    Runs probe commands on an instance over one shared SSH connection
+
+    open() starts a ControlMaster; every later command reuses it, so
+    concurrent probes don't each pay for a TCP and SSH handshake.
+    """
+
+    def __init__(self, instance, user, control_dir, connect_timeout=10):
+        self.name = instance['name']
+        options = [
+            '-o', 'BatchMode=yes',
+            '-o', 'StrictHostKeyChecking=accept-new',
+            '-o', f'ConnectTimeout={connect_timeout}',
+            '-o', f"ControlPath={os.path.join(control_dir, instance['name'])}"
+        ]
+        if instance.get('key_path'):
+            options = ['-i', instance['key_path']] + options
+        self.base = ['ssh'] + options + [f"{user}@{instance['public_ip']}"]
+
+    def open(self):
+        subprocess.run(
+            self.base[:1] + ['-o', 'ControlMaster=yes', '-o', 'ControlPersist=600', '-N', '-f'] + self.base[1:],
+            check=True, capture_output=True, timeout=60
+        )
+
+    def command(self, args):
+        remote = ' '.join(shlex.quote(arg) for arg in ['sh', '-c', REMOTE_PYTHON, 'probe'] + args)
+        return self.base[:1] + ['-o', 'ControlMaster=no'] + self.base[1:] + [remote]
+
+    def close(self):
+        subprocess.run(self.base[:1] + ['-O', 'exit'] + self.base[1:], capture_output=True, timeout=30)
+
+
+class LocalTransport:
+    """Runs probe commands on this machine, standing in for an instance"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def open(self):
+        pass
+
+    def command(self, args):
+        return [sys.executable, '-'] + args
+
+    def close(self):
+        pass
+
+
+def run_probe(transport, args, timeout):
+    """Run one probe to completion and return its JSON result"""
+    result = subprocess.run(transport.command(args), input=PROBE_SCRIPT, capture_output=True,
+                            text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"{transport.name}: probe {args[0]} failed: {result.stderr.strip()[-300:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def read_line(stream, timeout):
+    """One line from stream, or None if none arrives within timeout seconds"""
+    lines = []
+    reader = threading.Thread(target=lambda: lines.append(stream.readline()), daemon=True)
+    reader.start()
+    reader.join(timeout)
+    return lines[0] if lines else None
+
+
+def measure_throughput(source, target, target_ip, port, size, timeout):
+    """Bulk-send size bytes from source to a temporary sink on target"""
+    sink = subprocess.Popen(target.command(['sink', str(port), str(timeout)]), stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        sink.stdin.write(PROBE_SCRIPT)
+        sink.stdin.close()
+        line = read_line(sink.stdout, timeout)
+        if line is None:
+            raise RuntimeError(f"{target.name}: throughput sink not ready after {timeout}s")
+        if line.strip() != 'ready':
+            raise RuntimeError(f"{target.name}: throughput sink failed: {sink.stderr.read().strip()[-300:]}")
+        result = run_probe(source, ['send', target_ip, str(port), str(size), str(timeout)], timeout + 10)
+        sink.wait(timeout=timeout)
+    finally:
+        if sink.poll() is None:
+            sink.kill()
+    seconds = result['seconds']
+    return {
+        'bytes': result['bytes'],
+        'seconds': round(seconds, 3),
+        'mbps': round(result['bytes'] * 8 / seconds / 1e6, 2) if seconds > 0 else None
+    }
+
+
+def probe_pair(source, target, target_ip, port, args):
+    """
+    Every measurement from one instance to another
+
+    Each probe runs even if an earlier one failed; failures are reported
+    under 'errors' instead of aborting the pair.
+    """
+    result = {'source': source.name, 'target': target.name, 'target_ip': target_ip, 'errors': {}}
+    started = time.perf_counter()
+
+    try:
+        rtt = run_probe(source, ['rtt', target_ip, str(args.count), str(args.interval), str(args.connect_port)],
+                        args.timeout)
+        result['rtt'] = {
+            'method': rtt['method'],
+            'sent': rtt['sent'],
+            'received': rtt['received'],
+            'loss_pct': round(100.0 * (rtt['sent'] - rtt['received']) / rtt['sent'], 2) if rtt['sent'] else None,
+            'ms': summarize_samples(rtt['rtt_ms'])
+        }
+    except Exception as e:
+        result['errors']['rtt'] = str(e)
+
+    try:
+        connect = run_probe(source, ['connect', target_ip, str(args.connect_port), str(args.connect_count),
+                                     str(args.interval)], args.timeout)
+        result['tcp_connect'] = {
+            'port': args.connect_port,
+            'failures': connect['failures'],
+            'ms': summarize_samples(connect['connect_ms'])
+        }
+    except Exception as e:
+        result['errors']['tcp_connect'] = str(e)
+
+    if args.throughput_bytes:
+        try:
+            result['throughput'] = measure_throughput(source, target, target_ip, port, args.throughput_bytes,
+                                                      args.timeout)
+        except Exception as e:
+            result['errors']['throughput'] = str(e)
+
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def pair_failed(pair):
+    """True when the target was unreachable from the source"""
+    rtt = pair.get('rtt')
+    connect = pair.get('tcp_connect')
+    return (not rtt or rtt['received'] == 0) and (not connect or connect['ms']['count'] == 0)
+
+
+def compare_baseline(pairs, baseline, max_regression_pct):
+    """
+    Flag pairs that got slower than in an earlier report
+
+    RTT and connect-time p50/p99 regress when they grow by more than
+    max_regression_pct; throughput when it drops by more than that.
+
+    Returns:
+        list: Regression dicts (pair, metric, baseline, current, change_pct)
+    """
+    previous = {(pair['source'], pair['target']): pair for pair in baseline.get('pairs', [])}
+    regressions = []
+
+    def check(pair, metric, current, before, higher_is_worse=True):
+        if current is None or not before:
+            return
+        change = 100.0 * (current - before) / before
+        if (change if higher_is_worse else -change) > max_regression_pct:
+            regressions.append({
+                'pair': f"{pair['source']}->{pair['target']}", 'metric': metric,
+                'baseline': before, 'current': current, 'change_pct': round(change, 1)
+            })
+
+    for pair in pairs:
+        old = previous.get((pair['source'], pair['target']))
+        if not old:
+            continue
+        for section in ('rtt', 'tcp_connect'):
+            for stat in ('p50', 'p99'):
+                check(pair, f'{section}.{stat}_ms',
+                      pair.get(section, {}).get('ms', {}).get(stat), old.get(section, {}).get('ms', {}).get(stat))
+        check(pair, 'throughput.mbps', pair.get('throughput', {}).get('mbps'),
+              old.get('throughput', {}).get('mbps'), higher_is_worse=False)
+    return regressions
+
+
+def start_local_target():
+    """TCP listener standing in for the target's sshd in --local mode"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(128)
+
+    def accept_loop():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            conn.close()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return server
+
+
+def format_ms(summary):
+    if not summary or not summary.get('count'):
+        return '-'
+    return f"{summary['p50']:.1f}/{summary['p90']:.1f}/{summary['p99']:.1f}"
+
+
+def print_report(report):
+    print(f"\n{'Pair':<16} {'RTT p50/p90/p99 ms':<22} {'Loss':>6} {'Connect p50/p90/p99 ms':<24} {'Mbit/s':>8}")
+    for pair in report['pairs']:
+        rtt = pair.get('rtt', {})
+        loss = f"{rtt['loss_pct']:.0f}%" if rtt.get('loss_pct') is not None else '-'
+        mbps = pair.get('throughput', {}).get('mbps')
+        print(f"{pair['source'] + '->' + pair['target']:<16} {format_ms(rtt.get('ms')):<22} {loss:>6} "
+              f"{format_ms(pair.get('tcp_connect', {}).get('ms')):<24} {mbps if mbps is not None else '-':>8}")
+        for probe, error in pair['errors'].items():
+            print(f"  {probe} error: {error}")
+    for regression in report.get('regressions', []):
+        print(f"REGRESSION {regression['pair']} {regression['metric']}: {regression['baseline']} -> "
+              f"{regression['current']} ({regression['change_pct']:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Probe latency, loss, TCP connect time and throughput between instances')
+    parser.add_argument('--instances', default=DEFAULT_INSTANCE_FILE, help='Instance file written by launch-instances.sh')
+    parser.add_argument('--local', action='store_true', help='Probe a local stand-in target instead of the instances')
+    parser.add_argument('--user', default='ec2-user', help='SSH user')
+    parser.add_argument('--key-dir', default='~/.ssh', help='Directory holding <KEY_NAME>.pem files')
+    parser.add_argument('--count', type=int, default=20, help='RTT samples per pair')
+    parser.add_argument('--interval', type=float, default=0.2, help='Seconds between samples')
+    parser.add_argument('--connect-count', type=int, default=10, help='TCP connects per pair')
+    parser.add_argument('--connect-port', type=int, default=22, help='Target port for TCP connects')
+    parser.add_argument('--throughput-bytes', type=int, default=8 * 1024 * 1024,
+                        help='Bytes sent per pair for the throughput test (0 to skip)')
+    parser.add_argument('--throughput-port', type=int, default=DEFAULT_THROUGHPUT_PORT,
+                        help='First port for throughput sinks; the peer security groups allow all traffic')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds allowed per probe')
+    parser.add_argument('--output', default='connectivity-report.json', help='JSON report path')
+    parser.add_argument('--baseline', help='Earlier report to compare against')
+    parser.add_argument('--max-regression-pct', type=float, default=25.0,
+                        help='Allowed growth in RTT/connect time (or drop in throughput) against --baseline')
+    args = parser.parse_args()
+
+    local_target = None
+    if args.local:
+        local_target = start_local_target()
+        args.connect_port = local_target.getsockname()[1]
+        instances = [{'name': 'east', 'private_ip': '127.0.0.1'}, {'name': 'west', 'private_ip': '127.0.0.1'}]
+        transports = {instance['name']: LocalTransport(instance['name']) for instance in instances}
+    else:
+        instances = load_instances(args.instances, args.key_dir)
+        if len(instances) < 2:
+            parser.error(f"Need at least two instances in {args.instances}")
+        control_dir = tempfile.mkdtemp(prefix='probe-ssh-')
+        transports = {instance['name']: SSHTransport(instance, args.user, control_dir) for instance in instances}
+
+    addresses = {instance['name']: instance['private_ip'] for instance in instances}
+    pairs = list(permutations(sorted(transports), 2))
+    print(f"Probing {len(pairs)} pairs across {len(transports)} instances...")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(len(transports), len(pairs))) as executor:
+        opened = {}
+        for name, future in [(name, executor.submit(transport.open)) for name, transport in transports.items()]:
+            try:
+                future.result()
+                opened[name] = transports[name]
+            except Exception as e:
+                print(f"Could not connect to {name}: {getattr(e, 'stderr', b'') or e}", file=sys.stderr)
+        try:
+            futures = [
+                executor.submit(probe_pair, opened[source], opened[target], addresses[target],
+                                args.throughput_port + index, args)
+                for index, (source, target) in enumerate(pairs)
+                if source in opened and target in opened
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            for transport in opened.values():
+                transport.close()
+            if local_target:
+                local_target.close()
+
+    unreachable = [f'{source}->{target}' for source, target in pairs if source not in opened or target not in opened]
+    report = {
+        'generated': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'mode': 'local' if args.local else 'ssh',
+        'settings': {
+            'count': args.count, 'interval': args.interval, 'connect_count': args.connect_count,
+            'connect_port': args.connect_port, 'throughput_bytes': args.throughput_bytes
+        },
+        'seconds': round(time.perf_counter() - started, 3),
+        'pairs': results,
+        'unreachable': unreachable
+    }
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            report['regressions'] = compare_baseline(results, json.load(baseline_file), args.max_regression_pct)
+
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print_report(report)
+    print(f"\nReport written to {args.output} ({report['seconds']:.1f}s)")
+
+    failed = unreachable + [f"{pair['source']}->{pair['target']}" for pair in results if pair_failed(pair)]
+    if failed:
+        print(f"No connectivity: {', '.join(failed)}")
+    return 1 if failed or report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Script: flow-log-analyzer.py
+Purpose: Single-pass analysis of VPC Flow Logs: top talkers, rejected flows
+         and cross-region peering bytes between the East and West VPCs
+Usage: python3 flow-log-analyzer.py <file|directory|-> [...] [--top 20] [--json report.json]
+Author: Excipient Technologies Cloud Team
+
+Input is flow-log text as delivered to S3 (optionally gzipped, with or
+without the header line) or exported from the CloudWatch log groups created
+by enable-flow-logs.sh (each record prefixed with its ingestion timestamp).
+Files are read in blocks of raw bytes; fields are split without decoding
+and each block is transposed into columns, so counters are updated once per
+block rather than once per record. Top-talker tables are bounded
+heavy-hitter summaries, so memory stays flat however large the dump is.
+"""
+
+import argparse
+import gzip
+import heapq
+import ipaddress
+import json
+import os
+import sys
+import time
+
+# Default (version 2) flow log format
+V2_FIELDS = [
+    'version', 'account-id', 'interface-id', 'srcaddr', 'dstaddr', 'srcport', 'dstport',
+    'protocol', 'packets', 'bytes', 'start', 'end', 'action', 'log-status'
+]
+REQUIRED_FIELDS = ['srcaddr', 'dstaddr', 'dstport', 'protocol', 'packets', 'bytes', 'action']
+
+# VPC CIDRs from create-vpcs.sh
+EAST_VPC_CIDR = '10.0.0.0/16'
+WEST_VPC_CIDR = '192.168.0.0/16'
+
+PROTOCOL_NAMES = {b'1': 'icmp', b'6': 'tcp', b'17': 'udp', b'58': 'icmpv6'}
+
+# Bytes read per block, and entries kept by each heavy-hitter table
+BLOCK_BYTES = 8 * 1024 * 1024
+DEFAULT_CAPACITY = 10000
+ADDRESS_CACHE_LIMIT = 200000
+
+
+class HeavyHitters:
+    """
+    Bounded top-k summary of weighted keys
+
+    Counts are kept exactly until the table holds twice its capacity, then
+    pruned back to the largest capacity entries. A key loses at most the
+    largest pruned count per prune, so the sum of those (error) bounds how
+    far any reported count can be short.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.error = 0
+
+    def merge(self, counts):
+        """Add a block's pre-aggregated counts"""
+        table = self.counts
+        for key, amount in counts.items():
+            table[key] = table.get(key, 0) + amount
+        if len(table) > 2 * self.capacity:
+            self.prune()
+
+    def prune(self):
+        ranked = heapq.nlargest(self.capacity + 1, self.counts.items(), key=lambda item: item[1])
+        if len(ranked) > self.capacity:
+            self.error += ranked[-1][1]
+        self.counts = dict(ranked[:self.capacity])
+
+    def top(self, count):
+        """The count largest keys, highest first"""
+        return heapq.nlargest(count, self.counts.items(), key=lambda item: item[1])
+
+
+class FlowAggregator:
+    """
+    Streaming aggregates over flow-log blocks
+
+    Each block of raw lines is split into rows, filtered, transposed into
+    columns and folded into per-block dicts that are then merged into the
+    bounded tables.
+    """
+
+    def __init__(self, east_cidr=EAST_VPC_CIDR, west_cidr=WEST_VPC_CIDR, capacity=DEFAULT_CAPACITY):
+        self.sides = [
+            ('east', ipaddress.ip_network(east_cidr)),
+            ('west', ipaddress.ip_network(west_cidr))
+        ]
+        self.address_sides = {}
+        self.talkers = HeavyHitters(capacity)
+        self.conversations = HeavyHitters(capacity)
+        self.rejected_sources = HeavyHitters(capacity)
+        self.rejected_ports = HeavyHitters(capacity)
+        self.peering = {}
+        self.totals = {
+            'records': 0,
+            'flows': 0,
+            'no_data': 0,
+            'malformed': 0,
+            'bytes': 0,
+            'packets': 0,
+            'rejected_flows': 0,
+            'rejected_bytes': 0
+        }
+        self.first_start = None
+        self.last_end = None
+
+    def side(self, address):
+        """'east', 'west' or None for an address, cached per raw address"""
+        side = self.address_sides.get(address, False)
+        if side is not False:
+            return side
+        if len(self.address_sides) >= ADDRESS_CACHE_LIMIT:
+            self.address_sides.clear()
+        try:
+            ip = ipaddress.ip_address(address.decode('ascii'))
+            side = next((name for name, network in self.sides if ip in network), None)
+        except (ValueError, UnicodeDecodeError):
+            side = None
+        self.address_sides[address] = side
+        return side
+
+    def add_block(self, lines, layout):
+        """
+        Fold one block of raw flow-log lines into the aggregates
+
+        Args:
+            lines: List of raw bytes lines
+            layout: Field name -> column index for this source
+        """
+        width = max(layout.values()) + 1
+        bytes_at = layout['bytes']
+        packets_at = layout['packets']
+        status_at = layout.get('log-status')
+
+        rows = []
+        for row in map(bytes.split, lines):
+            if not row or row[0] == b'version':
+                continue  # blank line or a header from concatenated files
+            self.totals['records'] += 1
+            if len(row) < width:
+                self.totals['malformed'] += 1
+            elif row[bytes_at] == b'-' or (status_at is not None and row[status_at] != b'OK'):
+                self.totals['no_data'] += 1
+            else:
+                rows.append(row)
+
+        try:
+            byte_counts = [int(value) for value in (row[bytes_at] for row in rows)]
+            packet_counts = [int(value) for value in (row[packets_at] for row in rows)]
+        except ValueError:
+            # A corrupt numeric field: drop the offending rows only
+            valid = [row for row in rows if row[bytes_at].isdigit() and row[packets_at].isdigit()]
+            self.totals['malformed'] += len(rows) - len(valid)
+            rows = valid
+            byte_counts = [int(row[bytes_at]) for row in rows]
+            packet_counts = [int(row[packets_at]) for row in rows]
+        if not rows:
+            return
+
+        columns = list(zip(*rows))
+
+        sources = columns[layout['srcaddr']]
+        destinations = columns[layout['dstaddr']]
+        ports = columns[layout['dstport']]
+        protocols = columns[layout['protocol']]
+        actions = columns[layout['action']]
+
+        self.totals['flows'] += len(rows)
+        self.totals['bytes'] += sum(byte_counts)
+        self.totals['packets'] += sum(packet_counts)
+
+        # One tight loop per column group
+        talkers = {}
+        for src, size in zip(sources, byte_counts):
+            talkers[src] = talkers.get(src, 0) + size
+
+        conversations = {}
+        for key, size in zip(zip(sources, destinations, ports, protocols), byte_counts):
+            conversations[key] = conversations.get(key, 0) + size
+
+        rejected_sources = {}
+        rejected_ports = {}
+        rejected = [index for index, action in enumerate(actions) if action == b'REJECT']
+        for index in rejected:
+            src = sources[index]
+            rejected_sources[src] = rejected_sources.get(src, 0) + 1
+            port_key = (ports[index], protocols[index])
+            rejected_ports[port_key] = rejected_ports.get(port_key, 0) + 1
+        self.totals['rejected_flows'] += len(rejected)
+        self.totals['rejected_bytes'] += sum(byte_counts[index] for index in rejected)
+
+        # Classify each distinct address once per block
+        sides = {address: self.side(address) for address in set(sources).union(destinations)}
+        for index, (src, dst) in enumerate(zip(sources, destinations)):
+            src_side = sides[src]
+            if src_side:
+                dst_side = sides[dst]
+                if dst_side and dst_side != src_side:
+                    stats = self.peering.setdefault((src_side, dst_side, actions[index]), [0, 0, 0])
+                    stats[0] += 1
+                    stats[1] += byte_counts[index]
+                    stats[2] += packet_counts[index]
+
+        self.talkers.merge(talkers)
+        self.conversations.merge(conversations)
+        self.rejected_sources.merge(rejected_sources)
+        self.rejected_ports.merge(rejected_ports)
+
+        if 'start' in layout and 'end' in layout:
+            starts = [int(value) for value in columns[layout['start']] if value.isdigit()]
+            ends = [int(value) for value in columns[layout['end']] if value.isdigit()]
+            if starts:
+                self.first_start = min(starts) if self.first_start is None else min(self.first_start, min(starts))
+            if ends:
+                self.last_end = max(ends) if self.last_end is None else max(self.last_end, max(ends))
+
+    def report(self, top):
+        """Aggregates as a JSON-serialisable dict"""
+        def text(value):
+            return value.decode('ascii', 'replace')
+
+        def protocol_name(value):
+            return PROTOCOL_NAMES.get(value, text(value))
+
+        return {
+            'totals': dict(self.totals),
+            'time_range': {
+                'first_start': self.first_start,
+                'last_end': self.last_end
+            },
+            'top_talkers': [
+                {'srcaddr': text(src), 'bytes': size} for src, size in self.talkers.top(top)
+            ],
+            'top_conversations': [
+                {'srcaddr': text(src), 'dstaddr': text(dst), 'dstport': text(port),
+                 'protocol': protocol_name(protocol), 'bytes': size}
+                for (src, dst, port, protocol), size in self.conversations.top(top)
+            ],
+            'rejected_sources': [
+                {'srcaddr': text(src), 'flows': flows} for src, flows in self.rejected_sources.top(top)
+            ],
+            'rejected_ports': [
+                {'dstport': text(port), 'protocol': protocol_name(protocol), 'flows': flows}
+                for (port, protocol), flows in self.rejected_ports.top(top)
+            ],
+            'peering': [
+                {'direction': f'{src_side} -> {dst_side}', 'action': text(action),
+                 'flows': stats[0], 'bytes': stats[1], 'packets': stats[2]}
+                for (src_side, dst_side, action), stats in sorted(self.peering.items())
+            ],
+            'error_bounds': {
+                'top_talkers': self.talkers.error,
+                'top_conversations': self.conversations.error,
+                'rejected_sources': self.rejected_sources.error,
+                'rejected_ports': self.rejected_ports.error
+            }
+        }
+
+
+def iter_sources(paths):
+    """Expand directories into the flow-log files they contain"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in sorted(os.walk(path)):
+                for name in sorted(names):
+                    if name.endswith(('.log', '.log.gz', '.txt', '.txt.gz', '.gz')):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def open_source(path):
+    """Open a file (gzip detected from its magic bytes) or stdin as a binary stream"""
+    if path == '-':
+        return sys.stdin.buffer
+    with open(path, 'rb') as probe:
+        magic = probe.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def detect_layout(first_line):
+    """
+    Field positions for a source from its first line
+
+    Args:
+        first_line: First raw line (a header, or a data record)
+
+    Returns:
+        tuple: (field -> index dict, whether the first line was a header)
+    """
+    tokens = first_line.split()
+    if tokens and tokens[0] == b'version':
+        fields = [token.decode('ascii') for token in tokens]
+        is_header = True
+    else:
+        fields = list(V2_FIELDS)
+        is_header = False
+        # CloudWatch exports put the ingestion timestamp (ISO 8601, epoch
+        # seconds or epoch milliseconds) before the record: one field more
+        # than the default format, with the version field second
+        if len(tokens) == len(V2_FIELDS) + 1 and tokens[1].isdigit() and len(tokens[1]) <= 2:
+            fields.insert(0, 'timestamp')
+
+    layout = {name: index for index, name in enumerate(fields)}
+    missing = [name for name in REQUIRED_FIELDS if name not in layout]
+    if missing:
+        raise ValueError(f"Flow log format is missing fields: {', '.join(missing)}")
+    return layout, is_header
+
+
+def analyze(paths, aggregator, block_bytes=BLOCK_BYTES):
+    """
+    Stream every source through the aggregator
+
+    Returns:
+        int: Bytes of flow-log text read
+    """
+    read = 0
+    for path in iter_sources(paths):
+        stream = open_source(path)
+        try:
+            lines = stream.readlines(block_bytes)
+            if not lines:
+                continue
+            layout, is_header = detect_layout(lines[0])
+            if is_header:
+                lines = lines[1:]
+            while lines:
+                read += sum(map(len, lines))
+                aggregator.add_block(lines, layout)
+                lines = stream.readlines(block_bytes)
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+    return read
+
+
+def format_bytes(size):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TiB'
+
+
+def print_report(report, elapsed, read):
+    totals = report['totals']
+    print(f"Flows: {totals['flows']:,} ({totals['no_data']:,} no-data, {totals['malformed']:,} malformed) "
+          f"| {format_bytes(totals['bytes'])} | read {format_bytes(read)} in {elapsed:.2f}s")
+    print(f"Rejected: {totals['rejected_flows']:,} flows, {format_bytes(totals['rejected_bytes'])}")
+
+    print("\nCross-region peering (East 10.0.0.0/16 <-> West 192.168.0.0/16):")
+    for entry in report['peering'] or [{'direction': 'none', 'action': '-', 'flows': 0, 'bytes': 0, 'packets': 0}]:
+        print(f"  {entry['direction']:<14} {entry['action']:<7} {entry['flows']:>10,} flows  {format_bytes(entry['bytes']):>12}")
+
+    print("\nTop talkers by bytes sent:")
+    for entry in report['top_talkers']:
+        print(f"  {entry['srcaddr']:<40} {format_bytes(entry['bytes']):>12}")
+
+    print("\nTop conversations:")
+    for entry in report['top_conversations']:
+        print(f"  {entry['srcaddr']} -> {entry['dstaddr']}:{entry['dstport']}/{entry['protocol']}"
+              f"  {format_bytes(entry['bytes'])}")
+
+    print("\nMost rejected sources:")
+    for entry in report['rejected_sources']:
+        print(f"  {entry['srcaddr']:<40} {entry['flows']:>10,} flows")
+
+    print("\nMost rejected destination ports:")
+    for entry in report['rejected_ports']:
+        print(f"  {entry['dstport'] + '/' + entry['protocol']:<16} {entry['flows']:>10,} flows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Single-pass VPC Flow Logs analysis')
+    parser.add_argument('paths', nargs='+', help="Flow-log files or directories (.gz supported), or '-' for stdin")
+    parser.add_argument('--top', type=int, default=10, help='Entries per table')
+    parser.add_argument('--east-cidr', default=EAST_VPC_CIDR, help='East VPC CIDR')
+    parser.add_argument('--west-cidr', default=WEST_VPC_CIDR, help='West VPC CIDR')
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY,
+                        help='Entries kept per heavy-hitter table; bounds memory')
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+
+    aggregator = FlowAggregator(args.east_cidr, args.west_cidr, max(args.capacity, args.top))
+    started = time.perf_counter()
+    try:
+        read = analyze(args.paths, aggregator)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - started
+
+    report = aggregator.report(args.top)
+    print_report(report, elapsed, read)
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(dict(report, elapsed_seconds=round(elapsed, 3), bytes_read=read), report_file, indent=2)
+        print(f"\nReport written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
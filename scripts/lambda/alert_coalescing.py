@@ -0,0 +1,249 @@
+"""
+Module: Budget Alert Coalescing
+Purpose: Merge budget alerts per budget into one digest and suppress
+         thresholds that were already reported
+Used by: budget-action-slack.py, budget-action-stop-dev.py
+Author: Excipient Technologies Cloud Team
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Coalescing configuration
+COALESCE_WINDOW_SECONDS = int(os.environ.get('COALESCE_WINDOW_SECONDS', '900'))
+ALERT_STATE_BACKEND = os.environ.get('ALERT_STATE_BACKEND', 'file')
+ALERT_STATE_PATH = os.environ.get('ALERT_STATE_PATH', '/tmp/budget-alert-state.json')
+
+# Reported keys older than this are pruned so the state stays small
+STATE_RETENTION_SECONDS = 40 * 24 * 3600
+
+# Resources remembered per budget digest; beyond this, alerts that carry
+# resources are never suppressed, since a repeat can't be proven
+MAX_TRACKED_RESOURCES = int(os.environ.get('COALESCE_MAX_TRACKED_RESOURCES', '5000'))
+
+
+class MemoryStateBackend:
+    """
+    Keeps coalescing state in process memory (survives warm invocations only)
+    """
+
+    def __init__(self):
+        self.state = {}
+
+    def load(self):
+        return json.loads(json.dumps(self.state))
+
+    def save(self, state):
+        self.state = state
+
+
+class FileStateBackend:
+    """
+    Keeps coalescing state in a local JSON file, written atomically
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, state):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, self.path)
+
+
+def get_state_backend():
+    """
+    Build the state backend selected by ALERT_STATE_BACKEND
+
+    Any object with load() -> dict and save(dict) methods can be passed to
+    AlertCoalescer instead, e.g. one backed by DynamoDB for shared state.
+
+    Returns:
+        MemoryStateBackend or FileStateBackend
+    """
+    if ALERT_STATE_BACKEND == 'memory':
+        return MemoryStateBackend()
+    return FileStateBackend(ALERT_STATE_PATH)
+
+
+def idempotency_key(budget_name, threshold, period):
+    """
+    Build the key that identifies one threshold crossing of a budget
+
+    Args:
+        budget_name: Budget name
+        threshold: Threshold percentage
+        period: Budget period label (e.g. '2025-12'), or None
+
+    Returns:
+        str: Idempotency key
+    """
+    return f"{budget_name}|{threshold}|{period or '-'}"
+
+
+class AlertCoalescer:
+    """
+    Merges alerts per budget into digests and suppresses repeats
+
+    A threshold is reported once per idempotency key: per budget period
+    when period='monthly' (budgets/*.json are MONTHLY), otherwise per
+    window. Within window_seconds of a budget's last digest, only alerts
+    that escalate past the highest threshold already reported go out.
+    An alert that lists 'resources' (e.g. the resources a stop action just
+    stopped) is only suppressed when every one of them was in a digest
+    already sent in the window, so new destructive actions are always
+    reported. State is kept under namespace so several functions can
+    share a backend.
+    """
+
+    def __init__(self, namespace, backend=None, window_seconds=COALESCE_WINDOW_SECONDS, period='monthly'):
+        self.namespace = namespace
+        self.backend = backend or get_state_backend()
+        self.window_seconds = window_seconds
+        self.period = period
+        self.lock = threading.Lock()
+
+    def current_period(self, now):
+        if self.period == 'monthly':
+            return datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m')
+        return None
+
+    def coalesce(self, alerts, now=None):
+        """
+        Group alerts by budget and decide which ones to send
+
+        Args:
+            alerts: Dicts with at least 'budget_name' and 'threshold', and
+                    optionally 'resources' (resource keys the alert is about)
+            now: Epoch seconds (defaults to the current time)
+
+        Returns:
+            tuple: (digests, suppressed). Each digest has 'budget_name',
+                   'threshold' (highest new threshold), 'thresholds',
+                   'alerts' and 'idempotency_key' (plus what release()
+                   needs to undo it). suppressed lists the
+                   alerts that were not sent.
+        """
+        now = time.time() if now is None else now
+        period = self.current_period(now)
+
+        by_budget = {}
+        for alert in alerts:
+            by_budget.setdefault(alert['budget_name'], []).append(alert)
+
+        digests = []
+        suppressed = []
+
+        with self.lock:
+            stored = self.backend.load()
+            state = stored.setdefault(self.namespace, {})
+            reported = state.setdefault('reported', {})
+            budgets = state.setdefault('budgets', {})
+
+            # Keys without a period only hold for one window
+            expiry = STATE_RETENTION_SECONDS if period else self.window_seconds
+            for key in [k for k, ts in reported.items() if now - ts > expiry]:
+                del reported[key]
+
+            for budget_name, budget_alerts in by_budget.items():
+                last = budgets.get(budget_name, {})
+                in_window = now - last.get('sent_at', 0) < self.window_seconds
+                known = set(last.get('resources') or []) if in_window else set()
+
+                fresh = []
+                for alert in budget_alerts:
+                    key = idempotency_key(budget_name, alert['threshold'], period)
+                    escalates = _as_number(alert['threshold']) > last.get('max_threshold', float('-inf'))
+                    repeat = key in reported or (in_window and not escalates)
+                    if repeat and alert.get('resources') and (last.get('resources') is None or not known.issuperset(alert['resources'])):
+                        # Something new happened (e.g. more resources stopped): always report it
+                        fresh.append(alert)
+                    elif repeat:
+                        suppressed.append(alert)
+                    elif any(a['threshold'] == alert['threshold'] for a in fresh):
+                        suppressed.append(alert)
+                    else:
+                        fresh.append(alert)
+
+                if not fresh:
+                    continue
+
+                fresh.sort(key=lambda a: _as_number(a['threshold']))
+                top = fresh[-1]
+                for alert in fresh:
+                    reported[idempotency_key(budget_name, alert['threshold'], period)] = now
+
+                top_value = _as_number(top['threshold'])
+                if in_window:
+                    top_value = max(top_value, last.get('max_threshold', top_value))
+                resources = known.union(*(alert.get('resources') or () for alert in fresh))
+                budgets[budget_name] = {
+                    'sent_at': now,
+                    'max_threshold': top_value,
+                    'resources': sorted(resources) if len(resources) <= MAX_TRACKED_RESOURCES else None
+                }
+
+                digests.append({
+                    'budget_name': budget_name,
+                    'threshold': top['threshold'],
+                    'thresholds': [alert['threshold'] for alert in fresh],
+                    'alerts': fresh,
+                    'idempotency_key': idempotency_key(budget_name, top['threshold'], period),
+                    'period': period,
+                    'sent_at': now,
+                    'previous': last
+                })
+
+            self.backend.save(stored)
+
+        return digests, suppressed
+
+    def release(self, digests):
+        """
+        Undo coalesce() for digests that could not be delivered
+
+        Their thresholds are no longer marked as reported and the budget's
+        window goes back to what it was, so the next invocation sends them.
+        Entries written by a later coalesce() are left alone.
+
+        Args:
+            digests: Digests returned by coalesce()
+        """
+        with self.lock:
+            stored = self.backend.load()
+            state = stored.setdefault(self.namespace, {})
+            reported = state.setdefault('reported', {})
+            budgets = state.setdefault('budgets', {})
+
+            for digest in digests:
+                budget_name = digest['budget_name']
+                for alert in digest['alerts']:
+                    key = idempotency_key(budget_name, alert['threshold'], digest['period'])
+                    if reported.get(key) == digest['sent_at']:
+                        del reported[key]
+
+                if budgets.get(budget_name, {}).get('sent_at') == digest['sent_at']:
+                    if digest['previous']:
+                        budgets[budget_name] = digest['previous']
+                    else:
+                        del budgets[budget_name]
+
+            self.backend.save(stored)
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('-inf')
@@ -6,12 +6,46 @@ Author: Excipient Technologies Cloud Team
 """
 
 import json
-import urllib3
 import os
-from datetime import datetime
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
-# Initialize HTTP client
-http = urllib3.PoolManager()
+from alert_coalescing import AlertCoalescer
+from instrumentation import IMPORT_PROFILE, emit_metrics, is_enabled, lazy_import, log, profile_imports, timer
+
+# Delivery configuration
+SLACK_CONNECT_TIMEOUT = float(os.environ.get('SLACK_CONNECT_TIMEOUT', '3'))
+SLACK_READ_TIMEOUT = float(os.environ.get('SLACK_READ_TIMEOUT', '5'))
+SLACK_MAX_RETRIES = int(os.environ.get('SLACK_MAX_RETRIES', '3'))
+SLACK_MAX_RETRY_AFTER = float(os.environ.get('SLACK_MAX_RETRY_AFTER', '10'))
+SLACK_DELIVERY_CONCURRENCY = int(os.environ.get('SLACK_DELIVERY_CONCURRENCY', '8'))
+SLACK_SPOOL_DIR = os.environ.get('SLACK_SPOOL_DIR', '/tmp/slack-spool')
+
+# Spooled messages that can never be delivered (a 4xx other than 429, such as
+# a revoked webhook or channel_not_found) or that failed SLACK_SPOOL_MAX_ATTEMPTS
+# times are moved to the dead-letter directory so they don't block newer ones.
+# /tmp belongs to one Lambda container: point SLACK_SPOOL_DIR at an EFS mount
+# for replays to see messages spooled by other containers.
+SLACK_SPOOL_MAX_ATTEMPTS = int(os.environ.get('SLACK_SPOOL_MAX_ATTEMPTS', '5'))
+SLACK_DEAD_LETTER_DIR = os.environ.get('SLACK_DEAD_LETTER_DIR', os.path.join(SLACK_SPOOL_DIR, 'dead-letter'))
+
+# Alert coalescing state (per budget period), see alert_coalescing.py
+coalescer = AlertCoalescer('budget-action-slack', period='monthly')
+
+# HTTP client: keep-alive pool shared by all delivery threads, with explicit
+# timeouts and retries handled by post_to_slack. urllib3 is only imported and
+# the pool built on the first delivery; this function never loads boto3.
+_http = None
+_http_lock = threading.Lock()
+
+# Dependencies reported by the import-time profile (IMPORT_PROFILE=true or --profile-imports)
+PROFILED_IMPORTS = ['urllib3', 'alert_coalescing', 'instrumentation', 'concurrent.futures', 'uuid']
 
 def lambda_handler(event, context):
     """
@@ -22,52 +56,148 @@ def lambda_handler(event, context):
         context: Lambda context object
         
     Returns:
-        dict: Status of Slack notification
+        dict: Status of the Slack notification for each SNS record
     """
     
-    print(f"Budget alert received at {datetime.now()}")
-    print(f"Event: {json.dumps(event, indent=2)}")
+    log('INFO', 'Budget alert received')
+    if is_enabled('DEBUG'):
+        log('DEBUG', 'Event received', event=event)
     
-    # Parse SNS message
     try:
-        # Extract message from SNS
-        sns_message = event['Records'][0]['Sns']['Message']
-        
-        # Parse budget data
-        if isinstance(sns_message, str):
-            budget_data = json.loads(sns_message)
-        else:
-            budget_data = sns_message
-        
-        # Send to Slack
-        send_slack_notification(budget_data)
+        return handle_event(event)
+    finally:
+        emit_metrics()
+
+
+def handle_event(event):
+    """
+    Route one invocation to spool replay or budget alert delivery
+    
+    Args:
+        event: SNS event, or {"action": "replay"}
         
+    Returns:
+        dict: Lambda response
+    """
+    
+    # Scheduled replay of messages that previously failed to deliver
+    if event.get('action') == 'replay':
+        replayed = replay_spooled_messages()
         return {
             'statusCode': 200,
-            'body': json.dumps('Slack notification sent successfully')
+            'body': json.dumps(replayed)
         }
+    
+    # Parse every SNS record; SNS may deliver several budget alerts at once
+    records = event.get('Records', [])
+    results = [None] * len(records)
+    alerts = []
+    
+    for index, record in enumerate(records):
+        try:
+            sns_message = record['Sns']['Message']
+            
+            # Parse budget data
+            if isinstance(sns_message, str):
+                budget_data = json.loads(sns_message)
+            else:
+                budget_data = sns_message
+        except Exception as e:
+            log('ERROR', 'Error parsing record', record=index, error=str(e))
+            results[index] = {'record': index, 'status': 'error', 'error': str(e)}
+            continue
         
-    except Exception as e:
-        print(f"Error processing event: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f'Error: {str(e)}')
-        }
+        if not isinstance(budget_data, dict):
+            error = f'Budget message is {type(budget_data).__name__}, expected an object'
+            log('ERROR', 'Error parsing record', record=index, error=error)
+            results[index] = {'record': index, 'status': 'error', 'error': error}
+            continue
+        
+        alerts.append({
+            'record': index,
+            'budget_name': budget_data.get('budgetName', 'Unknown Budget'),
+            'threshold': budget_data.get('threshold', 'Unknown'),
+            'budget_data': budget_data
+        })
+    
+    # Merge alerts per budget into one digest and drop thresholds already reported
+    digests, suppressed = coalescer.coalesce(alerts)
+    for alert in suppressed:
+        results[alert['record']] = {'record': alert['record'], 'status': 'suppressed'}
+    
+    def send(digest):
+        top = digest['alerts'][-1]
+        budget_data = dict(top['budget_data'], thresholds=digest['thresholds'])
+        try:
+            deliveries = send_slack_notification(budget_data)
+            outcome = {'status': delivery_status(deliveries), 'deliveries': deliveries}
+        except Exception as e:
+            log('ERROR', 'Error processing record', record=top['record'], error=str(e))
+            outcome = {'status': 'error', 'error': str(e)}
+        if outcome['status'] == 'error':
+            # Not delivered and not spooled for replay: forget the digest so a redelivery reports it again
+            coalescer.release([digest])
+        return [dict(outcome, record=alert['record'], digest=digest['idempotency_key']) for alert in digest['alerts']]
+    
+    # Send to Slack
+    if digests:
+        with ThreadPoolExecutor(max_workers=max(1, min(SLACK_DELIVERY_CONCURRENCY, len(digests)))) as executor:
+            for digest_results in executor.map(send, digests):
+                for result in digest_results:
+                    results[result['record']] = result
+    
+    errors = sum(1 for r in results if r['status'] == 'error')
+    sent = sum(1 for r in results if r['status'] == 'sent')
+    partial = sum(1 for r in results if r['status'] == 'partial')
+    spooled = sum(1 for r in results if r['status'] == 'spooled')
+    
+    return {
+        'statusCode': 500 if records and errors == len(records) else 200,
+        'body': json.dumps({
+            'message': f'Processed {len(records)} records into {len(digests)} digests: {sent} sent, {partial} partially sent, {spooled} spooled, {len(suppressed)} suppressed, {errors} errors',
+            'records': results
+        })
+    }
+
+
+def delivery_status(deliveries):
+    """
+    Summarise per-target delivery results into one digest status
+    
+    Args:
+        deliveries: Results from deliver_slack_message
+        
+    Returns:
+        str: 'sent' if every target received it, 'partial' if some did,
+             'spooled' if none did but some await replay, otherwise 'error'
+    """
+    
+    statuses = [delivery['status'] for delivery in deliveries]
+    if statuses and all(status == 'sent' for status in statuses):
+        return 'sent'
+    if 'sent' in statuses:
+        return 'partial'
+    if 'spooled' in statuses:
+        return 'spooled'
+    return 'error'
 
 
 def send_slack_notification(budget_data):
     """
-    Format and send Slack notification
+    Format and send Slack notification to every configured target
     
     Args:
         budget_data: Dictionary containing budget alert information
+        
+    Returns:
+        list: Delivery result per webhook/channel target
     """
     
-    # Get Slack webhook URL from environment variable
-    slack_webhook_url = os.environ.get('SLACK_WEBHOOK_URL')
+    # Get Slack webhook targets from environment variables
+    targets = get_slack_targets()
     
-    if not slack_webhook_url:
-        print("SLACK_WEBHOOK_URL environment variable not set")
+    if not targets:
+        log('ERROR', 'SLACK_WEBHOOK_URL environment variable not set')
         raise ValueError("Slack webhook URL not configured")
     
     # Extract budget information
@@ -76,165 +206,297 @@ def send_slack_notification(budget_data):
     current_spend = budget_data.get('currentSpend', 0)
     budget_limit = budget_data.get('budgetLimit', 0)
     percentage = budget_data.get('percentage', 0)
+    thresholds = budget_data.get('thresholds', [threshold])
+    if budget_data.get('notificationType') == 'FORECASTED':
+        # Sent ahead of the crossing by spend-forecast.py; percentage is the projection
+        try:
+            forecast = f"${float(budget_data.get('forecastedSpend', 0)):,.2f}"
+        except (TypeError, ValueError):
+            forecast = 'unknown'
+        budget_name = f"{budget_name} (forecast: {forecast} by month end)"
     
-    # Determine severity and emoji
-    severity_config = get_severity_config(threshold)
+    # Fill the precompiled template for this severity tier
+    tier = select_severity_tier(threshold)
+    encoded_message = render_template(tier['template'], {
+        'budget_name': budget_name,
+        'threshold': threshold,
+        'thresholds_crossed': ', '.join(f'{t}%' for t in thresholds),
+        'percentage': percentage,
+        'budget_limit': f'{budget_limit:,.2f}',
+        'current_spend': f'{current_spend:,.2f}',
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
+    })
     
-    # Build Slack message
-    slack_message = {
-        'username': 'AWS Budget Monitor',
-        'icon_emoji': ':money_with_wings:',
-        'blocks': [
-            {
-                'type': 'header',
-                'text': {
-                    'type': 'plain_text',
-                    'text': f'{severity_config["emoji"]} AWS Budget Alert',
-                    'emoji': True
-                }
-            },
-            {
-                'type': 'section',
-                'fields': [
-                    {
-                        'type': 'mrkdwn',
-                        'text': f'*Budget Name:*\n{budget_name}'
-                    },
-                    {
-                        'type': 'mrkdwn',
-                        'text': f'*Severity:*\n{severity_config["level"]}'
-                    }
-                ]
-            },
-            {
-                'type': 'section',
-                'fields': [
-                    {
-                        'type': 'mrkdwn',
-                        'text': f'*Threshold:*\n{threshold}%'
-                    },
-                    {
-                        'type': 'mrkdwn',
-                        'text': f'*Current Usage:*\n{percentage}%'
-                    }
-                ]
-            },
-            {
-                'type': 'section',
-                'fields': [
-                    {
-                        'type': 'mrkdwn',
-                        'text': f'*Budget Limit:*\n${budget_limit:,.2f}'
-                    },
-                    {
-                        'type': 'mrkdwn',
-                        'text': f'*Current Spend:*\n${current_spend:,.2f}'
-                    }
-                ]
-            },
-            {
-                'type': 'divider'
-            },
-            {
-                'type': 'section',
-                'text': {
-                    'type': 'mrkdwn',
-                    'text': severity_config['message']
-                }
-            },
-            {
-                'type': 'section',
-                'text': {
-                    'type': 'mrkdwn',
-                    'text': '*Recommended Actions:*'
-                }
-            },
-            {
-                'type': 'section',
-                'text': {
-                    'type': 'mrkdwn',
-                    'text': get_recommended_actions(threshold)
-                }
-            },
-            {
-                'type': 'actions',
-                'elements': [
-                    {
-                        'type': 'button',
-                        'text': {
-                            'type': 'plain_text',
-                            'text': 'View Budget Dashboard',
-                            'emoji': True
-                        },
-                        'url': 'https://console.aws.amazon.com/billing/home#/budgets',
-                        'style': 'primary'
-                    },
-                    {
-                        'type': 'button',
-                        'text': {
-                            'type': 'plain_text',
-                            'text': 'Cost Explorer',
-                            'emoji': True
-                        },
-                        'url': 'https://console.aws.amazon.com/cost-management/home#/cost-explorer'
-                    }
-                ]
-            },
-            {
-                'type': 'context',
-                'elements': [
-                    {
-                        'type': 'mrkdwn',
-                        'text': f'Alert triggered at {datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")} | Automated notification from AWS Lambda'
-                    }
-                ]
-            }
-        ]
-    }
+    return deliver_slack_message(encoded_message, targets)
+
+
+def get_slack_targets():
+    """
+    Build the list of webhook/channel targets from the environment
     
-    # Add color coding to message based on severity
-    if threshold >= 100:
-        slack_message['attachments'] = [
-            {
-                'color': '#dc3545',  # Red
-                'text': '⚠️ CRITICAL: Budget limit exceeded!'
-            }
-        ]
-    elif threshold >= 85:
-        slack_message['attachments'] = [
-            {
-                'color': '#ffc107',  # Yellow
-                'text': '⚠️ WARNING: Approaching budget limit'
-            }
-        ]
-    else:
-        slack_message['attachments'] = [
-            {
-                'color': '#17a2b8',  # Blue
-                'text': 'ℹ️ INFO: Budget threshold reached'
-            }
-        ]
+    SLACK_WEBHOOK_URL and the comma-separated SLACK_WEBHOOK_URLS are combined.
+    If SLACK_CHANNELS is set, every webhook posts once per channel.
     
-    # Send to Slack
-    try:
-        encoded_data = json.dumps(slack_message).encode('utf-8')
+    Returns:
+        list: (webhook_url, channel or None) tuples
+    """
+    webhooks = []
+    for url in [os.environ.get('SLACK_WEBHOOK_URL', '')] + os.environ.get('SLACK_WEBHOOK_URLS', '').split(','):
+        url = url.strip()
+        if url and url not in webhooks:
+            webhooks.append(url)
+    
+    channels = [c.strip() for c in os.environ.get('SLACK_CHANNELS', '').split(',') if c.strip()]
+    
+    return [(url, channel) for url in webhooks for channel in (channels or [None])]
+
+
+def deliver_slack_message(encoded_message, targets):
+    """
+    Post a message to all targets concurrently, spooling any failures
+    
+    Args:
+        encoded_message: Serialized Slack message payload (JSON bytes)
+        targets: (webhook_url, channel or None) tuples
         
-        response = http.request(
-            'POST',
-            slack_webhook_url,
-            body=encoded_data,
-            headers={'Content-Type': 'application/json'}
-        )
+    Returns:
+        list: {'target', 'status', 'http_status'} per target, in target
+              order; status is 'sent', 'spooled' or 'dead-lettered'
+    """
+    
+    def deliver(target):
+        url, channel = target
+        encoded_data = encoded_message
+        if channel:
+            # Splice the channel override in as the first key of the JSON object
+            encoded_data = b'{"channel": ' + json.dumps(channel).encode('utf-8') + b', ' + encoded_message[1:]
         
-        if response.status == 200:
-            print("Slack notification sent successfully")
-        else:
-            print(f"Failed to send Slack notification. Status: {response.status}")
-            print(f"Response: {response.data.decode('utf-8')}")
+        sent, http_status, error = post_to_slack(url, encoded_data)
+        
+        if sent:
+            log('INFO', 'Slack notification sent', target=channel or 'default')
+            return {'target': channel or 'default', 'status': 'sent', 'http_status': http_status}
+        
+        log('ERROR', 'Failed to send Slack notification', target=channel or 'default', http_status=http_status, error=error)
+        status = spool_message(url, encoded_data, error, http_status)
+        return {'target': channel or 'default', 'status': status, 'http_status': http_status}
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(SLACK_DELIVERY_CONCURRENCY, len(targets)))) as executor:
+        return list(executor.map(deliver, targets))
+
+
+def get_http_pool():
+    """
+    Get the shared urllib3 PoolManager, creating it on first use
+    
+    Returns:
+        urllib3.PoolManager shared across threads and warm invocations
+    """
+    global _http
+    
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                urllib3 = lazy_import('urllib3')
+                _http = urllib3.PoolManager(
+                    maxsize=SLACK_DELIVERY_CONCURRENCY,
+                    timeout=urllib3.Timeout(connect=SLACK_CONNECT_TIMEOUT, read=SLACK_READ_TIMEOUT),
+                    retries=False
+                )
+    return _http
+
+
+def post_to_slack(url, encoded_data):
+    """
+    POST a payload to a Slack webhook, honouring 429 Retry-After
+    
+    Server errors and connection failures are retried with jittered
+    exponential backoff. A Retry-After longer than SLACK_MAX_RETRY_AFTER
+    is not waited out; the message is left for the spool instead.
+    
+    Args:
+        url: Slack webhook URL
+        encoded_data: JSON payload bytes
+        
+    Returns:
+        tuple: (sent, http_status or None, error message or None)
+    """
+    http = get_http_pool()
+    urllib3 = lazy_import('urllib3')
+    http_status = None
+    error = None
+    
+    for attempt in range(SLACK_MAX_RETRIES + 1):
+        delay = min(SLACK_MAX_RETRY_AFTER, random.uniform(0, 0.5 * (2 ** attempt)))
+        try:
+            with timer('webhook'):
+                response = http.request(
+                    'POST',
+                    url,
+                    body=encoded_data,
+                    headers={'Content-Type': 'application/json'}
+                )
+            http_status = response.status
+            
+            if response.status == 200:
+                return True, http_status, None
             
-    except Exception as e:
-        print(f"Error sending Slack notification: {str(e)}")
-        raise
+            error = response.data.decode('utf-8', errors='replace')
+            
+            if response.status == 429:
+                delay = retry_after_seconds(response.headers.get('Retry-After'), delay)
+                if delay > SLACK_MAX_RETRY_AFTER:
+                    break
+            elif response.status < 500:
+                # Client errors (bad payload, revoked webhook) won't succeed on retry
+                break
+        except urllib3.exceptions.HTTPError as e:
+            error = str(e)
+        
+        if attempt < SLACK_MAX_RETRIES:
+            time.sleep(delay)
+    
+    return False, http_status, error
+
+
+def is_permanent_failure(http_status):
+    """Whether a webhook response means retrying can never succeed (4xx other than 429)"""
+    return http_status is not None and 400 <= http_status < 500 and http_status != 429
+
+
+def retry_after_seconds(value, fallback):
+    """
+    Seconds to wait from a Retry-After header
+    
+    RFC 9110 allows either a number of seconds or an HTTP date.
+    
+    Args:
+        value: Header value, or None
+        fallback: Delay used when the header is missing or unreadable
+        
+    Returns:
+        float: Seconds to wait, never negative
+    """
+    if not value:
+        return fallback
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return fallback
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def spool_message(url, encoded_data, error, http_status=None):
+    """
+    Write an undelivered message to the local spool directory for replay
+    
+    Each message is one JSON file, written atomically so a crash never
+    leaves a half-written entry. Messages rejected permanently go straight
+    to the dead-letter directory instead.
+    
+    Args:
+        url: Slack webhook URL the message was meant for
+        encoded_data: JSON payload bytes
+        error: Last delivery error
+        http_status: Last HTTP status, if any
+        
+    Returns:
+        str: 'spooled' or 'dead-lettered'
+    """
+    permanent = is_permanent_failure(http_status)
+    directory = SLACK_DEAD_LETTER_DIR if permanent else SLACK_SPOOL_DIR
+    try:
+        os.makedirs(directory, exist_ok=True)
+        name = f"{time.time_ns()}-{lazy_import('uuid').uuid4().hex}.json"
+        write_spool_entry(os.path.join(directory, name), {
+            'url': url,
+            'payload': encoded_data.decode('utf-8'),
+            'error': error,
+            'http_status': http_status,
+            'attempts': 1,
+            'spooled_at': datetime.now().isoformat()
+        })
+        if permanent:
+            log('ERROR', 'Slack rejected message permanently, dead-lettered', spool_entry=name, http_status=http_status)
+        else:
+            log('WARNING', 'Spooled undelivered Slack message', spool_entry=name)
+    except OSError as e:
+        log('ERROR', 'Error spooling Slack message', error=str(e))
+    return 'dead-lettered' if permanent else 'spooled'
+
+
+def write_spool_entry(path, entry):
+    """
+    Atomically write a spool entry (temporary file, fsync, rename)
+    
+    Args:
+        path: Final spool file path
+        entry: JSON-serialisable spool entry
+    """
+    temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(temp_path, 'w') as spool_file:
+        json.dump(entry, spool_file)
+        spool_file.flush()
+        os.fsync(spool_file.fileno())
+    os.replace(temp_path, path)
+
+
+def replay_spooled_messages(limit=100):
+    """
+    Retry delivery of spooled messages, oldest first
+    
+    A message Slack rejects permanently, or that has now failed
+    SLACK_SPOOL_MAX_ATTEMPTS times, is moved to SLACK_DEAD_LETTER_DIR, so
+    the oldest entries can't starve newer ones.
+    
+    Args:
+        limit: Maximum number of messages to replay in one call
+        
+    Returns:
+        dict: Counts of 'sent', 'dead_lettered' and 'remaining' messages
+    """
+    try:
+        names = sorted(n for n in os.listdir(SLACK_SPOOL_DIR) if n.endswith('.json'))
+    except FileNotFoundError:
+        names = []
+    
+    def replay(name):
+        path = os.path.join(SLACK_SPOOL_DIR, name)
+        with open(path) as spool_file:
+            entry = json.load(spool_file)
+        
+        sent, http_status, error = post_to_slack(entry['url'], entry['payload'].encode('utf-8'))
+        if sent:
+            os.remove(path)
+            return 'sent'
+        
+        entry['attempts'] = entry.get('attempts', 1) + 1
+        entry['error'] = error
+        entry['http_status'] = http_status
+        if is_permanent_failure(http_status) or entry['attempts'] >= SLACK_SPOOL_MAX_ATTEMPTS:
+            os.makedirs(SLACK_DEAD_LETTER_DIR, exist_ok=True)
+            write_spool_entry(os.path.join(SLACK_DEAD_LETTER_DIR, name), entry)
+            os.remove(path)
+            log('ERROR', 'Dead-lettered spooled Slack message', spool_entry=name,
+                attempts=entry['attempts'], http_status=http_status)
+            return 'dead-lettered'
+        
+        write_spool_entry(path, entry)
+        return 'spooled'
+    
+    with ThreadPoolExecutor(max_workers=max(1, SLACK_DELIVERY_CONCURRENCY)) as executor:
+        outcomes = list(executor.map(replay, names[:limit]))
+    
+    sent = outcomes.count('sent')
+    dead_lettered = outcomes.count('dead-lettered')
+    log('INFO', 'Replayed spooled Slack messages', sent=sent, dead_lettered=dead_lettered, spooled=len(names))
+    return {'sent': sent, 'dead_lettered': dead_lettered, 'remaining': len(names) - sent - dead_lettered}
 
 
 def get_severity_config(threshold):
@@ -248,30 +510,12 @@ def get_severity_config(threshold):
         dict: Severity configuration
     """
     
-    if threshold >= 100:
-        return {
-            'level': '🔴 CRITICAL',
-            'emoji': '🚨',
-            'message': '⚠️ *CRITICAL ALERT:* Your budget limit has been exceeded! Immediate action required.'
-        }
-    elif threshold >= 90:
-        return {
-            'level': '🟠 HIGH',
-            'emoji': '⚠️',
-            'message': '⚠️ *HIGH ALERT:* You are very close to exceeding your budget limit.'
-        }
-    elif threshold >= 80:
-        return {
-            'level': '🟡 MEDIUM',
-            'emoji': '⚡',
-            'message': '⚡ *MEDIUM ALERT:* Your spending is trending towards the budget limit.'
-        }
-    else:
-        return {
-            'level': '🟢 LOW',
-            'emoji': 'ℹ️',
-            'message': 'ℹ️ *INFO:* Budget threshold reached. Monitoring recommended.'
-        }
+    tier = select_severity_tier(threshold)
+    return {
+        'level': tier['level'],
+        'emoji': tier['emoji'],
+        'message': tier['message']
+    }
 
 
 def get_recommended_actions(threshold):
@@ -285,41 +529,348 @@ def get_recommended_actions(threshold):
         str: Markdown formatted recommended actions
     """
     
-    if threshold >= 100:
-        return '''
-• 🛑 Stop all non-critical workloads immediately
-• 🔍 Review Cost Explorer for unexpected charges
-• 📧 Notify department head and finance team
-• 🔒 Enable spending controls via Budget Actions
-• 📊 Schedule emergency cost review meeting
-        '''.strip()
-    elif threshold >= 90:
-        return '''
-• 🔍 Analyze current spending patterns in Cost Explorer
-• 💰 Identify and stop unused resources
-• 📊 Review Reserved Instance utilization
-• ⚙️ Implement cost optimization recommendations
-• 📧 Alert team leads of spending situation
-        '''.strip()
-    elif threshold >= 80:
-        return '''
-• 📊 Monitor daily spending trends
-• 🔍 Review recent resource deployments
-• 💾 Check for over-provisioned resources
-• 🔄 Consider auto-scaling adjustments
-• 📝 Update forecasts and projections
-        '''.strip()
-    else:
-        return '''
-• 📈 Continue monitoring spending trends
-• 🔍 Regular cost optimization reviews
-• 📝 Update team on budget status
-• ✅ Maintain current cost controls
-        '''.strip()
+    return select_severity_tier(threshold)['recommended_actions']
+
+
+def select_severity_tier(threshold):
+    """
+    Pick the compiled severity tier for a threshold
+    
+    Args:
+        threshold: Budget threshold percentage
+        
+    Returns:
+        dict: Tier settings plus its precompiled 'template'
+    """
+    
+    try:
+        threshold = float(threshold)
+    except (TypeError, ValueError):
+        return SEVERITY_TIERS[-1]
+    
+    for tier in SEVERITY_TIERS:
+        if threshold >= tier['min_threshold']:
+            return tier
+    return SEVERITY_TIERS[-1]
+
+
+def load_templates(template_path=None):
+    """
+    Build the compiled severity tiers from the defaults and an optional JSON file
+    
+    The file may define "message" (a Block Kit skeleton using the
+    {placeholder} fields) and/or "tiers" (a list shaped like
+    DEFAULT_SEVERITY_TIERS, where a null min_threshold is the catch-all tier).
+    
+    Args:
+        template_path: Path to a JSON template file, or None for the defaults
+        
+    Returns:
+        list: Tier dicts sorted by descending min_threshold, each with a
+              precompiled 'template' and joined 'recommended_actions'
+    """
+    
+    message = DEFAULT_MESSAGE_TEMPLATE
+    tiers = DEFAULT_SEVERITY_TIERS
+    
+    if template_path:
+        with open(template_path) as template_file:
+            custom = json.load(template_file)
+        message = custom.get('message', message)
+        tiers = custom.get('tiers', tiers)
+    
+    compiled = []
+    for tier in tiers:
+        tier = dict(tier)
+        if tier.get('min_threshold') is None:
+            tier['min_threshold'] = float('-inf')
+        tier['recommended_actions'] = '\n'.join(tier['actions'])
+        tier['template'] = compile_template(message, tier)
+        compiled.append(tier)
+    
+    return sorted(compiled, key=lambda t: t['min_threshold'], reverse=True)
+
+
+def compile_template(message, tier):
+    """
+    Serialize a message skeleton for one tier into byte fragments
+    
+    Tier placeholders are resolved now; the per-alert fields in
+    TEMPLATE_FIELDS are left as gaps between the returned fragments.
+    
+    Args:
+        message: Block Kit message skeleton with {placeholder} strings
+        tier: Severity tier settings
+        
+    Returns:
+        tuple: (literal byte fragments, field names filling the gaps)
+    """
+    
+    tier_values = {
+        'severity_level': tier['level'],
+        'severity_emoji': tier['emoji'],
+        'severity_message': tier['message'],
+        'recommended_actions': tier['recommended_actions'],
+        'attachment_color': tier['color'],
+        'attachment_text': tier['attachment_text']
+    }
+    
+    serialized = json.dumps(message)
+    serialized = TIER_PLACEHOLDER.sub(lambda m: json.dumps(tier_values[m.group(1)])[1:-1], serialized)
+    
+    pieces = FIELD_PLACEHOLDER.split(serialized)
+    literals = tuple(piece.encode('utf-8') for piece in pieces[0::2])
+    fields = tuple(pieces[1::2])
+    return literals, fields
+
+
+def render_template(template, values):
+    """
+    Fill a compiled template with per-alert values in a single bytes join
+    
+    Args:
+        template: (literals, fields) from compile_template
+        values: Field name -> value
+        
+    Returns:
+        bytes: Serialized Slack message
+    """
+    
+    literals, fields = template
+    encoded = {name: json.dumps(truncate_field(str(value)))[1:-1].encode('utf-8') for name, value in values.items()}
+    
+    parts = [literals[0]]
+    for name, literal in zip(fields, literals[1:]):
+        parts.append(encoded[name])
+        parts.append(literal)
+    return b''.join(parts)
+
+
+def truncate_field(value):
+    """Cap a per-alert value at TEMPLATE_FIELD_MAX_CHARS so one field cannot grow the message"""
+    if len(value) <= TEMPLATE_FIELD_MAX_CHARS:
+        return value
+    return value[:TEMPLATE_FIELD_MAX_CHARS - 1] + '…'
+
+
+# Slack message templates. Per-alert fields are TEMPLATE_FIELDS; the other
+# {placeholders} come from the severity tier and are resolved at import time.
+TEMPLATE_FIELDS = ('budget_name', 'threshold', 'thresholds_crossed', 'percentage', 'budget_limit', 'current_spend', 'timestamp')
+TEMPLATE_FIELD_MAX_CHARS = int(os.environ.get('TEMPLATE_FIELD_MAX_CHARS', '300'))
+FIELD_PLACEHOLDER = re.compile(r'\{(' + '|'.join(TEMPLATE_FIELDS) + r')\}')
+TIER_PLACEHOLDER = re.compile(r'\{(severity_level|severity_emoji|severity_message|recommended_actions|attachment_color|attachment_text)\}')
+
+DEFAULT_MESSAGE_TEMPLATE = {
+    'username': 'AWS Budget Monitor',
+    'icon_emoji': ':money_with_wings:',
+    'blocks': [
+        {
+            'type': 'header',
+            'text': {
+                'type': 'plain_text',
+                'text': '{severity_emoji} AWS Budget Alert',
+                'emoji': True
+            }
+        },
+        {
+            'type': 'section',
+            'fields': [
+                {
+                    'type': 'mrkdwn',
+                    'text': '*Budget Name:*\n{budget_name}'
+                },
+                {
+                    'type': 'mrkdwn',
+                    'text': '*Severity:*\n{severity_level}'
+                }
+            ]
+        },
+        {
+            'type': 'section',
+            'fields': [
+                {
+                    'type': 'mrkdwn',
+                    'text': '*Threshold:*\n{thresholds_crossed}'
+                },
+                {
+                    'type': 'mrkdwn',
+                    'text': '*Current Usage:*\n{percentage}%'
+                }
+            ]
+        },
+        {
+            'type': 'section',
+            'fields': [
+                {
+                    'type': 'mrkdwn',
+                    'text': '*Budget Limit:*\n${budget_limit}'
+                },
+                {
+                    'type': 'mrkdwn',
+                    'text': '*Current Spend:*\n${current_spend}'
+                }
+            ]
+        },
+        {
+            'type': 'divider'
+        },
+        {
+            'type': 'section',
+            'text': {
+                'type': 'mrkdwn',
+                'text': '{severity_message}'
+            }
+        },
+        {
+            'type': 'section',
+            'text': {
+                'type': 'mrkdwn',
+                'text': '*Recommended Actions:*'
+            }
+        },
+        {
+            'type': 'section',
+            'text': {
+                'type': 'mrkdwn',
+                'text': '{recommended_actions}'
+            }
+        },
+        {
+            'type': 'actions',
+            'elements': [
+                {
+                    'type': 'button',
+                    'text': {
+                        'type': 'plain_text',
+                        'text': 'View Budget Dashboard',
+                        'emoji': True
+                    },
+                    'url': 'https://console.aws.amazon.com/billing/home#/budgets',
+                    'style': 'primary'
+                },
+                {
+                    'type': 'button',
+                    'text': {
+                        'type': 'plain_text',
+                        'text': 'Cost Explorer',
+                        'emoji': True
+                    },
+                    'url': 'https://console.aws.amazon.com/cost-management/home#/cost-explorer'
+                }
+            ]
+        },
+        {
+            'type': 'context',
+            'elements': [
+                {
+                    'type': 'mrkdwn',
+                    'text': 'Alert triggered at {timestamp} | Automated notification from AWS Lambda'
+                }
+            ]
+        }
+    ],
+    # Color coding based on severity
+    'attachments': [
+        {
+            'color': '{attachment_color}',
+            'text': '{attachment_text}'
+        }
+    ]
+}
+
+CRITICAL_ACTIONS = [
+    '• 🛑 Stop all non-critical workloads immediately',
+    '• 🔍 Review Cost Explorer for unexpected charges',
+    '• 📧 Notify department head and finance team',
+    '• 🔒 Enable spending controls via Budget Actions',
+    '• 📊 Schedule emergency cost review meeting'
+]
+HIGH_ACTIONS = [
+    '• 🔍 Analyze current spending patterns in Cost Explorer',
+    '• 💰 Identify and stop unused resources',
+    '• 📊 Review Reserved Instance utilization',
+    '• ⚙️ Implement cost optimization recommendations',
+    '• 📧 Alert team leads of spending situation'
+]
+MEDIUM_ACTIONS = [
+    '• 📊 Monitor daily spending trends',
+    '• 🔍 Review recent resource deployments',
+    '• 💾 Check for over-provisioned resources',
+    '• 🔄 Consider auto-scaling adjustments',
+    '• 📝 Update forecasts and projections'
+]
+LOW_ACTIONS = [
+    '• 📈 Continue monitoring spending trends',
+    '• 🔍 Regular cost optimization reviews',
+    '• 📝 Update team on budget status',
+    '• ✅ Maintain current cost controls'
+]
+
+# The attachment colour changes at 85% while the severity level changes at 80%/90%,
+# so 80-85% and 85-90% are separate tiers with the same severity
+DEFAULT_SEVERITY_TIERS = [
+    {
+        'min_threshold': 100,
+        'level': '🔴 CRITICAL',
+        'emoji': '🚨',
+        'message': '⚠️ *CRITICAL ALERT:* Your budget limit has been exceeded! Immediate action required.',
+        'actions': CRITICAL_ACTIONS,
+        'color': '#dc3545',  # Red
+        'attachment_text': '⚠️ CRITICAL: Budget limit exceeded!'
+    },
+    {
+        'min_threshold': 90,
+        'level': '🟠 HIGH',
+        'emoji': '⚠️',
+        'message': '⚠️ *HIGH ALERT:* You are very close to exceeding your budget limit.',
+        'actions': HIGH_ACTIONS,
+        'color': '#ffc107',  # Yellow
+        'attachment_text': '⚠️ WARNING: Approaching budget limit'
+    },
+    {
+        'min_threshold': 85,
+        'level': '🟡 MEDIUM',
+        'emoji': '⚡',
+        'message': '⚡ *MEDIUM ALERT:* Your spending is trending towards the budget limit.',
+        'actions': MEDIUM_ACTIONS,
+        'color': '#ffc107',  # Yellow
+        'attachment_text': '⚠️ WARNING: Approaching budget limit'
+    },
+    {
+        'min_threshold': 80,
+        'level': '🟡 MEDIUM',
+        'emoji': '⚡',
+        'message': '⚡ *MEDIUM ALERT:* Your spending is trending towards the budget limit.',
+        'actions': MEDIUM_ACTIONS,
+        'color': '#17a2b8',  # Blue
+        'attachment_text': 'ℹ️ INFO: Budget threshold reached'
+    },
+    {
+        'min_threshold': None,
+        'level': '🟢 LOW',
+        'emoji': 'ℹ️',
+        'message': 'ℹ️ *INFO:* Budget threshold reached. Monitoring recommended.',
+        'actions': LOW_ACTIONS,
+        'color': '#17a2b8',  # Blue
+        'attachment_text': 'ℹ️ INFO: Budget threshold reached'
+    }
+]
+
+# Compiled once per container; SLACK_TEMPLATE_PATH lets teams customise without code changes
+SEVERITY_TIERS = load_templates(os.environ.get('SLACK_TEMPLATE_PATH'))
+
+
+# Import-time profile mode: report what each dependency costs to import
+if IMPORT_PROFILE:
+    log('INFO', 'Import profile', imports=profile_imports(PROFILED_IMPORTS))
 
 
 # For local testing
 if __name__ == "__main__":
+    if '--profile-imports' in sys.argv:
+        print(json.dumps(profile_imports(PROFILED_IMPORTS), indent=2))
+        sys.exit(0)
+    
     # Test SNS event
     test_event = {
         "Records": [
@@ -1,273 +1,2143 @@
 """
 Lambda Function: Stop Development Resources on Budget Threshold
-Purpose: Automatically stop EC2 instances tagged as Development when budget is exceeded
+Purpose: Automatically stop EC2 instances tagged as Development when budget is exceeded,
+         and restart them in waves once the budget allows
 Trigger: AWS Budget Action at 100% threshold
 Author: Excipient Technologies Cloud Team
 """
 
-import boto3
+import contextvars
 import json
 import os
+import random
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from datetime import datetime
 
-# Initialize AWS clients
-ec2 = boto3.client('ec2')
-sns = boto3.client('sns')
+from alert_coalescing import AlertCoalescer
+from cross_account import CredentialCache, parse_target_accounts
+from instrumentation import IMPORT_PROFILE, emit_metrics, is_enabled, lazy_import, log, profile_imports, timer
+from instance_inventory import InstanceInventory
+from notification_payload import SNS_MESSAGE_LIMIT_BYTES, build_message, report_name, sample_resources, write_report
+from resume_journal import STOP_TAG_BY, STOP_TAG_KEYS, ResumeJournal, budget_period, entry_from_tags, journal_key, stop_tags
+from stop_planner import build_stop_plan, load_budget_limit, parse_amount
+from tag_normalization import build_tag_filter
+
+# AWS clients are pooled at module scope so warm invocations reuse them.
+# boto3 is imported, and each client built, only on first use, so cold
+# starts and events that never call AWS skip that cost.
+CLIENT_SETTINGS = {
+    'max_pool_connections': int(os.environ.get('CLIENT_POOL_CONNECTIONS', '16')),
+    'connect_timeout': float(os.environ.get('CLIENT_CONNECT_TIMEOUT', '5')),
+    'read_timeout': float(os.environ.get('CLIENT_READ_TIMEOUT', '30')),
+    # Throttling is retried by call_with_backoff, so keep botocore's own retries short
+    'retries': {'mode': 'standard', 'max_attempts': 2}
+}
+_client_pool = {}
+_client_credentials = {}
+_client_pool_lock = threading.Lock()
+_session = None
+_client_config = None
+
+# Dependencies reported by the import-time profile (IMPORT_PROFILE=true or --profile-imports)
+PROFILED_IMPORTS = [
+    'boto3', 'botocore.exceptions', 'alert_coalescing', 'cross_account', 'instance_inventory',
+    'notification_payload', 'stop_planner', 'tag_normalization', 'instrumentation', 'concurrent.futures'
+]
+
+# Repeat notifications for the same budget and threshold are suppressed for
+# COALESCE_WINDOW_SECONDS, unless the run stopped resources the last
+# notification didn't list; every run still stops instances
+coalescer = AlertCoalescer('budget-action-stop-dev', period=None)
+
+# Region sweep configuration (SWEEP_CONCURRENCY=1 keeps the old serial behaviour).
+# SWEEP_CONCURRENCY caps account/region pairs in flight across all accounts, and
+# sweeps stop waiting SWEEP_DEADLINE_MARGIN_SECONDS before the Lambda timeout.
+SWEEP_CONCURRENCY = int(os.environ.get('SWEEP_CONCURRENCY', '8'))
+REGION_TIMEOUT_SECONDS = float(os.environ.get('REGION_TIMEOUT_SECONDS', '60'))
+SWEEP_DEADLINE_MARGIN_SECONDS = float(os.environ.get('SWEEP_DEADLINE_MARGIN_SECONDS', '10'))
+SWEEP_JOIN_SECONDS = float(os.environ.get('SWEEP_JOIN_SECONDS', '5'))
+
+# Timed-out pairs are cancelled cooperatively: each worker runs with its pair's
+# cancel event in this context variable, copied into every thread it starts,
+# and call_with_backoff/iter_pages check it before each API call.
+_sweep_cancel = contextvars.ContextVar('sweep_cancel', default=None)
+
+# Cross-account fan-out: accounts to enforce in and the role assumed in each,
+# see cross_account.py. Unset means only the account the function runs in.
+TARGET_ACCOUNTS = parse_target_accounts(os.environ.get('TARGET_ACCOUNTS', ''))
+credential_cache = CredentialCache(lambda: get_regional_client('sts', HOME_REGION))
+
+# Region discovery: explicit SWEEP_REGIONS override, else a cached describe_regions index
+SWEEP_REGIONS = [r.strip() for r in os.environ.get('SWEEP_REGIONS', '').split(',') if r.strip()]
+HOME_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+REGION_CACHE_TTL_SECONDS = int(os.environ.get('REGION_CACHE_TTL_SECONDS', '3600'))
+REGION_CACHE_PATH = os.environ.get('REGION_CACHE_PATH', '/tmp/budget-action-regions.json')
+REGION_CACHE_PARAMETER = os.environ.get('REGION_CACHE_PARAMETER')
+DEFAULT_REGIONS = [
+    'us-east-1',
+    'us-east-2',
+    'us-west-1',
+    'us-west-2',
+    'eu-west-1',
+    'eu-central-1',
+    'ap-southeast-1',
+    'ap-northeast-1'
+]
+_region_cache = {}
+
+# Environment tag filter learned from the allowed values in policies/scp-require-tags-*.json.
+# It only matches the canonical value and its aliases as declared; NORMALIZE_ENVIRONMENT_TAGS
+# filters on the tag key instead and lets the matcher accept any case or padding client-side.
+TARGET_ENVIRONMENT = os.environ.get('TARGET_ENVIRONMENT', 'Development')
+NORMALIZE_ENVIRONMENT_TAGS = os.environ.get('NORMALIZE_ENVIRONMENT_TAGS', 'false').lower() == 'true'
+ENVIRONMENT_FILTER, is_target_environment = build_tag_filter(TARGET_ENVIRONMENT, normalize=NORMALIZE_ENVIRONMENT_TAGS)
+
+# Default stop mode when the event doesn't set detail.mode: all, plan or dry-run
+STOP_MODE = os.environ.get('STOP_MODE', 'all')
+
+# Optional incremental inventory fed by EC2 state-change events (see instance_inventory.py).
+# Budget actions then read candidates from the index; regions not swept within
+# INVENTORY_RECONCILE_SECONDS are reconciled first to repair drift.
+INVENTORY_ENABLED = os.environ.get('INVENTORY_ENABLED', 'false').lower() == 'true'
+INVENTORY_PATH = os.environ.get('INVENTORY_PATH', '/tmp/instance-inventory.json')
+INVENTORY_RECONCILE_SECONDS = int(os.environ.get('INVENTORY_RECONCILE_SECONDS', '3600'))
+_inventory = None
+_inventory_lock = threading.Lock()
+
+# Resume journal (see resume_journal.py). Stopped resources are restarted in waves
+# of RESUME_WAVE_SIZE, RESUME_WAVE_INTERVAL_SECONDS apart, by {"action": "resume"}
+# (earlier budget periods only, unless "all" is set) or by a budget event whose
+# currentSpend is back under its threshold. Each resume first sweeps the targets
+# for AutoStopped tags, so the journal in /tmp is only a cache.
+RESUME_ENABLED = os.environ.get('RESUME_ENABLED', 'true').lower() == 'true'
+RESUME_JOURNAL_PATH = os.environ.get('RESUME_JOURNAL_PATH', '/tmp/resume-journal.json')
+RESUME_WAVE_SIZE = int(os.environ.get('RESUME_WAVE_SIZE', '25'))
+RESUME_WAVE_INTERVAL_SECONDS = float(os.environ.get('RESUME_WAVE_INTERVAL_SECONDS', '30'))
+RESUME_MAX_ATTEMPTS = int(os.environ.get('RESUME_MAX_ATTEMPTS', '3'))
+_resume_journal = None
+_resume_journal_lock = threading.Lock()
+
+# Tags applied on stop and removed again on restart
+AUTO_STOP_TAG_KEYS = STOP_TAG_KEYS
+STOP_REASON = 'Development budget threshold exceeded'
+
+# Notification size (see notification_payload.py). Messages are capped at
+# NOTIFICATION_MAX_BYTES whatever the fleet size; resources that don't fit are
+# counted in the message and the full list is written, gzip-compressed, to
+# NOTIFICATION_REPORT_URI (s3://bucket/prefix or a local/EFS directory).
+# NOTIFICATION_REPORT_ENDPOINT_URL points s3:// reports at an S3-compatible store.
+NOTIFICATION_MAX_BYTES = min(int(os.environ.get('NOTIFICATION_MAX_BYTES', '16384')), SNS_MESSAGE_LIMIT_BYTES - 4096)
+NOTIFICATION_REPORT_URI = os.environ.get('NOTIFICATION_REPORT_URI', '')
+NOTIFICATION_REPORT_ENDPOINT_URL = os.environ.get('NOTIFICATION_REPORT_ENDPOINT_URL')
+NOTIFICATION_REPORT_URL_EXPIRY_SECONDS = int(os.environ.get('NOTIFICATION_REPORT_URL_EXPIRY_SECONDS', '0'))
+_report_s3_client = None
+
+# Lambda responses are limited to 6 MB: resource lists in the response are cut
+# to RESPONSE_SAMPLE_MAX_BYTES each, next to their counts and the report link
+RESPONSE_SAMPLE_MAX_BYTES = int(os.environ.get('RESPONSE_SAMPLE_MAX_BYTES', '262144'))
+
+# Resource types to stop, each handled by a ResourceEnforcer (see ENFORCERS below)
+ENABLED_ENFORCERS = [e.strip() for e in os.environ.get('ENFORCERS', 'ec2,rds').split(',') if e.strip()]
+
+# Discovery configuration: describe_instances page size and instances per stop call
+DESCRIBE_PAGE_SIZE = int(os.environ.get('DESCRIBE_PAGE_SIZE', '1000'))
+STOP_BATCH_SIZE = int(os.environ.get('STOP_BATCH_SIZE', '100'))
+
+# Batch engine configuration: parallel stop chunks per region and API rate limiting
+CHUNK_CONCURRENCY = int(os.environ.get('CHUNK_CONCURRENCY', '4'))
+API_RATE_PER_SECOND = float(os.environ.get('API_RATE_PER_SECOND', '10'))
+MAX_THROTTLE_RETRIES = int(os.environ.get('MAX_THROTTLE_RETRIES', '6'))
+BACKOFF_BASE_SECONDS = 0.2
+BACKOFF_CAP_SECONDS = 10.0
+
+THROTTLE_ERROR_CODES = {
+    'RequestLimitExceeded',
+    'Throttling',
+    'ThrottlingException',
+    'TooManyRequestsException'
+}
+
+# Errors meaning a journaled resource no longer exists, so it is dropped on resume
+NOT_FOUND_ERROR_CODES = {
+    'InvalidInstanceID.NotFound',
+    'InvalidInstanceID.Malformed',
+    'DBInstanceNotFound',
+    'DBClusterNotFoundFault'
+}
 
 def lambda_handler(event, context):
     """
-    Main handler function triggered by AWS Budget Action
+    Main handler function triggered by AWS Budget Action
+    
+    Also accepts EC2 Instance State-change Notification events and
+    {"action": "reconcile"} to maintain the instance inventory, and
+    {"action": "resume"} to restart journaled resources.
+    
+    Args:
+        event: Budget action event data
+        context: Lambda context object
+        
+    Returns:
+        dict: Status and details of stopped instances
+    """
+    
+    log('INFO', 'Budget action triggered')
+    if is_enabled('DEBUG'):
+        log('DEBUG', 'Event received', event=event)
+    
+    deadline = None
+    if hasattr(context, 'get_remaining_time_in_millis'):
+        # Leave time to report and notify before the function times out
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - SWEEP_DEADLINE_MARGIN_SECONDS
+    
+    try:
+        return handle_event(event, deadline)
+    finally:
+        emit_metrics()
+
+
+def handle_event(event, deadline=None):
+    """
+    Route one invocation to inventory maintenance or the budget action
+    
+    Args:
+        event: Budget action, state-change, reconcile or resume event
+        deadline: time.monotonic() value by which sweeps must finish
+        
+    Returns:
+        dict: Lambda response
+    """
+    
+    # Inventory maintenance events
+    if event.get('detail-type') == 'EC2 Instance State-change Notification':
+        return handle_state_change(event)
+    if event.get('action') == 'reconcile':
+        reconciled = reconcile_inventory(get_all_regions(), force=True)
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'regions': reconciled})
+        }
+    
+    if event.get('action') == 'resume':
+        # Scheduled at the start of each budget period; "all" also restarts this period's stops
+        before_period = None if event.get('all') else budget_period()
+        return resume_stopped_resources(pending_restarts(event.get('budget_name'), before_period, deadline), deadline)
+    
+    # Parse budget event (if available)
+    budget_name = event.get('detail', {}).get('budgetName', 'Development-Account-Monthly-Budget')
+    threshold = event.get('detail', {}).get('threshold', 100)
+    
+    if RESUME_ENABLED and is_under_threshold(event.get('detail', {}), threshold, budget_name):
+        log('INFO', 'Spend back under threshold, resuming', budget_name=budget_name, threshold=threshold)
+        return resume_stopped_resources(pending_restarts(budget_name, deadline=deadline), deadline)
+    
+    log('INFO', 'Budget threshold crossed', budget_name=budget_name, threshold=threshold)
+    
+    # Stop mode: 'all' stops every development instance, 'plan' stops only the
+    # cheapest-to-lose set that brings projected spend under the budget,
+    # 'dry-run' returns that plan without stopping anything
+    mode = event.get('detail', {}).get('mode', STOP_MODE)
+    targets = get_sweep_targets()
+    plan = None
+    tags = stop_tags(budget_name, threshold, STOP_REASON)
+    
+    if INVENTORY_ENABLED and 'ec2' in ENABLED_ENFORCERS and None in TARGET_ACCOUNTS:
+        # This account's EC2 candidates come from the index (see EC2Enforcer);
+        # repair stale regions first and include any region the index knows about
+        inventory = get_inventory()
+        local_regions = [region for account, region in targets if account is None]
+        reconcile_inventory(local_regions)
+        targets += [(None, region) for region in inventory.candidate_regions() if region not in local_regions]
+    
+    if mode in ('plan', 'dry-run'):
+        # Build the full plan before stopping anything
+        discovered = sweep_targets(targets, SWEEP_CONCURRENCY, REGION_TIMEOUT_SECONDS, discover_development_resources, deadline)
+        candidates = [instance for result in discovered for instance in result.get('instances', [])]
+        
+        current_spend, budget_limit = budget_figures(budget_name, event.get('detail', {}), event.get('account'))
+        plan = build_stop_plan(candidates, current_spend, budget_limit)
+        log('INFO', 'Stop plan built', selected=len(plan['selected']), candidates=len(candidates),
+            projected_savings=plan['projected_savings'], target_savings=plan['target_savings'],
+            target_basis=plan['target_basis'])
+        
+        if mode == 'dry-run':
+            report = report_writer(plan['selected'], [], budget_name, threshold)
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': f'Dry run: would stop {len(plan["selected"])} of {len(candidates)} development instances',
+                    'plan': response_plan(plan, report)
+                })
+            }
+        
+        selected_by_target = {}
+        for instance in plan['selected']:
+            selected_by_target.setdefault((instance.get('account'), instance['region']), []).append(instance)
+        
+        region_results = sweep_targets(
+            list(selected_by_target),
+            SWEEP_CONCURRENCY,
+            REGION_TIMEOUT_SECONDS,
+            lambda region, account: stop_resources_in_region(region, selected_by_target[(account, region)], account, tags=tags),
+            deadline
+        )
+    else:
+        # Find all running development resources across all accounts and regions
+        region_results = sweep_targets(
+            targets,
+            SWEEP_CONCURRENCY,
+            REGION_TIMEOUT_SECONDS,
+            lambda region, account: stop_development_resources(region, account, tags),
+            deadline
+        )
+    
+    stopped_instances = []
+    failed_instances = []
+    for result in region_results:
+        stopped_instances.extend(result.get('stopped', []))
+        failed_instances.extend(result.get('failed', []))
+    
+    if INVENTORY_ENABLED:
+        for instance in stopped_instances:
+            if instance.get('account') is None and instance['resource_type'] == 'ec2-instance':
+                get_inventory().update_state(instance['instance_id'], 'stopping')
+    
+    if RESUME_ENABLED and stopped_instances:
+        get_resume_journal().record_stops(stopped_instances, budget_name, threshold, STOP_REASON)
+    
+    region_latency = {
+        target_label(result['account'], result['region']): {
+            'status': result['status'],
+            'outcome': result.get('outcome'),
+            'duration_ms': result['duration_ms'],
+            'stopped': len(result.get('stopped', [])),
+            'failed': len(result.get('failed', []))
+        }
+        for result in region_results
+    }
+    
+    # Pairs that were still running after being cancelled may have stopped resources we can't see
+    in_progress = [
+        target_label(result['account'], result['region'])
+        for result in region_results if result.get('outcome') == 'unknown'
+    ]
+    
+    # Send notification, unless this budget and threshold were reported within the
+    # window and every resource stopped now was already in that notification
+    if stopped_instances or in_progress:
+        digests, _ = coalescer.coalesce([{
+            'budget_name': budget_name,
+            'threshold': threshold,
+            'resources': [journal_key(instance) for instance in stopped_instances]
+        }])
+        key = digests[0]['idempotency_key'] if digests else None
+        report = report_writer(stopped_instances, failed_instances, budget_name, threshold, key)
+        notification = {'status': 'suppressed'}
+        if digests:
+            notification = send_notification(stopped_instances, budget_name, threshold, key, in_progress, report)
+            if notification['status'] == 'failed':
+                # Not delivered: forget the digest so the next invocation reports it again
+                coalescer.release(digests)
+        else:
+            log('INFO', 'Notification already sent, suppressing', budget_name=budget_name,
+                threshold=threshold, window_seconds=coalescer.window_seconds)
+        
+        instances = sample_resources(stopped_instances, RESPONSE_SAMPLE_MAX_BYTES)
+        failed = sample_resources(failed_instances, RESPONSE_SAMPLE_MAX_BYTES)
+        truncated = len(instances) < len(stopped_instances) or len(failed) < len(failed_instances)
+        return {
+            'statusCode': 500 if notification['status'] == 'failed' else 200,
+            'body': json.dumps({
+                'message': f'Stopped {len(stopped_instances)} development instances',
+                'notification': notification['status'],
+                'notification_error': notification.get('error'),
+                'report': report() if truncated else notification.get('report'),
+                'stopped': len(stopped_instances),
+                'failed': len(failed_instances),
+                'instances': instances,
+                'failed_instances': failed,
+                'in_progress': in_progress,
+                'region_latency': region_latency,
+                'plan': response_plan(plan, report)
+            })
+        }
+    else:
+        log('INFO', 'No development instances found to stop')
+        message = 'No development instances to stop'
+        if failed_instances:
+            message = f'Failed to stop {len(failed_instances)} development instances'
+        report = report_writer([], failed_instances, budget_name, threshold)
+        failed = sample_resources(failed_instances, RESPONSE_SAMPLE_MAX_BYTES)
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': message,
+                'report': report() if len(failed) < len(failed_instances) else None,
+                'failed': len(failed_instances),
+                'failed_instances': failed,
+                'region_latency': region_latency,
+                'plan': response_plan(plan, report)
+            })
+        }
+
+
+def sweep_regions(regions, max_concurrency, region_timeout, worker=None):
+    """
+    Run a per-region worker across this account's regions
+    
+    Args:
+        regions: Ordered list of region names to sweep
+        max_concurrency: Maximum number of regions processed at once
+        region_timeout: Seconds each region may run
+        worker: Function taking a region and returning a result dict
+                (defaults to stop_development_instances)
+        
+    Returns:
+        list: sweep_targets results, in the same order as regions
+    """
+    worker = worker or stop_development_instances
+    return sweep_targets(
+        [(None, region) for region in regions],
+        max_concurrency,
+        region_timeout,
+        lambda region, account: worker(region)
+    )
+
+
+def sweep_targets(targets, max_concurrency, region_timeout, worker=None, deadline=None):
+    """
+    Run a per-region worker across (account, region) pairs on one bounded
+    thread pool, so max_concurrency caps the sweep across every account
+    
+    Each pair gets region_timeout seconds from the moment it starts. A pair
+    that runs past that, or past the deadline, is cancelled: its next API
+    call raises SweepCancelled. Cancelled pairs are then given
+    SWEEP_JOIN_SECONDS to wind down, so whatever they stopped is still
+    reported; a pair still running after that is reported with outcome
+    'unknown'. Pairs that never started are not run.
+    
+    Args:
+        targets: Ordered list of (account ID or None, region) pairs
+        max_concurrency: Maximum number of pairs processed at once
+        region_timeout: Seconds each pair may run
+        worker: Function taking (region, account) and returning a result dict
+                (defaults to stop_development_resources)
+        deadline: time.monotonic() value after which pairs that are still
+                  running are cancelled
+        
+    Returns:
+        list: One result dict per pair, in the same order as targets,
+              holding the worker's result plus account, region, status
+              and duration_ms, and 'outcome' for pairs that timed out
+    """
+    worker = worker or stop_development_resources
+    started = {}
+    cancels = {}
+    
+    def run_target(index, account, region):
+        cancels[index] = threading.Event()
+        _sweep_cancel.set(cancels[index])
+        started[index] = time.monotonic()
+        log('DEBUG', 'Checking region', region=region, account=account)
+        outcome = worker(region, account)
+        return outcome, round((time.monotonic() - started[index]) * 1000, 1)
+    
+    def elapsed_ms(index):
+        return round((time.monotonic() - started[index]) * 1000, 1) if index in started else 0
+    
+    results = [None] * len(targets)
+    timed_out = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(targets) or 1)))
+    
+    try:
+        # Each pair runs in a fresh context, so its cancel event doesn't leak into pooled threads
+        futures = {
+            executor.submit(contextvars.copy_context().run, run_target, index, account, region): index
+            for index, (account, region) in enumerate(targets)
+        }
+        pending = set(futures)
+        
+        while pending:
+            now = time.monotonic()
+            expiries = {}
+            for future in pending:
+                index = futures[future]
+                expiry = started[index] + region_timeout if index in started else float('inf')
+                expiries[future] = min(expiry, deadline) if deadline is not None else expiry
+            
+            for future in [f for f, expiry in expiries.items() if expiry <= now]:
+                pending.discard(future)
+                index = futures[future]
+                account, region = targets[index]
+                if future.cancel():
+                    log('WARNING', 'Deadline reached before region started', region=region, account=account)
+                    results[index] = {'account': account, 'region': region, 'status': 'timeout',
+                                      'outcome': 'not started', 'duration_ms': 0}
+                else:
+                    log('WARNING', 'Region timed out, cancelling', region=region, account=account,
+                        timeout_seconds=region_timeout)
+                    cancels[index].set()
+                    timed_out[future] = index
+            
+            if not pending:
+                break
+            # Pairs that start while we wait are picked up on the next pass
+            wait_seconds = min([region_timeout] + [expiries[f] - now for f in pending])
+            done, _ = wait(pending, timeout=max(0, wait_seconds), return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                results[futures[future]] = sweep_result(future, targets[futures[future]], 'ok', elapsed_ms(futures[future]))
+        
+        # Give cancelled pairs a moment to stop at their next API call and report what they did
+        if timed_out:
+            done, _ = wait(timed_out, timeout=SWEEP_JOIN_SECONDS)
+            for future, index in timed_out.items():
+                if future in done:
+                    results[index] = sweep_result(future, targets[index], 'timeout', elapsed_ms(index))
+                    results[index]['outcome'] = 'cancelled'
+                else:
+                    account, region = targets[index]
+                    log('ERROR', 'Region still running after cancel, outcome unknown', region=region, account=account)
+                    results[index] = {'account': account, 'region': region, 'status': 'timeout',
+                                      'outcome': 'unknown', 'duration_ms': elapsed_ms(index)}
+    finally:
+        # Anything still running has been cancelled and makes no further API calls
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    return results
+
+
+def sweep_result(future, target, status, duration_ms):
+    """
+    Result dict for a finished sweep_targets future
+    
+    Args:
+        future: Completed future of run_target
+        target: (account, region) pair
+        status: Status to report if the worker succeeded ('ok' or 'timeout')
+        duration_ms: Fallback duration if the worker raised
+        
+    Returns:
+        dict: Worker result plus account, region, status and duration_ms
+    """
+    account, region = target
+    try:
+        outcome, duration_ms = future.result()
+    except Exception as e:
+        log('ERROR', 'Error sweeping region', region=region, account=account, error=str(e))
+        return {'account': account, 'region': region, 'status': 'error', 'error': str(e), 'duration_ms': duration_ms}
+    if status == 'ok' and outcome.get('error'):
+        status = 'error'
+    return dict(outcome, account=account, region=region, status=status, duration_ms=duration_ms)
+
+
+class SweepCancelled(Exception):
+    """Raised in a worker whose account/region pair timed out"""
+
+
+def check_cancelled():
+    """
+    Raise SweepCancelled if the current pair's sweep was cancelled
+    
+    Called before every API call a sweep makes, so a cancelled pair stops
+    at its next call instead of running on after the invocation returns.
+    """
+    cancel = _sweep_cancel.get()
+    if cancel is not None and cancel.is_set():
+        raise SweepCancelled('Region timed out; no further API calls made')
+
+
+@contextmanager
+def uncancellable():
+    """
+    Let the calls inside run even if the pair was cancelled
+    
+    Used to tag resources that were already stopped, so a stop that lands
+    after the cancel can still be found by its AutoStopped tags.
+    """
+    token = _sweep_cancel.set(None)
+    try:
+        yield
+    finally:
+        _sweep_cancel.reset(token)
+
+
+def submit_in_context(executor, fn, *args):
+    """Submit fn to an executor with the caller's context, so the pair's cancel event follows it"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def target_label(account, region):
+    """
+    Name an account/region pair in responses ('us-east-1' for this account)
+    
+    Returns:
+        str: Region, prefixed with the account ID for other accounts
+    """
+    return region if account is None else f"{account}/{region}"
+
+
+def get_sweep_targets():
+    """
+    List the (account, region) pairs a budget action sweeps
+    
+    Returns:
+        list: (account ID or None for this account, region) pairs
+    """
+    return [(account, region) for account in TARGET_ACCOUNTS for region in get_all_regions(account)]
+
+
+def get_regional_client(service, region, account=None):
+    """
+    Get a pooled boto3 client for a service, region and account, creating it
+    on first use
+    
+    Clients for other accounts use the assumed-role credentials from
+    credential_cache and are rebuilt whenever those credentials are renewed.
+    
+    Args:
+        service: AWS service name (e.g. 'ec2')
+        region: AWS region name
+        account: Target account ID, or None for the function's own account
+        
+    Returns:
+        botocore client shared across threads and warm invocations
+    """
+    global _session, _client_config
+    
+    key = (service, region, account)
+    credentials = credential_cache.get(TARGET_ACCOUNTS[account]) if account else None
+    client = _client_pool.get(key)
+    if client is not None and _client_credentials.get(key) is credentials:
+        return client
+    
+    # boto3 sessions are not thread-safe, so client creation is serialised
+    with _client_pool_lock:
+        client = _client_pool.get(key)
+        if client is None or _client_credentials.get(key) is not credentials:
+            if _session is None:
+                _client_config = lazy_import('botocore.config').Config(**CLIENT_SETTINGS)
+                _session = lazy_import('boto3').session.Session()
+            keys = {}
+            if credentials:
+                keys = {name: credentials[name] for name in ('aws_access_key_id', 'aws_secret_access_key', 'aws_session_token')}
+            client = _session.client(service, region_name=region, config=_client_config, **keys)
+            _client_pool[key] = client
+            _client_credentials[key] = credentials
+    return client
+
+
+def get_all_regions(account=None):
+    """
+    Get list of AWS regions that hold development instances
+    
+    Regions come from describe_regions (including opted-in regions) and are
+    narrowed to those with Environment=Development instances. The result is
+    cached per account in memory, in REGION_CACHE_PATH and optionally in the
+    SSM parameter REGION_CACHE_PARAMETER for REGION_CACHE_TTL_SECONDS.
+    
+    Args:
+        account: Target account ID, or None for the function's own account
+        
+    Returns:
+        list: List of region names
+    """
+    if SWEEP_REGIONS:
+        return SWEEP_REGIONS
+    
+    now = time.time()
+    cached = _region_cache.get(account)
+    if cached is not None and cached['expires_at'] > now:
+        return cached['regions']
+    
+    try:
+        cached = load_region_cache(account)
+        if cached is not None and cached['updated_at'] + REGION_CACHE_TTL_SECONDS > now:
+            regions = cached['regions']
+        else:
+            regions = discover_development_regions(account)
+            save_region_cache({'regions': regions, 'updated_at': now}, account)
+            cached = {'updated_at': now}
+        
+        _region_cache[account] = {
+            'regions': regions,
+            'expires_at': cached['updated_at'] + REGION_CACHE_TTL_SECONDS
+        }
+        log('INFO', 'Sweeping regions with development instances', regions=regions, account=account)
+        return regions
+    except Exception as e:
+        log('ERROR', 'Error getting regions', account=account, error=str(e))
+        return DEFAULT_REGIONS  # Fall back to the common region subset
+
+
+def discover_development_regions(account=None):
+    """
+    Find enabled regions that contain Environment=Development resources of
+    any enabled type
+    
+    Args:
+        account: Target account ID, or None for the function's own account
+        
+    Returns:
+        list: Region names in describe_regions order
+    """
+    home_client = get_regional_client('ec2', HOME_REGION, account)
+    response = home_client.describe_regions(
+        Filters=[
+            {
+                'Name': 'opt-in-status',
+                'Values': ['opt-in-not-required', 'opted-in']
+            }
+        ]
+    )
+    enabled_regions = sorted(r['RegionName'] for r in response['Regions'])
+    
+    def has_development_resources(region):
+        return any(
+            enforcer.has_resources(get_regional_client(enforcer.service, region, account))
+            for enforcer in get_enforcers()
+        )
+    
+    with ThreadPoolExecutor(max_workers=max(1, SWEEP_CONCURRENCY)) as executor:
+        flags = list(executor.map(has_development_resources, enabled_regions))
+    
+    return [region for region, flag in zip(enabled_regions, flags) if flag]
+
+
+def region_cache_location(account=None):
+    """
+    File path and SSM parameter name holding one account's region index
+    
+    Args:
+        account: Target account ID, or None for the function's own account
+        
+    Returns:
+        tuple: (file path, parameter name or None)
+    """
+    if account is None:
+        return REGION_CACHE_PATH, REGION_CACHE_PARAMETER
+    root, extension = os.path.splitext(REGION_CACHE_PATH)
+    parameter = f"{REGION_CACHE_PARAMETER}-{account}" if REGION_CACHE_PARAMETER else None
+    return f"{root}-{account}{extension}", parameter
+
+
+def load_region_cache(account=None):
+    """
+    Read the region index from the local file cache or SSM parameter
+    
+    Args:
+        account: Target account ID, or None for the function's own account
+        
+    Returns:
+        dict: {'regions': [...], 'updated_at': epoch seconds}, or None
+    """
+    path, parameter_name = region_cache_location(account)
+    try:
+        with open(path) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        pass
+    
+    if parameter_name:
+        # The index is kept in the function's own account
+        ssm = get_regional_client('ssm', HOME_REGION)
+        try:
+            parameter = ssm.get_parameter(Name=parameter_name)
+            return json.loads(parameter['Parameter']['Value'])
+        except client_error() as e:
+            if e.response.get('Error', {}).get('Code') != 'ParameterNotFound':
+                raise
+    
+    return None
+
+
+def save_region_cache(entry, account=None):
+    """
+    Persist the region index to the local file cache and SSM parameter
+    
+    Args:
+        entry: {'regions': [...], 'updated_at': epoch seconds}
+        account: Target account ID, or None for the function's own account
+    """
+    path, parameter_name = region_cache_location(account)
+    payload = json.dumps(entry)
+    
+    try:
+        with open(path, 'w') as cache_file:
+            cache_file.write(payload)
+    except OSError as e:
+        log('WARNING', 'Could not write region cache', path=path, error=str(e))
+    
+    if parameter_name:
+        get_regional_client('ssm', HOME_REGION).put_parameter(
+            Name=parameter_name,
+            Value=payload,
+            Type='String',
+            Overwrite=True
+        )
+
+
+def get_inventory():
+    """
+    Get the module-level instance inventory, loading it on first use
+    
+    Returns:
+        InstanceInventory: Index whose candidates are running target-environment instances
+    """
+    global _inventory
+    
+    with _inventory_lock:
+        if _inventory is None:
+            _inventory = InstanceInventory(
+                INVENTORY_PATH,
+                lambda record: record['state'] == 'running' and is_target_environment(record['environment'])
+            )
+    return _inventory
+
+
+def get_resume_journal():
+    """
+    Get the module-level resume journal, loading it on first use
+    
+    Returns:
+        ResumeJournal: Journal of resources stopped by budget actions
+    """
+    global _resume_journal
+    
+    with _resume_journal_lock:
+        if _resume_journal is None:
+            _resume_journal = ResumeJournal(RESUME_JOURNAL_PATH)
+    return _resume_journal
+
+
+def is_under_threshold(detail, threshold, budget_name):
+    """
+    Check whether a budget event reports spend back under its threshold
+    
+    Only events that carry currentSpend qualify; the budget limit comes from
+    budgetAmount or the file defining budget_name. FORECASTED events (from
+    spend-forecast.py or a forecast budget notification) never qualify:
+    their actual spend is under the threshold by design. A yes restarts the
+    whole stopped fleet, so any figure that can't be parsed, or a limit
+    that can't be found, counts as not under.
+    
+    Args:
+        detail: Event detail
+        threshold: Threshold percentage of the budget limit
+        budget_name: Budget the event is about
+        
+    Returns:
+        bool: True if spend is known to be under the threshold
+    """
+    if 'currentSpend' not in detail or detail.get('notificationType') == 'FORECASTED':
+        return False
+    
+    current_spend = parse_amount(detail['currentSpend'])
+    threshold_pct = parse_amount(threshold)
+    if 'budgetAmount' in detail:
+        budget_limit = parse_amount(detail['budgetAmount'])
+    else:
+        budget_limit = load_budget_limit(budget_name)
+        if budget_limit is None:
+            return False
+    
+    if current_spend is None or threshold_pct is None or budget_limit is None or budget_limit <= 0:
+        log('WARNING', 'Unparsable budget figures, not resuming', budget_name=budget_name,
+            current_spend=detail['currentSpend'], budget_amount=detail.get('budgetAmount'), threshold=threshold)
+        return False
+    return current_spend < budget_limit * threshold_pct / 100
+
+
+def budget_figures(budget_name, detail, account=None):
+    """
+    Month-to-date spend and limit of a budget, for planning stops
+    
+    The event's currentSpend and budgetAmount are used when present. AWS
+    Budget action events carry neither, so missing figures are read from
+    the Budgets API, and a still-missing limit from the budget file.
+    
+    Args:
+        budget_name: Budget the event is about
+        detail: Event detail
+        account: Account that owns the budget (defaults to this one)
+        
+    Returns:
+        tuple: (current_spend, budget_limit), each None if unknown
+    """
+    current_spend = parse_amount(detail.get('currentSpend'))
+    budget_limit = parse_amount(detail.get('budgetAmount'))
+    
+    if current_spend is None or budget_limit is None:
+        budget = describe_budget(budget_name, account) or {}
+        if current_spend is None:
+            current_spend = parse_amount(budget.get('CalculatedSpend', {}).get('ActualSpend', {}).get('Amount'))
+        if budget_limit is None:
+            budget_limit = parse_amount(budget.get('BudgetLimit', {}).get('Amount'))
+    if budget_limit is None:
+        budget_limit = load_budget_limit(budget_name)
+    
+    if current_spend is None:
+        log('WARNING', 'Month-to-date spend unknown, plan selects every candidate', budget_name=budget_name)
+    return current_spend, budget_limit
+
+
+def describe_budget(budget_name, account=None):
+    """
+    Read a budget definition and its calculated spend from the Budgets API
+    
+    Args:
+        budget_name: Budget name
+        account: Owning account ID (defaults to the caller's account)
+        
+    Returns:
+        dict: describe_budget 'Budget', or None if it can't be read
+    """
+    try:
+        account = account or get_regional_client('sts', HOME_REGION).get_caller_identity()['Account']
+        # The Budgets API is global and served from us-east-1
+        budgets = get_regional_client('budgets', 'us-east-1')
+        return call_with_backoff(AdaptiveTokenBucket(API_RATE_PER_SECOND), budgets.describe_budget,
+                                 AccountId=account, BudgetName=budget_name)['Budget']
+    except Exception as e:
+        log('WARNING', 'Could not read budget from the Budgets API', budget_name=budget_name, error=str(e))
+        return None
+
+
+def pending_restarts(budget_name=None, before_period=None, deadline=None):
+    """
+    Resources waiting to be restarted, rebuilt from their AutoStopped tags
+    
+    Every target is swept for stopped resources carrying the tags written by
+    a budget action, and the journal is refreshed from what is found, so a
+    resume works in a fresh container whose /tmp journal is empty. Targets
+    that can't be swept keep their journaled entries.
+    
+    Args:
+        budget_name: Only resources stopped by this budget
+        before_period: Only resources stopped in an earlier period ('YYYY-MM')
+        deadline: time.monotonic() value by which the sweep must finish
+        
+    Returns:
+        list: Journal entries, oldest stop first
+    """
+    journal = get_resume_journal()
+    results = sweep_targets(get_sweep_targets(), SWEEP_CONCURRENCY, REGION_TIMEOUT_SECONDS, discover_stopped_resources, deadline)
+    
+    tagged = [entry for result in results for entry in result.get('instances', [])]
+    swept = {
+        (result['account'] or 'self', result['region'], resource_type)
+        for result in results if result['status'] == 'ok'
+        for enforcer in get_enforcers()
+        for resource_type in enforcer.resource_types
+    }
+    journal.reconcile(tagged, swept)
+    log('INFO', 'Stopped resources found', tagged=len(tagged), swept=len(swept),
+        unswept=sum(1 for result in results if result['status'] != 'ok'))
+    return journal.pending(budget_name, before_period)
+
+
+def resume_stopped_resources(entries, deadline=None):
+    """
+    Restart journaled resources in rate-limited waves
+    
+    Each wave restarts at most RESUME_WAVE_SIZE resources, grouped by account,
+    region and type, then waits RESUME_WAVE_INTERVAL_SECONDS so start calls
+    and the services behind the resources ramp up gradually. Waves that
+    wouldn't finish before the deadline are left in the journal for the
+    next invocation. AutoStopped tags are removed from restarted resources.
+    
+    Args:
+        entries: Journal entries to restart, in restart order
+        deadline: time.monotonic() value by which to stop starting waves
+        
+    Returns:
+        dict: Lambda response
+    """
+    journal = get_resume_journal()
+    waves = list(iter_batches(entries, max(1, RESUME_WAVE_SIZE)))
+    buckets = {}
+    resumed, failed, dropped = [], [], []
+    completed_waves = 0
+    
+    for wave in waves:
+        if completed_waves:
+            if deadline is not None and time.monotonic() + RESUME_WAVE_INTERVAL_SECONDS > deadline:
+                log('WARNING', 'Deadline reached, leaving remaining waves for the next run',
+                    completed_waves=completed_waves, waves=len(waves))
+                break
+            time.sleep(RESUME_WAVE_INTERVAL_SECONDS)
+        
+        groups = {}
+        for entry in wave:
+            groups.setdefault((entry.get('account'), entry['region'], entry['resource_type']), []).append(entry)
+            buckets.setdefault((entry.get('account'), entry['region']), AdaptiveTokenBucket(API_RATE_PER_SECOND))
+        
+        def start_group(item):
+            (account, region, resource_type), group = item
+            enforcer = ENFORCER_BY_TYPE[resource_type]
+            outcomes = {}
+            try:
+                client = get_regional_client(enforcer.service, region, account)
+                for chunk in iter_batches(group, enforcer.batch_size):
+                    outcomes.update(enforcer.start_batch(client, chunk, buckets[(account, region)]))
+            except Exception as e:
+                log('ERROR', 'Error restarting resources', region=region, account=account, error=str(e))
+                for entry in group:
+                    outcomes.setdefault(entry['instance_id'], {'status': 'failed', 'error': str(e)})
+            return group, outcomes
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(SWEEP_CONCURRENCY, len(groups)))) as executor:
+            results = list(executor.map(start_group, groups.items()))
+        
+        wave_failed = []
+        for group, outcomes in results:
+            for entry in group:
+                outcome = outcomes[entry['instance_id']]
+                if outcome['status'] == 'failed':
+                    entry['error'] = outcome['error']
+                    wave_failed.append(entry)
+                else:
+                    if outcome['status'] == 'missing':
+                        entry['missing'] = True
+                    resumed.append(entry)
+                    journal.mark_resumed([entry])
+                    if INVENTORY_ENABLED and entry.get('account') is None and entry['resource_type'] == 'ec2-instance':
+                        get_inventory().update_state(entry['instance_id'], 'pending')
+        
+        dropped.extend(journal.mark_failed(wave_failed, RESUME_MAX_ATTEMPTS))
+        failed.extend(wave_failed)
+        completed_waves += 1
+        log('INFO', 'Resume wave finished', wave=completed_waves, waves=len(waves),
+            resumed=len(wave) - len(wave_failed), failed=len(wave_failed))
+    
+    remaining = sum(len(wave) for wave in waves[completed_waves:])
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': f'Restarted {len(resumed)} stopped resources',
+            'resumed': resumed,
+            'failed': failed,
+            'dropped': dropped,
+            'waves': completed_waves,
+            'remaining': remaining
+        })
+    }
+
+
+def handle_state_change(event):
+    """
+    Apply an EC2 Instance State-change Notification to the inventory
+    
+    Known instances only have their state updated. An instance seen for the
+    first time is described once to record its tags and type.
+    
+    Args:
+        event: EventBridge event with detail.instance-id and detail.state
+        
+    Returns:
+        dict: Status of the inventory update
+    """
+    inventory = get_inventory()
+    instance_id = event['detail']['instance-id']
+    state = event['detail']['state']
+    region = event.get('region', HOME_REGION)
+    
+    if state == 'terminated':
+        inventory.remove(instance_id)
+    elif not inventory.update_state(instance_id, state):
+        response = get_regional_client('ec2', region).describe_instances(InstanceIds=[instance_id])
+        for reservation in response['Reservations']:
+            for instance in reservation['Instances']:
+                inventory.upsert(inventory_record(instance, region))
+    
+    log('INFO', 'Inventory updated', instance_id=instance_id, region=region, state=state)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'instance_id': instance_id,
+            'state': state,
+            'candidate': inventory.get(instance_id) is not None and state == 'running'
+        })
+    }
+
+
+def reconcile_inventory(regions, force=False):
+    """
+    Re-sweep regions whose inventory is older than INVENTORY_RECONCILE_SECONDS
+    
+    Args:
+        regions: Regions the inventory should cover
+        force: Re-sweep every region regardless of age
+        
+    Returns:
+        list: sweep_regions results with the number of instances indexed
+    """
+    inventory = get_inventory()
+    stale = list(regions) if force else inventory.stale_regions(regions, INVENTORY_RECONCILE_SECONDS)
+    filters = [
+        ENVIRONMENT_FILTER,
+        {
+            'Name': 'instance-state-name',
+            'Values': ['pending', 'running', 'stopping', 'stopped']
+        }
+    ]
+    
+    def reconcile_region(region):
+        ec2_regional = get_regional_client('ec2', region)
+        records = [
+            inventory_record(instance, region)
+            for instance in iter_instances(ec2_regional, DESCRIBE_PAGE_SIZE, filters)
+        ]
+        inventory.replace_region(region, records)
+        return {'indexed': len(records)}
+    
+    if stale:
+        log('INFO', 'Reconciling inventory', regions=stale)
+    return sweep_regions(stale, SWEEP_CONCURRENCY, REGION_TIMEOUT_SECONDS, reconcile_region)
+
+
+class ResourceEnforcer(ABC):
+    """
+    Interface for one kind of stoppable resource
+    
+    Enforcers only know how to find and stop their resources. Clients,
+    batching, rate limiting, concurrency and reporting are shared and
+    handled by stop_resources_in_region. Resources are detail dicts with at
+    least 'resource_type', 'instance_id', 'instance_name', 'region' and
+    'instance_type', so plans and notifications treat every type alike.
+    """
+    
+    name = None
+    service = None
+    resource_types = ()
+    batch_size = 1
+    
+    @abstractmethod
+    def discover(self, client, region, account=None):
+        """Lazily yield running development resources in a region"""
+    
+    @abstractmethod
+    def has_resources(self, client):
+        """Whether the region holds any development resources, in any state"""
+    
+    @abstractmethod
+    def stop_batch(self, client, resources, tags, bucket):
+        """Stop and tag a batch, returning instance_id -> outcome dicts"""
+    
+    @abstractmethod
+    def discover_stopped(self, client, region, account=None):
+        """Lazily yield journal entries for resources a budget action stopped"""
+    
+    @abstractmethod
+    def start_batch(self, client, resources, bucket):
+        """
+        Restart a batch of journaled resources and remove their AutoStopped
+        tags, returning instance_id -> {'status': 'started'|'missing'|'failed'}
+        """
+
+
+class EC2Enforcer(ResourceEnforcer):
+    """
+    Stops development EC2 instances, STOP_BATCH_SIZE per API call
+    
+    With INVENTORY_ENABLED, this account's candidates are read from the
+    instance index instead of describe_instances.
+    """
+    
+    name = 'ec2'
+    service = 'ec2'
+    resource_types = ('ec2-instance',)
+    batch_size = STOP_BATCH_SIZE
+    
+    def discover(self, client, region, account=None):
+        if INVENTORY_ENABLED and account is None:
+            return iter(get_inventory().candidates(region))
+        return iter_development_instances(client, region, DESCRIBE_PAGE_SIZE, account)
+    
+    def has_resources(self, client):
+        # One small page is enough to tell whether the region holds anything
+        page = client.describe_instances(
+            Filters=[
+                ENVIRONMENT_FILTER,
+                {
+                    'Name': 'instance-state-name',
+                    'Values': ['pending', 'running', 'stopping', 'stopped']
+                }
+            ],
+            MaxResults=5
+        )
+        return any(reservation['Instances'] for reservation in page['Reservations'])
+    
+    def stop_batch(self, client, resources, tags, bucket):
+        return stop_instance_chunk(client, [r['instance_id'] for r in resources], tags, bucket)
+    
+    def discover_stopped(self, client, region, account=None):
+        filters = [
+            {
+                'Name': 'tag:AutoStoppedBy',
+                'Values': [STOP_TAG_BY]
+            },
+            {
+                'Name': 'instance-state-name',
+                'Values': ['stopping', 'stopped']
+            }
+        ]
+        for instance in iter_instances(client, DESCRIBE_PAGE_SIZE, filters):
+            entry = entry_from_tags(
+                {'resource_type': 'ec2-instance', 'instance_id': instance['InstanceId'], 'region': region, 'account': account},
+                {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+            )
+            if entry:
+                yield entry
+    
+    def start_batch(self, client, resources, bucket):
+        return start_instance_chunk(client, [r['instance_id'] for r in resources], bucket)
+
+
+class RDSEnforcer(ResourceEnforcer):
+    """
+    Stops development RDS DB instances and Aurora DB clusters
+    
+    DB instances that belong to a cluster are skipped; the cluster is
+    stopped as a whole instead, as RDS requires. RDS has no server-side tag
+    filter, so tags are matched from the TagList returned with each page.
+    """
+    
+    name = 'rds'
+    service = 'rds'
+    resource_types = ('rds-instance', 'rds-cluster')
+    batch_size = 10
+    
+    def discover(self, client, region, account=None):
+        cluster_classes = {}
+        for db in iter_pages(client, 'describe_db_instances', 'DBInstances', RDS_PAGE_SIZE):
+            if db.get('DBClusterIdentifier'):
+                cluster_classes.setdefault(db['DBClusterIdentifier'], db['DBInstanceClass'])
+            elif db['DBInstanceStatus'] == 'available' and self.is_development(db):
+                yield rds_details(db, 'rds-instance', region, account)
+        
+        for cluster in iter_pages(client, 'describe_db_clusters', 'DBClusters', RDS_PAGE_SIZE):
+            # Aurora Serverless v1 clusters scale to zero on their own and can't be stopped
+            if cluster['Status'] == 'available' and cluster.get('EngineMode') != 'serverless' and self.is_development(cluster):
+                cluster['DBInstanceClass'] = cluster_classes.get(cluster['DBClusterIdentifier'], 'db.unknown')
+                yield rds_details(cluster, 'rds-cluster', region, account)
+    
+    def has_resources(self, client):
+        return any(
+            self.is_development(resource)
+            for operation, key in (('describe_db_instances', 'DBInstances'), ('describe_db_clusters', 'DBClusters'))
+            for resource in iter_pages(client, operation, key, RDS_PAGE_SIZE)
+        )
+    
+    def is_development(self, resource):
+        return is_target_environment(get_tag(resource, 'Environment', 'TagList'))
+    
+    def discover_stopped(self, client, region, account=None):
+        for operation, key, resource_type, status_key, id_key, arn_key in (
+            ('describe_db_instances', 'DBInstances', 'rds-instance', 'DBInstanceStatus', 'DBInstanceIdentifier', 'DBInstanceArn'),
+            ('describe_db_clusters', 'DBClusters', 'rds-cluster', 'Status', 'DBClusterIdentifier', 'DBClusterArn')
+        ):
+            for resource in iter_pages(client, operation, key, RDS_PAGE_SIZE):
+                if resource[status_key] not in ('stopping', 'stopped'):
+                    continue
+                entry = entry_from_tags(
+                    {
+                        'resource_type': resource_type,
+                        'instance_id': resource[id_key],
+                        'region': region,
+                        'account': account,
+                        'arn': resource[arn_key]
+                    },
+                    {tag['Key']: tag['Value'] for tag in resource.get('TagList') or []}
+                )
+                if entry:
+                    yield entry
+    
+    def stop_batch(self, client, resources, tags, bucket):
+        outcomes = {}
+        for resource in resources:
+            identifier = resource['instance_id']
+            try:
+                with timer('stop', Region=resource['region']):
+                    if resource['resource_type'] == 'rds-cluster':
+                        call_with_backoff(bucket, client.stop_db_cluster, DBClusterIdentifier=identifier)
+                    else:
+                        call_with_backoff(bucket, client.stop_db_instance, DBInstanceIdentifier=identifier)
+            except Exception as e:
+                outcomes[identifier] = {'status': 'failed', 'error': str(e)}
+                continue
+            
+            outcomes[identifier] = {'status': 'stopped'}
+            try:
+                with timer('tag', Region=resource['region']), uncancellable():
+                    call_with_backoff(bucket, client.add_tags_to_resource, ResourceName=resource['arn'], Tags=tags)
+            except Exception as e:
+                log('ERROR', 'Error tagging stopped resource', resource=identifier, error=str(e))
+                outcomes[identifier]['tag_error'] = str(e)
+        return outcomes
+    
+    def start_batch(self, client, resources, bucket):
+        outcomes = {}
+        for resource in resources:
+            identifier = resource['instance_id']
+            try:
+                with timer('start', Region=resource['region']):
+                    if resource['resource_type'] == 'rds-cluster':
+                        call_with_backoff(bucket, client.start_db_cluster, DBClusterIdentifier=identifier)
+                    else:
+                        call_with_backoff(bucket, client.start_db_instance, DBInstanceIdentifier=identifier)
+            except client_error() as e:
+                missing = e.response.get('Error', {}).get('Code') in NOT_FOUND_ERROR_CODES
+                outcomes[identifier] = {'status': 'missing' if missing else 'failed', 'error': str(e)}
+                continue
+            except Exception as e:
+                outcomes[identifier] = {'status': 'failed', 'error': str(e)}
+                continue
+            
+            outcomes[identifier] = {'status': 'started'}
+            try:
+                call_with_backoff(bucket, client.remove_tags_from_resource, ResourceName=resource['arn'], TagKeys=AUTO_STOP_TAG_KEYS)
+            except Exception as e:
+                log('ERROR', 'Error removing stop tags', resource=identifier, error=str(e))
+        return outcomes
+
+
+# DescribeDBInstances/DescribeDBClusters accept 20-100 records per page
+RDS_PAGE_SIZE = 100
+
+ENFORCERS = {enforcer.name: enforcer for enforcer in (EC2Enforcer(), RDSEnforcer())}
+ENFORCER_BY_TYPE = {
+    resource_type: enforcer
+    for enforcer in ENFORCERS.values()
+    for resource_type in enforcer.resource_types
+}
+
+
+# Labels used for each resource type in notifications
+RESOURCE_LABELS = {
+    'ec2-instance': 'Instance',
+    'rds-instance': 'RDS DB instance',
+    'rds-cluster': 'RDS DB cluster'
+}
+
+
+def get_enforcers():
+    """
+    Enforcers selected by ENFORCERS, in configuration order
+    
+    Returns:
+        list: ResourceEnforcer instances
+    """
+    return [ENFORCERS[name] for name in ENABLED_ENFORCERS]
+
+
+def run_enforcers(action, region):
+    """
+    Run an action for every enabled enforcer in a region concurrently and
+    merge their results
+    
+    Args:
+        action: Function taking an enforcer and returning a result dict
+        region: Region being processed, for logging
+        
+    Returns:
+        dict: Concatenated result lists, plus 'error' naming each enforcer
+              that failed
+    """
+    enforcers = get_enforcers()
+    with ThreadPoolExecutor(max_workers=max(1, len(enforcers))) as executor:
+        futures = [(enforcer, submit_in_context(executor, action, enforcer)) for enforcer in enforcers]
+    
+    merged = {'error': None}
+    errors = []
+    for enforcer, future in futures:
+        try:
+            result = future.result()
+        except Exception as e:
+            log('ERROR', 'Enforcer failed', enforcer=enforcer.name, region=region, error=str(e))
+            result = {'error': str(e)}
+        for key, value in result.items():
+            if isinstance(value, list):
+                merged.setdefault(key, []).extend(value)
+        if result.get('error'):
+            errors.append(f"{enforcer.name}: {result['error']}")
+    
+    merged['error'] = '; '.join(errors) or None
+    return merged
+
+
+def stop_development_resources(region, account=None, tags=None):
+    """
+    Stop every running development resource in a region, running the
+    enabled enforcers concurrently
     
     Args:
-        event: Budget action event data
-        context: Lambda context object
+        region: AWS region to check
+        account: Target account ID, or None for the function's own account
+        tags: Stop tags (see resume_journal.stop_tags)
         
     Returns:
-        dict: Status and details of stopped instances
+        dict: 'stopped' and 'failed' resource detail lists, plus 'error'
+              if any enforcer failed part way through
     """
+    def stop(enforcer):
+        client = get_regional_client(enforcer.service, region, account)
+        return stop_resources_in_region(region, enforcer.discover(client, region, account), account, enforcer, tags)
     
-    print(f"Budget action triggered at {datetime.now()}")
-    print(f"Event: {json.dumps(event, indent=2)}")
+    return run_enforcers(stop, region)
+
+
+def stop_development_instances(region, account=None):
+    """
+    Stop all running EC2 instances tagged as Development in a specific region
     
-    # Parse budget event (if available)
-    budget_name = event.get('detail', {}).get('budgetName', 'Development-Account-Monthly-Budget')
-    threshold = event.get('detail', {}).get('threshold', 100)
+    Instances are discovered page by page and handed to the batch engine in
+    chunks as soon as each chunk fills, so stopping starts before discovery
+    has finished.
     
-    print(f"Budget: {budget_name}, Threshold: {threshold}%")
+    Args:
+        region: AWS region to check
+        account: Target account ID, or None for the function's own account
+        
+    Returns:
+        dict: 'stopped' and 'failed' instance detail lists, plus 'error'
+              if discovery itself failed part way through
+    """
+    enforcer = ENFORCERS['ec2']
+    client = get_regional_client(enforcer.service, region, account)
+    return stop_resources_in_region(region, enforcer.discover(client, region, account), account, enforcer)
+
+
+def discover_stopped_resources(region, account=None):
+    """
+    List resources in a region that a budget action stopped, from their tags
     
-    # Find all running development instances across all regions
-    stopped_instances = []
-    regions = get_all_regions()
+    Args:
+        region: AWS region to check
+        account: Target account ID, or None for the function's own account
+        
+    Returns:
+        dict: 'instances' journal entry list, plus 'error' if any enforcer
+              failed, in which case the region's journal entries are kept
+    """
+    def discover(enforcer):
+        client = get_regional_client(enforcer.service, region, account)
+        return {'instances': list(enforcer.discover_stopped(client, region, account)), 'error': None}
     
-    for region in regions:
-        print(f"Checking region: {region}")
-        stopped_in_region = stop_development_instances(region)
-        stopped_instances.extend(stopped_in_region)
+    return run_enforcers(discover, region)
+
+
+def discover_development_resources(region, account=None):
+    """
+    List running development resources in a region without stopping them
     
-    # Send notification
-    if stopped_instances:
-        send_notification(stopped_instances, budget_name, threshold)
+    Args:
+        region: AWS region to check
+        account: Target account ID, or None for the function's own account
         
+    Returns:
+        dict: 'instances' detail list, plus 'error' if discovery failed
+    """
+    def discover(enforcer):
+        resources = []
+        try:
+            client = get_regional_client(enforcer.service, region, account)
+            resources.extend(enforcer.discover(client, region, account))
+            return {'instances': resources, 'error': None}
+        except Exception as e:
+            log('ERROR', 'Error discovering resources', enforcer=enforcer.name, region=region, account=account, error=str(e))
+            return {'instances': resources, 'error': str(e)}
+    
+    return run_enforcers(discover, region)
+
+
+def stop_resources_in_region(region, resources, account=None, enforcer=None, tags=None):
+    """
+    Stop and tag resources in one region through the batch engine
+    
+    Resources of mixed types (e.g. a stop plan) are split by type and each
+    type is handed to its own enforcer concurrently.
+    
+    Args:
+        region: AWS region the resources are in
+        resources: Iterable of resource detail dicts, consumed lazily
+        account: Target account ID, or None for the function's own account
+        enforcer: ResourceEnforcer for every resource, or None to pick one
+                  per resource_type
+        tags: Stop tags (see resume_journal.stop_tags); defaults to tags
+              without a budget name
+        
+    Returns:
+        dict: 'stopped' and 'failed' resource detail lists, plus 'error'
+              if iterating the resources failed part way through
+    """
+    if enforcer is None:
+        by_enforcer = {}
+        for resource in resources:
+            by_enforcer.setdefault(ENFORCER_BY_TYPE[resource['resource_type']], []).append(resource)
+        with ThreadPoolExecutor(max_workers=max(1, len(by_enforcer))) as executor:
+            futures = [
+                submit_in_context(executor, stop_resources_in_region, region, group, account, type_enforcer, tags)
+                for type_enforcer, group in by_enforcer.items()
+            ]
+            results = [future.result() for future in futures]
         return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': f'Stopped {len(stopped_instances)} development instances',
-                'instances': stopped_instances
-            })
-        }
-    else:
-        print("No development instances found to stop")
-        return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'No development instances to stop'
-            })
+            'stopped': [r for result in results for r in result['stopped']],
+            'failed': [r for result in results for r in result['failed']],
+            'error': '; '.join(result['error'] for result in results if result['error']) or None
         }
+    
+    client = get_regional_client(enforcer.service, region, account)
+    if tags is None:
+        tags = stop_tags(None, None, STOP_REASON)
+    
+    # API rate limits are per account, region and service, so chunks share a bucket
+    bucket = AdaptiveTokenBucket(API_RATE_PER_SECOND)
+    in_flight = threading.BoundedSemaphore(CHUNK_CONCURRENCY * 2)
+    futures = []
+    result = {'stopped': [], 'failed': [], 'error': None}
+    
+    def run_chunk(chunk):
+        try:
+            return chunk, enforcer.stop_batch(client, chunk, tags, bucket)
+        finally:
+            in_flight.release()
+    
+    with ThreadPoolExecutor(max_workers=max(1, CHUNK_CONCURRENCY)) as executor:
+        try:
+            for chunk in iter_batches(resources, enforcer.batch_size):
+                # Bound queued chunks so discovery can't run far ahead of stopping
+                in_flight.acquire()
+                log('DEBUG', 'Stopping chunk', enforcer=enforcer.name, region=region, count=len(chunk))
+                futures.append(submit_in_context(executor, run_chunk, chunk))
+        
+        except Exception as e:
+            log('ERROR', 'Error discovering resources', enforcer=enforcer.name, region=region, account=account, error=str(e))
+            result['error'] = str(e)
+        
+        for future in futures:
+            chunk, outcomes = future.result()
+            for instance in chunk:
+                outcome = outcomes[instance['instance_id']]
+                if outcome['status'] == 'stopped':
+                    if outcome.get('tag_error'):
+                        instance['tag_error'] = outcome['tag_error']
+                    result['stopped'].append(instance)
+                else:
+                    instance['error'] = outcome['error']
+                    result['failed'].append(instance)
+    
+    if result['stopped'] or result['failed']:
+        log('INFO', 'Stopped resources', enforcer=enforcer.name, region=region, account=account,
+            stopped=len(result['stopped']), failed=len(result['failed']))
+    elif not result['error']:
+        log('INFO', 'No running development resources found', enforcer=enforcer.name, region=region, account=account)
+    
+    return result
 
 
-def get_all_regions():
+def stop_instance_chunk(ec2_regional, instance_ids, tags, bucket):
     """
-    Get list of all AWS regions where EC2 is available
+    Stop and tag one API-safe chunk of instances, reporting each instance
     
+    Throttled calls are retried with backoff. Any other error on a
+    multi-instance chunk splits it in half so one bad ID only fails itself.
+    
+    Args:
+        ec2_regional: Regional EC2 client
+        instance_ids: Instance IDs in this chunk
+        tags: Tags to apply to stopped instances
+        bucket: AdaptiveTokenBucket shared by the region
+        
     Returns:
-        list: List of region names
+        dict: Instance ID -> {'status': 'stopped'|'failed', 'error'/'tag_error'}
     """
+    region = ec2_regional.meta.region_name
     try:
-        # For production, you might want to limit to specific regions
-        # For this example, we'll use a subset of common regions
-        regions = [
-            'us-east-1',
-            'us-east-2',
-            'us-west-1',
-            'us-west-2',
-            'eu-west-1',
-            'eu-central-1',
-            'ap-southeast-1',
-            'ap-northeast-1'
-        ]
-        return regions
+        with timer('stop', Region=region):
+            call_with_backoff(bucket, ec2_regional.stop_instances, InstanceIds=instance_ids)
+    except client_error() as e:
+        if len(instance_ids) > 1 and not is_throttle_error(e):
+            middle = len(instance_ids) // 2
+            outcomes = stop_instance_chunk(ec2_regional, instance_ids[:middle], tags, bucket)
+            outcomes.update(stop_instance_chunk(ec2_regional, instance_ids[middle:], tags, bucket))
+            return outcomes
+        return {instance_id: {'status': 'failed', 'error': str(e)} for instance_id in instance_ids}
+    except Exception as e:
+        return {instance_id: {'status': 'failed', 'error': str(e)} for instance_id in instance_ids}
+    
+    outcomes = {instance_id: {'status': 'stopped'} for instance_id in instance_ids}
+    
+    # Tag instances with stop reason; a tagging failure doesn't undo the stop
+    try:
+        with timer('tag', Region=region), uncancellable():
+            call_with_backoff(bucket, ec2_regional.create_tags, Resources=instance_ids, Tags=tags)
     except Exception as e:
-        print(f"Error getting regions: {str(e)}")
-        return ['us-east-1']  # Fallback to default region
+        log('ERROR', 'Error tagging stopped instances', instance_ids=instance_ids, error=str(e))
+        for outcome in outcomes.values():
+            outcome['tag_error'] = str(e)
+    
+    return outcomes
 
 
-def stop_development_instances(region):
+def start_instance_chunk(ec2_regional, instance_ids, bucket):
     """
-    Stop all running EC2 instances tagged as Development in a specific region
+    Restart one chunk of instances and remove their AutoStopped tags
+    
+    Mirrors stop_instance_chunk: any non-throttle error on a multi-instance
+    chunk splits it in half, and an instance that no longer exists is
+    reported as missing.
     
     Args:
-        region: AWS region to check
+        ec2_regional: Regional EC2 client
+        instance_ids: Instance IDs in this chunk
+        bucket: AdaptiveTokenBucket shared by the region
         
     Returns:
-        list: List of stopped instance details
+        dict: Instance ID -> {'status': 'started'|'missing'|'failed', 'error'}
     """
-    ec2_regional = boto3.client('ec2', region_name=region)
-    stopped_instances = []
+    region = ec2_regional.meta.region_name
+    try:
+        with timer('start', Region=region):
+            call_with_backoff(bucket, ec2_regional.start_instances, InstanceIds=instance_ids)
+    except client_error() as e:
+        if len(instance_ids) > 1 and not is_throttle_error(e):
+            middle = len(instance_ids) // 2
+            outcomes = start_instance_chunk(ec2_regional, instance_ids[:middle], bucket)
+            outcomes.update(start_instance_chunk(ec2_regional, instance_ids[middle:], bucket))
+            return outcomes
+        status = 'missing' if e.response.get('Error', {}).get('Code') in NOT_FOUND_ERROR_CODES else 'failed'
+        return {instance_id: {'status': status, 'error': str(e)} for instance_id in instance_ids}
+    except Exception as e:
+        return {instance_id: {'status': 'failed', 'error': str(e)} for instance_id in instance_ids}
     
+    # A leftover tag doesn't undo the restart
     try:
-        # Find all running development instances
-        response = ec2_regional.describe_instances(
-            Filters=[
-                {
-                    'Name': 'tag:Environment',
-                    'Values': ['Development', 'development', 'dev', 'Dev']
-                },
-                {
-                    'Name': 'instance-state-name',
-                    'Values': ['running']
-                }
-            ]
+        call_with_backoff(
+            bucket,
+            ec2_regional.delete_tags,
+            Resources=instance_ids,
+            Tags=[{'Key': key} for key in AUTO_STOP_TAG_KEYS]
         )
+    except Exception as e:
+        log('ERROR', 'Error removing stop tags', instance_ids=instance_ids, error=str(e))
+    
+    return {instance_id: {'status': 'started'} for instance_id in instance_ids}
+
+
+def client_error():
+    """
+    botocore's ClientError, imported on first use like boto3 itself
+    
+    An except clause only evaluates this once an exception is raised, so
+    invocations whose AWS calls all succeed never import botocore here.
+    
+    Returns:
+        type: botocore.exceptions.ClientError
+    """
+    return lazy_import('botocore.exceptions').ClientError
+
+
+def is_throttle_error(error):
+    """
+    Check whether a botocore ClientError is an API throttling error
+    
+    Args:
+        error: ClientError raised by a boto3 call
         
-        # Extract instance IDs
-        instance_ids = []
-        instance_details = []
+    Returns:
+        bool: True if the call should be retried after backing off
+    """
+    return error.response.get('Error', {}).get('Code') in THROTTLE_ERROR_CODES
+
+
+def call_with_backoff(bucket, api_call, **kwargs):
+    """
+    Call an AWS API under the token bucket, retrying throttles with full jitter
+    
+    Args:
+        bucket: AdaptiveTokenBucket gating the call rate
+        api_call: Bound boto3 client method
+        **kwargs: Arguments passed to api_call
         
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_id = instance['InstanceId']
-                instance_ids.append(instance_id)
-                
-                # Get instance name from tags
-                instance_name = 'Unnamed'
-                for tag in instance.get('Tags', []):
-                    if tag['Key'] == 'Name':
-                        instance_name = tag['Value']
-                        break
-                
-                instance_details.append({
-                    'instance_id': instance_id,
-                    'instance_name': instance_name,
-                    'region': region,
-                    'instance_type': instance['InstanceType'],
-                    'private_ip': instance.get('PrivateIpAddress', 'N/A'),
-                    'launch_time': instance['LaunchTime'].isoformat()
-                })
+    Returns:
+        dict: API response
+    """
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        check_cancelled()
+        bucket.acquire()
+        check_cancelled()
+        try:
+            response = api_call(**kwargs)
+            bucket.on_success()
+            return response
+        except client_error() as e:
+            if not is_throttle_error(e) or attempt == MAX_THROTTLE_RETRIES:
+                raise
+            bucket.on_throttle()
+            delay = random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+            log('WARNING', 'Throttled, retrying', attempt=attempt + 1, delay_seconds=round(delay, 2))
+            time.sleep(delay)
+
+
+class AdaptiveTokenBucket:
+    """
+    Thread-safe token bucket that halves its rate on throttling and
+    recovers additively on success (AIMD)
+    """
+    
+    def __init__(self, rate, min_rate=0.5):
+        self.max_rate = max(rate, min_rate)
+        self.min_rate = min_rate
+        self.rate = self.max_rate
+        self.capacity = max(1.0, self.max_rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+    
+    def on_success(self):
+        """Recover towards the configured rate after a successful call"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+    
+    def on_throttle(self):
+        """Halve the rate and drop any burst allowance"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+
+
+def iter_development_instances(ec2_regional, region, page_size, account=None):
+    """
+    Lazily yield running development instances, following NextToken
+    
+    Args:
+        ec2_regional: Regional EC2 client
+        region: AWS region being checked
+        page_size: MaxResults per describe_instances page (5-1000)
+        account: Target account ID recorded on each instance, if not this account
         
-        # Stop instances if any found
-        if instance_ids:
-            print(f"Stopping {len(instance_ids)} instances in {region}: {instance_ids}")
-            
-            ec2_regional.stop_instances(InstanceIds=instance_ids)
-            
-            # Tag instances with stop reason
-            ec2_regional.create_tags(
-                Resources=instance_ids,
-                Tags=[
-                    {
-                        'Key': 'AutoStoppedBy',
-                        'Value': 'BudgetAction'
-                    },
-                    {
-                        'Key': 'AutoStoppedAt',
-                        'Value': datetime.now().isoformat()
-                    },
-                    {
-                        'Key': 'AutoStoppedReason',
-                        'Value': 'Development budget threshold exceeded'
-                    }
-                ]
-            )
-            
-            stopped_instances.extend(instance_details)
-            print(f"Successfully stopped {len(instance_ids)} instances in {region}")
-        else:
-            print(f"No running development instances found in {region}")
+    Yields:
+        dict: Instance details for each matching instance
+    """
+    filters = [
+        ENVIRONMENT_FILTER,
+        {
+            'Name': 'instance-state-name',
+            'Values': ['running']
+        }
+    ]
     
-    except Exception as e:
-        print(f"Error stopping instances in {region}: {str(e)}")
+    for instance in iter_instances(ec2_regional, page_size, filters):
+        if is_target_environment(get_tag(instance, 'Environment')):
+            yield instance_details(instance, region, account)
+
+
+def iter_instances(ec2_regional, page_size, filters):
+    """
+    Lazily yield raw describe_instances entries page by page
+    
+    Args:
+        ec2_regional: Regional EC2 client
+        page_size: MaxResults per describe_instances page (5-1000)
+        filters: describe_instances Filters
+        
+    Yields:
+        dict: Instance as returned by the EC2 API
+    """
+    for reservation in iter_pages(ec2_regional, 'describe_instances', 'Reservations', max(5, min(page_size, 1000)), Filters=filters):
+        for instance in reservation['Instances']:
+            yield instance
+
+
+def iter_pages(client, operation, result_key, page_size, **kwargs):
+    """
+    Lazily yield the items of a paginated describe call, page by page
+    
+    Args:
+        client: Regional boto3 client
+        operation: Paginated operation name (e.g. 'describe_db_instances')
+        result_key: Key holding the items in each page
+        page_size: Items per page, within the operation's limits
+        **kwargs: Operation arguments such as Filters
+        
+    Yields:
+        dict: Each item as returned by the API
+    """
+    paginator = client.get_paginator(operation)
+    pages = iter(paginator.paginate(PaginationConfig={'PageSize': page_size}, **kwargs))
+    region = client.meta.region_name
+    
+    while True:
+        check_cancelled()
+        # Time each page fetch on its own, not the consumer's work between pages
+        with timer('discovery', Region=region):
+            page = next(pages, None)
+        if page is None:
+            return
+        yield from page[result_key]
+
+
+def get_tag(instance, key, tags_key='Tags'):
+    """
+    Get a tag value from a describe_instances entry
+    
+    Args:
+        instance: Instance as returned by the EC2 API
+        key: Tag key
+        tags_key: Field holding the tags ('TagList' for RDS)
+        
+    Returns:
+        str: Tag value, or None if the tag is missing
+    """
+    for tag in instance.get(tags_key) or []:
+        if tag['Key'] == key:
+            return tag['Value']
+    return None
+
+
+def instance_details(instance, region, account=None):
+    """
+    Build the instance detail dict reported in responses and notifications
+    
+    Args:
+        instance: Instance as returned by the EC2 API
+        region: AWS region the instance is in
+        account: Target account ID, if not the function's own account
+        
+    Returns:
+        dict: Instance details
+    """
+    details = {
+        'resource_type': 'ec2-instance',
+        'instance_id': instance['InstanceId'],
+        'instance_name': get_tag(instance, 'Name') or 'Unnamed',
+        'region': region,
+        'instance_type': instance['InstanceType'],
+        'private_ip': instance.get('PrivateIpAddress', 'N/A'),
+        'launch_time': instance['LaunchTime'].isoformat()
+    }
+    if account:
+        details['account'] = account
+    return details
+
+
+def rds_details(resource, resource_type, region, account=None):
+    """
+    Build the detail dict for an RDS DB instance or cluster, in the same
+    shape as instance_details
+    
+    Args:
+        resource: DB instance or cluster as returned by the RDS API
+        resource_type: 'rds-instance' or 'rds-cluster'
+        region: AWS region the resource is in
+        account: Target account ID, if not the function's own account
+        
+    Returns:
+        dict: Resource details
+    """
+    if resource_type == 'rds-cluster':
+        identifier, arn, created = resource['DBClusterIdentifier'], resource['DBClusterArn'], resource.get('ClusterCreateTime')
+    else:
+        identifier, arn, created = resource['DBInstanceIdentifier'], resource['DBInstanceArn'], resource.get('InstanceCreateTime')
+    
+    details = {
+        'resource_type': resource_type,
+        'instance_id': identifier,
+        'instance_name': get_tag(resource, 'Name', 'TagList') or identifier,
+        'region': region,
+        'instance_type': resource['DBInstanceClass'],
+        'private_ip': 'N/A',
+        'launch_time': created.isoformat() if created else None,
+        'arn': arn
+    }
+    if account:
+        details['account'] = account
+    return details
+
+
+def inventory_record(instance, region):
+    """
+    Build an inventory index record: instance details plus state and tags
+    
+    Args:
+        instance: Instance as returned by the EC2 API
+        region: AWS region the instance is in
+        
+    Returns:
+        dict: Inventory record
+    """
+    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+    return dict(
+        instance_details(instance, region),
+        state=instance['State']['Name'],
+        environment=tags.get('Environment'),
+        tags=tags
+    )
+
+
+def iter_batches(items, batch_size):
+    """
+    Group an iterable into lists of at most batch_size items
     
-    return stopped_instances
+    Args:
+        items: Any iterable, consumed lazily
+        batch_size: Maximum number of items per batch
+        
+    Yields:
+        list: Next batch of items
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
-def send_notification(stopped_instances, budget_name, threshold):
+def send_notification(stopped_instances, budget_name, threshold, idempotency_key=None, in_progress=None, report=None):
     """
-    Send SNS notification about stopped instances
+    Send SNS notification about stopped resources
+    
+    The message is capped at NOTIFICATION_MAX_BYTES: per-region and per-type
+    counts come first, then one line per resource while they fit. When some
+    are left out, the full list is written to NOTIFICATION_REPORT_URI and
+    only a link goes in the message.
     
     Args:
         stopped_instances: List of stopped instance details
         budget_name: Name of the budget that triggered the action
         threshold: Budget threshold percentage
+        idempotency_key: Coalescing key, passed on so subscribers can de-duplicate
+        in_progress: Account/region labels still running when the sweep
+                     returned, whose outcome is unknown
+        report: report_writer callable shared with the response, if any
+        
+    Returns:
+        dict: 'status' ('sent', 'skipped' or 'failed') plus the message ID,
+              message size, resources listed, report link or error
     """
     
     # Get SNS topic ARN from environment variable
     sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
     
     if not sns_topic_arn:
-        print("SNS_TOPIC_ARN environment variable not set, skipping notification")
-        return
+        log('WARNING', 'SNS_TOPIC_ARN environment variable not set, skipping notification')
+        return {'status': 'skipped'}
     
-    # Build notification message
-    message_lines = [
+    now = datetime.now()
+    header = [
         "🚨 AWS Budget Action Triggered - Development Resources Stopped",
         "",
         f"Budget: {budget_name}",
         f"Threshold: {threshold}%",
-        f"Action Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}",
+        f"Action Time: {now.strftime('%Y-%m-%d %H:%M:%S UTC')}",
         "",
-        f"Stopped {len(stopped_instances)} EC2 instances:",
+        f"Stopped {len(stopped_instances)} resources.",
         ""
     ]
-    
-    # Add instance details
-    for idx, instance in enumerate(stopped_instances, 1):
-        message_lines.extend([
-            f"{idx}. Instance: {instance['instance_name']} ({instance['instance_id']})",
-            f"   Region: {instance['region']}",
-            f"   Type: {instance['instance_type']}",
-            f"   Private IP: {instance['private_ip']}",
+    if in_progress:
+        header += [
+            f"Still in progress, outcome unknown ({len(in_progress)} regions timed out; check their AutoStopped tags):",
+            ", ".join(in_progress)[:1024],
             ""
-        ])
-    
-    message_lines.extend([
+        ]
+    footer = [
         "Action Required:",
         "1. Review budget utilization in AWS Cost Explorer",
         "2. Identify cost drivers",
         "3. Implement cost optimization measures",
         "4. Restart instances only if budget allows",
-        "",
-        "To restart instances, remove AutoStopped tags and start manually.",
-        "",
+        ""
+    ]
+    if RESUME_ENABLED:
+        footer += [
+            "Stopped resources are tagged AutoStoppedBy=BudgetAction and restarted in waves by the scheduled",
+            "resume at the start of the next budget period, or once spend is back under the threshold.",
+            "Invoke the function with {\"action\": \"resume\", \"all\": true} to restart them now.",
+            ""
+        ]
+    footer += [
         "Dashboard: https://console.aws.amazon.com/billing/home#/budgets",
         "",
         "This is an automated message from AWS Lambda."
-    ])
+    ]
+    
+    report = report or report_writer(stopped_instances, [], budget_name, threshold, idempotency_key)
+    link_note = None
+    if NOTIFICATION_REPORT_URL_EXPIRY_SECONDS and NOTIFICATION_REPORT_URI.startswith('s3://'):
+        link_note = "(Presigned link: it stops working when the function's session credentials expire, usually within hours.)"
     
-    message = '\n'.join(message_lines)
+    message, listed, link = build_message(header, footer, stopped_instances, RESOURCE_LABELS,
+                                          NOTIFICATION_MAX_BYTES, report, link_note)
+    message_bytes = len(message.encode('utf-8'))
     
     # Build subject
-    subject = f"🚨 Budget Alert: {len(stopped_instances)} Development Instances Stopped"
+    subject = f"🚨 Budget Alert: {len(stopped_instances)} Development Resources Stopped"
     
     try:
         # Send notification
-        response = sns.publish(
-            TopicArn=sns_topic_arn,
-            Subject=subject[:100],  # SNS subject has 100 char limit
-            Message=message,
-            MessageAttributes={
-                'budget_name': {
-                    'DataType': 'String',
-                    'StringValue': budget_name
-                },
-                'instances_stopped': {
-                    'DataType': 'Number',
-                    'StringValue': str(len(stopped_instances))
-                },
-                'severity': {
-                    'DataType': 'String',
-                    'StringValue': 'HIGH'
+        with timer('publish'):
+            response = get_regional_client('sns', HOME_REGION).publish(
+                TopicArn=sns_topic_arn,
+                Subject=subject[:100],  # SNS subject has 100 char limit
+                Message=message,
+                MessageAttributes={
+                    'budget_name': {
+                        'DataType': 'String',
+                        'StringValue': budget_name
+                    },
+                    'instances_stopped': {
+                        'DataType': 'Number',
+                        'StringValue': str(len(stopped_instances))
+                    },
+                    'severity': {
+                        'DataType': 'String',
+                        'StringValue': 'HIGH'
+                    },
+                    'idempotency_key': {
+                        'DataType': 'String',
+                        'StringValue': idempotency_key or f'{budget_name}|{threshold}|-'
+                    }
                 }
-            }
-        )
+            )
+    except Exception as e:
+        log('ERROR', 'Error sending notification', error=str(e), message_bytes=message_bytes,
+            budget_name=budget_name, threshold=threshold)
+        return {'status': 'failed', 'error': str(e), 'bytes': message_bytes, 'report': link}
+    
+    log('INFO', 'Notification sent', message_id=response['MessageId'], message_bytes=message_bytes,
+        listed=listed, stopped=len(stopped_instances), report=link)
+    return {'status': 'sent', 'message_id': response['MessageId'], 'bytes': message_bytes,
+            'listed': listed, 'report': link}
+
+
+def report_writer(stopped_instances, failed_instances, budget_name, threshold, idempotency_key=None):
+    """
+    Callable that writes the full resource report on its first call
+    
+    The notification and the response both call it when their lists are
+    cut short, so the report is written at most once per invocation.
+    
+    Args:
+        stopped_instances: Stopped resource details
+        failed_instances: Resources that could not be stopped (with 'error')
+        budget_name: Name of the budget that triggered the action
+        threshold: Budget threshold percentage
+        idempotency_key: Coalescing key recorded in the report metadata
         
-        print(f"Notification sent successfully. Message ID: {response['MessageId']}")
+    Returns:
+        function: No-argument callable returning the report link, or None
+                  if NOTIFICATION_REPORT_URI is unset or the write failed
+    """
+    written = []
+    
+    def report():
+        if written:
+            return written[0]
+        link = None
+        if not NOTIFICATION_REPORT_URI:
+            log('WARNING', 'Resource list truncated and NOTIFICATION_REPORT_URI not set, full list not kept',
+                stopped=len(stopped_instances), failed=len(failed_instances))
+        else:
+            try:
+                with timer('report'):
+                    link = write_report(
+                        list(stopped_instances) + list(failed_instances),
+                        {
+                            'budget_name': budget_name,
+                            'threshold': threshold,
+                            'stopped': len(stopped_instances),
+                            'failed': len(failed_instances),
+                            'generated': datetime.now().isoformat(),
+                            'idempotency_key': idempotency_key
+                        },
+                        NOTIFICATION_REPORT_URI,
+                        report_name(budget_name, threshold),
+                        s3_client=get_report_s3_client() if NOTIFICATION_REPORT_URI.startswith('s3://') else None,
+                        url_expiry_seconds=NOTIFICATION_REPORT_URL_EXPIRY_SECONDS,
+                        endpoint_url=NOTIFICATION_REPORT_ENDPOINT_URL
+                    )
+            except Exception as e:
+                log('ERROR', 'Error writing resource report', destination=NOTIFICATION_REPORT_URI, error=str(e))
+        written.append(link)
+        return link
+    
+    return report
+
+
+def response_plan(plan, report):
+    """
+    Stop plan as returned in a response, with 'selected' cut to
+    RESPONSE_SAMPLE_MAX_BYTES
+    
+    Args:
+        plan: build_stop_plan result, or None
+        report: report_writer callable holding the full list
         
-    except Exception as e:
-        print(f"Error sending notification: {str(e)}")
+    Returns:
+        dict: Plan with 'selected' sampled, plus 'selected_count' and the
+              report link when the list was cut short
+    """
+    if plan is None:
+        return None
+    selected = sample_resources(plan['selected'], RESPONSE_SAMPLE_MAX_BYTES)
+    summary = dict(plan, selected=selected, selected_count=len(plan['selected']))
+    if len(selected) < len(plan['selected']):
+        summary['report'] = report()
+    return summary
+
+
+def get_report_s3_client():
+    """
+    S3 client for notification reports
+    
+    The pooled client is used unless NOTIFICATION_REPORT_ENDPOINT_URL points
+    at an S3-compatible store, which gets its own client.
+    """
+    global _report_s3_client
+    
+    if not NOTIFICATION_REPORT_ENDPOINT_URL:
+        return get_regional_client('s3', HOME_REGION)
+    with _client_pool_lock:
+        if _report_s3_client is None:
+            _report_s3_client = lazy_import('boto3').session.Session().client(
+                's3', region_name=HOME_REGION, endpoint_url=NOTIFICATION_REPORT_ENDPOINT_URL
+            )
+        return _report_s3_client
+
+
+# Import-time profile mode: report what each dependency costs to import
+if IMPORT_PROFILE:
+    log('INFO', 'Import profile', imports=profile_imports(PROFILED_IMPORTS))
 
 
 # For local testing
 if __name__ == "__main__":
+    if '--profile-imports' in sys.argv:
+        print(json.dumps(profile_imports(PROFILED_IMPORTS), indent=2))
+        sys.exit(0)
+    
     # Test event
     test_event = {
         "detail": {
@@ -0,0 +1,124 @@
+"""
+Module: Cross-Account Credentials
+Purpose: Parse the accounts a budget action enforces across, assume a role
+         into each one and cache the STS credentials until shortly before
+         they expire
+Used by: budget-action-stop-dev.py
+Author: Excipient Technologies Cloud Team
+"""
+
+import os
+import threading
+import time
+
+# Role assumed in every target account unless an entry names its own role
+TARGET_ROLE_NAME = os.environ.get('TARGET_ROLE_NAME', 'BudgetActionStopRole')
+ROLE_SESSION_NAME = os.environ.get('ROLE_SESSION_NAME', 'budget-action-stop-dev')
+ASSUME_ROLE_DURATION_SECONDS = int(os.environ.get('ASSUME_ROLE_DURATION_SECONDS', '3600'))
+
+# Credentials are renewed this long before they expire. The default covers the
+# 15 minute Lambda maximum, so a client handed out stays valid for a whole run.
+CREDENTIAL_REFRESH_MARGIN_SECONDS = int(os.environ.get('CREDENTIAL_REFRESH_MARGIN_SECONDS', '900'))
+
+# TARGET_ACCOUNTS entry for the account the function runs in (no role is assumed)
+LOCAL_ACCOUNT = 'self'
+
+
+def parse_target_accounts(value, role_name=TARGET_ROLE_NAME):
+    """
+    Parse TARGET_ACCOUNTS into account IDs and the role to assume in each
+
+    Entries are comma-separated and may be an account ID ('111111111111'),
+    an account ID with a role name ('111111111111:OtherRole'), a full role
+    ARN, or 'self' for the function's own account.
+
+    Args:
+        value: TARGET_ACCOUNTS string
+        role_name: Role name used when an entry doesn't give one
+
+    Returns:
+        dict: Account ID (None for 'self') -> role ARN (None for 'self'),
+              in configuration order. Empty input means only 'self'.
+    """
+    accounts = {}
+
+    for entry in (item.strip() for item in value.split(',')):
+        if not entry:
+            continue
+        if entry == LOCAL_ACCOUNT:
+            accounts[None] = None
+        elif entry.startswith('arn:'):
+            # arn:aws:iam::111111111111:role/Name
+            accounts[entry.split(':')[4]] = entry
+        else:
+            account_id, _, role = entry.partition(':')
+            if not (account_id.isdigit() and len(account_id) == 12):
+                raise ValueError(f"Invalid TARGET_ACCOUNTS entry {entry!r}: expected a 12-digit account ID")
+            accounts[account_id] = f"arn:aws:iam::{account_id}:role/{role or role_name}"
+
+    return accounts or {None: None}
+
+
+class CredentialCache:
+    """
+    Thread-safe cache of assumed-role credentials, one entry per role ARN
+
+    Concurrent sweeps of the same account share one AssumeRole call: each
+    role has its own lock, so a refresh for one account never blocks others.
+    sts_client is a callable returning the STS client, so nothing AWS-related
+    is built until the first role is assumed.
+    """
+
+    def __init__(self, sts_client, duration_seconds=ASSUME_ROLE_DURATION_SECONDS,
+                 refresh_margin=CREDENTIAL_REFRESH_MARGIN_SECONDS, session_name=ROLE_SESSION_NAME):
+        self.sts_client = sts_client
+        self.duration_seconds = duration_seconds
+        self.refresh_margin = refresh_margin
+        self.session_name = session_name
+        self.credentials = {}
+        self.role_locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, role_arn, now=None):
+        """
+        Credentials for a role, assuming it only if none are cached or they
+        expire within the refresh margin
+
+        Args:
+            role_arn: Role to assume
+            now: Epoch seconds (defaults to the current time)
+
+        Returns:
+            dict: aws_access_key_id, aws_secret_access_key, aws_session_token
+                  and expires_at (epoch seconds)
+        """
+        cached = self.credentials.get(role_arn)
+        if cached and self._fresh(cached, now):
+            return cached
+
+        with self.lock:
+            role_lock = self.role_locks.setdefault(role_arn, threading.Lock())
+
+        with role_lock:
+            cached = self.credentials.get(role_arn)
+            if cached and self._fresh(cached, now):
+                return cached
+
+            response = self.sts_client().assume_role(
+                RoleArn=role_arn,
+                RoleSessionName=self.session_name,
+                DurationSeconds=self.duration_seconds
+            )
+            issued = response['Credentials']
+            cached = {
+                'aws_access_key_id': issued['AccessKeyId'],
+                'aws_secret_access_key': issued['SecretAccessKey'],
+                'aws_session_token': issued['SessionToken'],
+                'expires_at': issued['Expiration'].timestamp()
+            }
+            self.credentials[role_arn] = cached
+            return cached
+
+    def _fresh(self, credentials, now):
+        now = time.time() if now is None else now
+        return credentials['expires_at'] - self.refresh_margin > now
@@ -0,0 +1,131 @@
+"""
+Module: Incremental Instance Inventory
+Purpose: Local index of instance ID -> tags, type, state and region, kept up
+         to date from EC2 state-change events so budget actions can read
+         candidates without a full describe sweep
+Used by: budget-action-stop-dev.py
+Author: Excipient Technologies Cloud Team
+"""
+
+import time
+
+from snapshot_log import SnapshotLog
+
+
+class InstanceInventory(SnapshotLog):
+    """
+    Instance index persisted through SnapshotLog
+
+    An event costs one appended log line; the log is also folded back into
+    the snapshot on reconcile. A secondary index of candidate IDs per region
+    (as decided by is_candidate) makes candidate reads O(matching instances).
+    """
+
+    def __init__(self, path, is_candidate, compact_after=5000):
+        self.is_candidate = is_candidate
+        super().__init__(path, compact_after)
+
+    def get(self, instance_id):
+        """Return a copy of one record, or None"""
+        with self.lock:
+            record = self.records.get(instance_id)
+            return dict(record) if record else None
+
+    def upsert(self, record):
+        """Insert or replace one instance record"""
+        self._record_change({'op': 'put', 'record': record})
+
+    def remove(self, instance_id):
+        """Drop an instance (e.g. once terminated)"""
+        self._record_change({'op': 'del', 'instance_id': instance_id})
+
+    def update_state(self, instance_id, state):
+        """
+        Update the state of a known instance
+
+        Returns:
+            bool: False if the instance is not in the index
+        """
+        with self.lock:
+            record = self.records.get(instance_id)
+            if record is None:
+                return False
+            self.upsert(dict(record, state=state))
+            return True
+
+    def replace_region(self, region, records, now=None):
+        """
+        Replace everything known about a region with a fresh sweep
+
+        Args:
+            region: Region that was swept
+            records: Complete list of records found in the region
+            now: Epoch seconds of the sweep
+        """
+        with self.lock:
+            for instance_id in [i for i, r in self.records.items() if r['region'] == region]:
+                self._unindex(instance_id)
+            for record in records:
+                self._index(record)
+            self.reconciled_at[region] = time.time() if now is None else now
+            self.compact()
+
+    def candidates(self, region=None):
+        """
+        Copies of candidate records, for one region or all regions
+
+        Args:
+            region: Region name, or None for every region
+
+        Returns:
+            list: Candidate records
+        """
+        with self.lock:
+            regions = [region] if region else list(self.candidate_ids)
+            return [
+                dict(self.records[instance_id])
+                for name in regions
+                for instance_id in self.candidate_ids.get(name, ())
+            ]
+
+    def candidate_regions(self):
+        """Regions that currently hold at least one candidate"""
+        with self.lock:
+            return sorted(region for region, ids in self.candidate_ids.items() if ids)
+
+    def stale_regions(self, regions, max_age, now=None):
+        """Regions not reconciled within max_age seconds"""
+        now = time.time() if now is None else now
+        return [region for region in regions if now - self.reconciled_at.get(region, 0) > max_age]
+
+    def _restore(self, snapshot):
+        snapshot = snapshot if isinstance(snapshot, dict) else {}
+        self.records = {}
+        self.candidate_ids = {}
+        self.reconciled_at = snapshot.get('reconciled_at', {})
+        for record in snapshot.get('instances', []):
+            self._index(record)
+
+    def _snapshot(self):
+        return {
+            'reconciled_at': self.reconciled_at,
+            'instances': list(self.records.values())
+        }
+
+    def _apply(self, change):
+        if change['op'] == 'put':
+            self._index(change['record'])
+        elif change['op'] == 'del':
+            self._unindex(change['instance_id'])
+
+    def _index(self, record):
+        instance_id = record['instance_id']
+        self._unindex(instance_id)
+        self.records[instance_id] = record
+        if self.is_candidate(record):
+            self.candidate_ids.setdefault(record['region'], set()).add(instance_id)
+
+    def _unindex(self, instance_id):
+        record = self.records.pop(instance_id, None)
+        if record is not None:
+            self.candidate_ids.get(record['region'], set()).discard(instance_id)
@@ -0,0 +1,214 @@
+"""
+Module: Lambda Instrumentation
+Purpose: Structured single-line JSON logs with level gating, phase timers
+         emitted as CloudWatch Embedded Metric Format (EMF) records, and
+         lazy imports with an import-time profile mode
+Used by: budget-action-slack.py, budget-action-stop-dev.py
+Author: Excipient Technologies Cloud Team
+"""
+
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LEVELS = {
+    'DEBUG': 10,
+    'INFO': 20,
+    'WARNING': 30,
+    'ERROR': 40
+}
+
+# Logging and metrics configuration
+LOG_LEVEL = LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ExcipientBudgetActions')
+FUNCTION_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+IMPORT_PROFILE = os.environ.get('IMPORT_PROFILE', 'false').lower() == 'true'
+
+LAMBDA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# EMF accepts at most 100 values per metric in one record
+EMF_MAX_VALUES = 100
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+# Modules fully imported by lazy_import. sys.modules alone can't tell: a module
+# another thread is still importing is already there, partly initialised.
+_imported = set()
+_import_lock = threading.Lock()
+
+
+def is_enabled(level):
+    """
+    Check whether a log level is enabled, so callers can skip building
+    expensive fields
+
+    Args:
+        level: 'DEBUG', 'INFO', 'WARNING' or 'ERROR'
+
+    Returns:
+        bool: True if records at this level are written
+    """
+    return LEVELS[level] >= LOG_LEVEL
+
+
+def log(level, message, **fields):
+    """
+    Write one structured log record as a single JSON line
+
+    Nothing is serialized when the level is disabled.
+
+    Args:
+        level: 'DEBUG', 'INFO', 'WARNING' or 'ERROR'
+        message: Short human-readable message
+        **fields: Extra structured fields
+    """
+    if LEVELS[level] < LOG_LEVEL:
+        return
+    record = {
+        'timestamp': round(time.time() * 1000),
+        'level': level,
+        'function': FUNCTION_NAME,
+        'message': message
+    }
+    record.update(fields)
+    sys.stdout.write(json.dumps(record, default=str, separators=(',', ':')) + '\n')
+
+
+@contextmanager
+def timer(phase, **dimensions):
+    """
+    Time a block and record its duration under a phase and dimensions
+
+    Args:
+        phase: Phase name (e.g. 'discovery', 'stop', 'webhook')
+        **dimensions: Extra metric dimensions such as region
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_duration(phase, (time.perf_counter() - started) * 1000, **dimensions)
+
+
+def record_duration(phase, duration_ms, **dimensions):
+    """
+    Add one duration sample to the pending metrics
+
+    Args:
+        phase: Phase name
+        duration_ms: Duration in milliseconds
+        **dimensions: Extra metric dimensions
+    """
+    key = (phase, tuple(sorted(dimensions.items())))
+    with _metrics_lock:
+        _metrics.setdefault(key, []).append(round(duration_ms, 3))
+
+
+def emit_metrics():
+    """
+    Flush pending durations as EMF records, one per phase/dimension set
+
+    CloudWatch extracts the 'Duration' metric from these log lines, so
+    p50/p99 latency per phase and region can be charted without PutMetricData.
+    """
+    with _metrics_lock:
+        pending = dict(_metrics)
+        _metrics.clear()
+
+    timestamp = round(time.time() * 1000)
+    for (phase, dimensions), values in pending.items():
+        dimension_names = ['Function', 'Phase'] + [name for name, _ in dimensions]
+        for start in range(0, len(values), EMF_MAX_VALUES):
+            record = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': METRICS_NAMESPACE,
+                        'Dimensions': [dimension_names],
+                        'Metrics': [{'Name': 'Duration', 'Unit': 'Milliseconds'}]
+                    }]
+                },
+                'Function': FUNCTION_NAME,
+                'Phase': phase,
+                'Duration': values[start:start + EMF_MAX_VALUES]
+            }
+            record.update(dimensions)
+            sys.stdout.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+def lazy_import(name):
+    """
+    Import a module on first use, timing the import as the 'import' phase
+
+    Heavy dependencies such as boto3 are imported through this instead of at
+    module level, so cold starts and invocations that never need them skip
+    the cost.
+
+    Args:
+        name: Module name (e.g. 'boto3')
+
+    Returns:
+        module: The imported module
+    """
+    if name in _imported:
+        return sys.modules[name]
+
+    with _import_lock:
+        if name in _imported:
+            return sys.modules[name]
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        duration_ms = (time.perf_counter() - started) * 1000
+        _imported.add(name)
+    record_duration('import', duration_ms, Module=name)
+    log('INFO' if IMPORT_PROFILE else 'DEBUG', 'Imported module', module=name, duration_ms=round(duration_ms, 1))
+    return module
+
+
+def profile_imports(modules):
+    """
+    Measure the cold import cost of each module in a fresh interpreter
+
+    Each module is imported alone under python -X importtime, so the figure
+    includes everything it pulls in and is not hidden by modules that an
+    earlier import already loaded.
+
+    Args:
+        modules: Module names to profile
+
+    Returns:
+        list: {'module', 'self_ms', 'cumulative_ms'} dicts (or 'error'),
+              most expensive first
+    """
+    subprocess = lazy_import('subprocess')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [LAMBDA_DIR, os.environ.get('PYTHONPATH')])))
+    profile = []
+
+    for name in modules:
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {name}'],
+            capture_output=True, text=True, env=env, check=False
+        )
+        if completed.returncode != 0:
+            profile.append({'module': name, 'error': (completed.stderr.strip().splitlines() or ['import failed'])[-1]})
+            continue
+
+        for line in completed.stderr.splitlines():
+            fields = line.split(':', 1)[-1].split('|')
+            if line.startswith('import time:') and len(fields) == 3 and fields[2].strip() == name:
+                profile.append({
+                    'module': name,
+                    'self_ms': round(int(fields[0]) / 1000, 1),
+                    'cumulative_ms': round(int(fields[1]) / 1000, 1)
+                })
+                break
+        else:
+            # Already imported by the interpreter at startup
+            profile.append({'module': name, 'self_ms': 0.0, 'cumulative_ms': 0.0})
+
+    return sorted(profile, key=lambda entry: entry.get('cumulative_ms', float('inf')), reverse=True)
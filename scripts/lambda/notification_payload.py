@@ -0,0 +1,222 @@
+"""
+Module: Notification Payload
+Purpose: Build stop notifications that fit a fixed byte budget, and offload
+         the full resource list to a compressed report
+Used by: budget-action-stop-dev.py
+Author: Excipient Technologies Cloud Team
+"""
+
+import gzip
+import io
+import json
+import os
+import re
+import time
+from collections import Counter
+from urllib.parse import quote
+
+# SNS rejects messages over 256 KB
+SNS_MESSAGE_LIMIT_BYTES = 262144
+
+# Room kept for the overflow line and report link (presigned URLs are long),
+# at most a quarter of the budget
+LINK_RESERVE_BYTES = 2048
+
+# Durable link to a report in AWS S3; opening it needs console access to the bucket
+S3_CONSOLE_URL = 'https://s3.console.aws.amazon.com/s3/object/{bucket}?prefix={key}'
+
+
+class ByteBudget:
+    """Collects message lines until the UTF-8 encoded text reaches max_bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lines = []
+        self.size = 0
+
+    def fits(self, line):
+        return self.size + len(line.encode('utf-8')) + 1 <= self.max_bytes
+
+    def add(self, line):
+        """Append a line if it fits; returns False (and adds nothing) otherwise"""
+        if not self.fits(line):
+            return False
+        self.lines.append(line)
+        self.size += len(line.encode('utf-8')) + 1
+        return True
+
+
+def summary_sections(resources, labels):
+    """
+    Per-region and per-type counts, largest first
+
+    Args:
+        resources: Resource detail dicts
+        labels: resource_type -> display label
+
+    Returns:
+        list: (title, [(label, count)]) sections
+    """
+    by_region = Counter(
+        f"{resource['region']} (account {resource['account']})" if resource.get('account') else resource['region']
+        for resource in resources
+    )
+    by_type = Counter(
+        f"{labels.get(resource.get('resource_type'), 'Instance')} {resource.get('instance_type', 'unknown')}"
+        for resource in resources
+    )
+    return [('By region:', by_region.most_common()), ('By type:', by_type.most_common())]
+
+
+def resource_line(resource, labels):
+    """One compact line per resource"""
+    account = f" account {resource['account']}" if resource.get('account') else ""
+    return (
+        f"- {labels.get(resource.get('resource_type'), 'Instance')} {resource['instance_name']} "
+        f"({resource['instance_id']}) {resource.get('instance_type', '')} {resource['region']}{account} "
+        f"{resource.get('private_ip', '')}"
+    ).rstrip()
+
+
+def build_message(header, footer, resources, labels, max_bytes, report_link=None, link_note=None):
+    """
+    Render a notification that never exceeds max_bytes
+
+    The header, per-region and per-type summaries come first, then one line
+    per resource for as many resources as still fit. If any are left out, the
+    message says how many and, when a report was written, links to it. The
+    footer is always kept.
+
+    Args:
+        header: Lines before the summary
+        footer: Lines closing the message
+        resources: Resource detail dicts
+        labels: resource_type -> display label
+        max_bytes: Byte budget for the whole message
+        report_link: Callable returning the full-list link, called only
+                     when resources had to be left out (may return None)
+        link_note: Line added after the link, e.g. when it expires
+
+    Returns:
+        tuple: (message text, number of resources listed individually,
+                link or None)
+    """
+    footer_bytes = sum(len(line.encode('utf-8')) + 1 for line in footer)
+    reserve = min(LINK_RESERVE_BYTES, max_bytes // 4)
+    budget = ByteBudget(max_bytes - footer_bytes - reserve)
+    for line in header:
+        if not budget.add(line):
+            break
+
+    for title, counts in summary_sections(resources, labels):
+        if not budget.add(title):
+            break
+        for position, (label, count) in enumerate(counts):
+            if not budget.add(f"  {label}: {count}"):
+                budget.add(f"  ... and {len(counts) - position} more")
+                break
+        budget.add("")
+
+    listed = 0
+    if budget.add("Resources:"):
+        for resource in resources:
+            if not budget.add(resource_line(resource, labels)):
+                break
+            listed += 1
+
+    # The reserve is released for the overflow notice and link
+    budget.max_bytes += reserve
+    link = None
+    if listed < len(resources):
+        budget.add(f"... and {len(resources) - listed} more not listed here.")
+        link = report_link() if report_link else None
+        if link and not budget.add(f"Full list: {link}"):
+            budget.add("Full list written to the report store (link too long for this message).")
+        elif link and link_note:
+            budget.add(link_note)
+    budget.add("")
+
+    return '\n'.join(budget.lines + list(footer)), listed, link
+
+
+def sample_resources(resources, max_bytes):
+    """
+    Leading resources whose JSON encoding fits in max_bytes
+
+    Used to keep inline lists in responses bounded; the full list goes to
+    the report.
+
+    Args:
+        resources: Resource detail dicts
+        max_bytes: Byte budget for the encoded list
+
+    Returns:
+        list: The first resources that fit
+    """
+    budget = ByteBudget(max_bytes)
+    count = 0
+    for resource in resources:
+        if not budget.add(json.dumps(resource, default=str)):
+            break
+        count += 1
+    return resources[:count]
+
+
+def report_name(budget_name, threshold, now=None):
+    """Report object/file name: <period>/<timestamp>-<budget>-<threshold>.jsonl.gz"""
+    now = time.time() if now is None else now
+    safe_budget = re.sub(r'[^A-Za-z0-9_.-]+', '-', str(budget_name)).strip('-') or 'budget'
+    return f"{time.strftime('%Y-%m', time.gmtime(now))}/{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(now))}-{safe_budget}-{threshold}.jsonl.gz"
+
+
+def write_report(resources, metadata, destination, name, s3_client=None, url_expiry_seconds=0, endpoint_url=None):
+    """
+    Write the full resource list as gzip-compressed JSON lines
+
+    The first line is the metadata; each further line is one resource.
+
+    Args:
+        resources: Resource detail dicts
+        metadata: Dict describing the action (budget, threshold, counts)
+        destination: 's3://bucket/prefix' or a local directory
+        name: Relative report name (see report_name)
+        s3_client: Client for s3:// destinations (any S3-compatible endpoint)
+        url_expiry_seconds: Presign the S3 link for this long. A presigned
+                            URL stops working when the signing credentials
+                            expire, which for a Lambda role is usually
+                            within hours, whatever this says
+        endpoint_url: S3-compatible endpoint the client points at, if not AWS
+
+    Returns:
+        str: Presigned URL, S3 console link (AWS) or s3:// URI (other
+             endpoints), or a file:// URL for local reports
+    """
+    if destination.startswith('s3://'):
+        bucket, _, prefix = destination[len('s3://'):].partition('/')
+        key = f"{prefix.strip('/')}/{name}" if prefix.strip('/') else name
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as compressed:
+            _write_lines(compressed, resources, metadata)
+        s3_client.put_object(
+            Bucket=bucket, Key=key, Body=buffer.getvalue(),
+            ContentType='application/x-ndjson', ContentEncoding='gzip'
+        )
+        if url_expiry_seconds:
+            return s3_client.generate_presigned_url(
+                'get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=url_expiry_seconds
+            )
+        if endpoint_url:
+            return f"s3://{bucket}/{key}"
+        return S3_CONSOLE_URL.format(bucket=quote(bucket), key=quote(key))
+
+    path = os.path.join(destination, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, 'wb') as compressed:
+        _write_lines(compressed, resources, metadata)
+    return f"file://{os.path.abspath(path)}"
+
+
+def _write_lines(stream, resources, metadata):
+    stream.write(json.dumps(metadata, default=str).encode('utf-8') + b'\n')
+    for resource in resources:
+        stream.write(json.dumps(resource, default=str, separators=(',', ':')).encode('utf-8') + b'\n')
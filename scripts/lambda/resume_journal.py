@@ -0,0 +1,268 @@
+"""
+Module: Resume Journal
+Purpose: Compact record of every resource a budget action stopped and why,
+         so the resources can be restarted in waves once the budget period
+         rolls over or spend falls back under the threshold. The AutoStopped
+         tags written on each stopped resource are the durable record; the
+         journal caches them with restart attempts between sweeps.
+Used by: budget-action-stop-dev.py
+Author: Excipient Technologies Cloud Team
+"""
+
+import re
+import time
+from datetime import datetime, timezone
+
+from snapshot_log import SnapshotLog
+
+# Tags written on every stopped resource and removed again on restart
+STOP_TAG_BY = 'BudgetAction'
+STOP_TAG_KEYS = ['AutoStoppedBy', 'AutoStoppedAt', 'AutoStoppedReason', 'AutoStoppedBudget', 'AutoStoppedThreshold']
+
+# Characters RDS accepts in tag values (EC2 accepts any)
+UNSAFE_TAG_CHARACTERS = re.compile(r'[^\w .:/=+\-@]')
+
+
+def budget_period(timestamp=None):
+    """
+    Budget period (UTC calendar month) containing a point in time
+
+    Args:
+        timestamp: Epoch seconds (defaults to the current time)
+
+    Returns:
+        str: Period as 'YYYY-MM'
+    """
+    moment = datetime.fromtimestamp(time.time() if timestamp is None else timestamp, timezone.utc)
+    return moment.strftime('%Y-%m')
+
+
+def tag_value(value):
+    """Make a value safe for EC2 and RDS tags (256 characters, limited charset)"""
+    return UNSAFE_TAG_CHARACTERS.sub('-', str(value))[:256]
+
+
+def stop_tags(budget_name, threshold, reason, now=None):
+    """
+    Tags recording which budget action stopped a resource, and when
+
+    Args:
+        budget_name: Budget whose action stopped it (None to leave out the
+                     budget and threshold tags)
+        threshold: Threshold percentage that was crossed
+        reason: Short human-readable reason
+        now: Epoch seconds of the stop
+
+    Returns:
+        list: EC2/RDS {'Key', 'Value'} tag dicts
+    """
+    now = time.time() if now is None else now
+    tags = {
+        'AutoStoppedBy': STOP_TAG_BY,
+        'AutoStoppedAt': datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        'AutoStoppedReason': tag_value(reason)
+    }
+    if budget_name is not None:
+        tags['AutoStoppedBudget'] = tag_value(budget_name)
+        tags['AutoStoppedThreshold'] = tag_value(threshold)
+    return [{'Key': key, 'Value': value} for key, value in tags.items()]
+
+
+def entry_from_tags(resource, tags):
+    """
+    Rebuild a journal entry from the AutoStopped tags on a stopped resource
+
+    Args:
+        resource: Detail dict with 'resource_type', 'instance_id', 'region'
+                  and optional 'account'/'arn'
+        tags: Tag key -> value
+
+    Returns:
+        dict: Journal entry, or None if a budget action didn't stop it
+    """
+    if tags.get('AutoStoppedBy') != STOP_TAG_BY:
+        return None
+    try:
+        stopped = datetime.fromisoformat(tags.get('AutoStoppedAt', ''))
+        if stopped.tzinfo is None:
+            stopped = stopped.replace(tzinfo=timezone.utc)
+        stopped_at = stopped.timestamp()
+    except ValueError:
+        stopped_at = 0  # unreadable stop time: treat as an earlier period
+    entry = {
+        'resource_type': resource.get('resource_type', 'ec2-instance'),
+        'instance_id': resource['instance_id'],
+        'region': resource['region'],
+        'budget_name': tags.get('AutoStoppedBudget'),
+        'threshold': tags.get('AutoStoppedThreshold'),
+        'reason': tags.get('AutoStoppedReason'),
+        'stopped_at': round(stopped_at),
+        'period': budget_period(stopped_at),
+        'attempts': 0
+    }
+    for optional in ('account', 'arn'):
+        if resource.get(optional):
+            entry[optional] = resource[optional]
+    return entry
+
+
+def journal_key(resource):
+    """
+    Journal key for a resource detail dict or journal entry
+
+    Args:
+        resource: Dict with 'instance_id', 'region' and optional
+                  'resource_type'/'account'
+
+    Returns:
+        str: 'account|region|resource_type|id' ('self' for the function's
+             own account). RDS identifiers are only unique per region.
+    """
+    return '|'.join([
+        resource.get('account') or 'self',
+        resource['region'],
+        resource.get('resource_type') or 'ec2-instance',
+        resource['instance_id']
+    ])
+
+
+class ResumeJournal(SnapshotLog):
+    """
+    Stopped-resource journal persisted through SnapshotLog
+
+    Entries only hold what is needed to restart a resource and explain why
+    it was stopped.
+
+    The journal is a cache: a container's /tmp rarely survives until the
+    next budget period, so reconcile() refreshes it from the AutoStopped
+    tags found on stopped resources before each resume. It still carries
+    restart attempts, and resources whose stop tags could not be written.
+    """
+
+    def __init__(self, path, compact_after=1000):
+        super().__init__(path, compact_after)
+
+    def record_stops(self, resources, budget_name, threshold, reason, now=None):
+        """
+        Journal resources that were just stopped
+
+        A resource that is already journaled keeps its original stop time,
+        so a repeated stop doesn't push its restart into a later period.
+
+        Args:
+            resources: Stopped resource detail dicts
+            budget_name: Budget whose action stopped them
+            threshold: Threshold percentage that was crossed
+            reason: Short human-readable reason
+            now: Epoch seconds of the stop
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            for resource in resources:
+                key = journal_key(resource)
+                if key in self.entries:
+                    continue
+                entry = {
+                    'resource_type': resource.get('resource_type', 'ec2-instance'),
+                    'instance_id': resource['instance_id'],
+                    'region': resource['region'],
+                    'budget_name': budget_name,
+                    'threshold': threshold,
+                    'reason': reason,
+                    'stopped_at': round(now),
+                    'period': budget_period(now),
+                    'attempts': 0
+                }
+                for optional in ('account', 'arn'):
+                    if resource.get(optional):
+                        entry[optional] = resource[optional]
+                if resource.get('tag_error'):
+                    # Only the journal knows about it; reconcile() must keep it
+                    entry['untagged'] = True
+                self._record_change({'op': 'put', 'entry': entry})
+
+    def reconcile(self, tagged, swept):
+        """
+        Refresh the journal from the stop tags found by a sweep
+
+        Tagged resources missing from the journal are added. Journaled
+        resources in a swept account, region and type that no longer carry
+        stop tags (restarted by hand, deleted, or restarted by RDS after
+        seven days) are dropped, unless their tags were never written.
+
+        Args:
+            tagged: Entries rebuilt with entry_from_tags
+            swept: Set of (account or 'self', region, resource_type) that
+                   were swept completely
+        """
+        with self.lock:
+            found = set()
+            for entry in tagged:
+                key = journal_key(entry)
+                found.add(key)
+                if key not in self.entries:
+                    self._record_change({'op': 'put', 'entry': entry})
+
+            for key, entry in list(self.entries.items()):
+                scope = (entry.get('account') or 'self', entry['region'], entry['resource_type'])
+                if key not in found and scope in swept and not entry.get('untagged'):
+                    self._record_change({'op': 'del', 'key': key})
+
+    def pending(self, budget_name=None, before_period=None):
+        """
+        Copies of journaled entries, oldest stop first
+
+        Args:
+            budget_name: Only entries stopped by this budget (as named in
+                         the event or in its tag)
+            before_period: Only entries stopped in an earlier period ('YYYY-MM')
+
+        Returns:
+            list: Journal entries
+        """
+        names = None if budget_name is None else {budget_name, tag_value(budget_name)}
+        with self.lock:
+            entries = [
+                dict(entry) for entry in self.entries.values()
+                if (names is None or entry['budget_name'] in names)
+                and (before_period is None or entry['period'] < before_period)
+            ]
+        return sorted(entries, key=lambda entry: entry['stopped_at'])
+
+    def mark_resumed(self, entries):
+        """Drop entries whose resources were restarted or no longer exist"""
+        for entry in entries:
+            self._record_change({'op': 'del', 'key': journal_key(entry)})
+
+    def mark_failed(self, entries, max_attempts):
+        """
+        Count a failed restart, dropping entries that reached max_attempts
+
+        Returns:
+            list: Entries that were dropped
+        """
+        dropped = []
+        with self.lock:
+            for entry in entries:
+                current = self.entries.get(journal_key(entry))
+                if current is None:
+                    continue
+                attempts = current['attempts'] + 1
+                if attempts >= max_attempts:
+                    dropped.append(current)
+                    self._record_change({'op': 'del', 'key': journal_key(current)})
+                else:
+                    self._record_change({'op': 'put', 'entry': dict(current, attempts=attempts)})
+        return dropped
+
+    def _restore(self, snapshot):
+        self.entries = {journal_key(entry): entry for entry in snapshot or []}
+
+    def _snapshot(self):
+        return list(self.entries.values())
+
+    def _apply(self, change):
+        if change['op'] == 'put':
+            self.entries[journal_key(change['entry'])] = change['entry']
+        elif change['op'] == 'del':
+            self.entries.pop(change['key'], None)
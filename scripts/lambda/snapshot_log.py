@@ -0,0 +1,89 @@
+"""
+Module: Snapshot Log Persistence
+Purpose: Shared storage layout for local state files: a JSON snapshot plus an
+         append-only change log that is folded back into the snapshot
+Used by: instance_inventory.py, resume_journal.py
+Author: Excipient Technologies Cloud Team
+"""
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+
+
+class SnapshotLog(ABC):
+    """
+    State persisted as a JSON snapshot plus an append-only change log
+
+    Each change is one appended log line, so persisting it costs O(1). The
+    log is folded back into the snapshot once it grows past compact_after
+    lines, or whenever a subclass calls compact(). A torn final line from
+    an interrupted write is skipped on load. Point path at shared storage
+    such as an EFS mount if several Lambda containers must see the state.
+
+    Subclasses hold the records and implement _restore, _snapshot and
+    _apply; any attributes those need must be set before __init__ runs.
+    """
+
+    def __init__(self, path, compact_after):
+        self.path = path
+        self.log_path = f"{path}.log"
+        self.compact_after = compact_after
+        self.log_lines = 0
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        """Rebuild the in-memory state from the snapshot and change log"""
+        with self.lock:
+            try:
+                with open(self.path) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, ValueError):
+                snapshot = None
+            self._restore(snapshot)
+
+            self.log_lines = 0
+            try:
+                with open(self.log_path) as log_file:
+                    for line in log_file:
+                        try:
+                            change = json.loads(line)
+                        except ValueError:
+                            continue  # torn final line from an interrupted write
+                        self._apply(change)
+                        self.log_lines += 1
+            except OSError:
+                pass
+
+    def compact(self):
+        """Write the full state as a new snapshot and clear the change log"""
+        with self.lock:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as snapshot_file:
+                json.dump(self._snapshot(), snapshot_file)
+            os.replace(temp_path, self.path)
+            open(self.log_path, 'w').close()
+            self.log_lines = 0
+
+    def _record_change(self, change):
+        with self.lock:
+            self._apply(change)
+            with open(self.log_path, 'a') as log_file:
+                log_file.write(json.dumps(change, separators=(',', ':')) + '\n')
+            self.log_lines += 1
+            if self.log_lines >= self.compact_after:
+                self.compact()
+
+    @abstractmethod
+    def _restore(self, snapshot):
+        """Replace the in-memory state with a loaded snapshot (None if missing or unreadable)"""
+
+    @abstractmethod
+    def _snapshot(self):
+        """JSON-serialisable snapshot of the in-memory state"""
+
+    @abstractmethod
+    def _apply(self, change):
+        """Apply one change (as passed to _record_change) to the in-memory state"""
@@ -0,0 +1,271 @@
+"""
+Module: Budget Stop Planner
+Purpose: Rank development instances by estimated hourly cost and pick the
+         smallest set of stops that brings projected spend under budget
+Used by: budget-action-stop-dev.py
+Author: Excipient Technologies Cloud Team
+"""
+
+import calendar
+import glob
+import json
+import math
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from instrumentation import log
+
+LAMBDA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Bundled offline price table and the budget the planner works against. The
+# budget is read from budgets/ packaged next to the function, falling back to
+# the repository copy when run from a checkout
+PRICE_TABLE_PATH = os.environ.get('PRICE_TABLE_PATH', os.path.join(LAMBDA_DIR, 'ec2-prices.json'))
+PACKAGED_BUDGET_FILE = os.path.join(LAMBDA_DIR, 'budgets', 'development-budget.json')
+REPOSITORY_BUDGET_FILE = os.path.join(LAMBDA_DIR, '..', '..', 'budgets', 'development-budget.json')
+BUDGET_FILE = os.environ.get('BUDGET_FILE') or (
+    REPOSITORY_BUDGET_FILE
+    if not os.path.exists(PACKAGED_BUDGET_FILE) and os.path.exists(REPOSITORY_BUDGET_FILE)
+    else PACKAGED_BUDGET_FILE
+)
+
+# Further spend the plan always allows for the rest of the month, as a percentage
+# of the budget limit; once spend nears or passes the limit this caps growth
+# instead of holding projected spend under the limit, which is no longer possible
+PLAN_GROWTH_ALLOWANCE_PCT = float(os.environ.get('PLAN_GROWTH_ALLOWANCE_PCT', '5'))
+
+# Size multipliers relative to .large, used when a size isn't in the price table
+SIZE_FACTORS = {
+    'nano': 1 / 16,
+    'micro': 1 / 8,
+    'small': 1 / 4,
+    'medium': 1 / 2,
+    'large': 1,
+    'xlarge': 2
+}
+
+
+@lru_cache(maxsize=None)
+def load_price_index(path=PRICE_TABLE_PATH):
+    """
+    Load the price table into exact and per-family lookup indexes
+
+    Args:
+        path: Path to the JSON price table
+
+    Returns:
+        tuple: (instance type -> hourly price,
+                family -> hourly price of a .large equivalent,
+                default .large price for unknown families)
+    """
+    with open(path) as price_file:
+        table = json.load(price_file)
+
+    prices = table['prices']
+    family_totals = {}
+    for instance_type, price in prices.items():
+        family, size = instance_type.split('.', 1)
+        factor = size_factor(size)
+        if factor:
+            total, count = family_totals.get(family, (0.0, 0))
+            family_totals[family] = (total + price / factor, count + 1)
+
+    family_index = {family: total / count for family, (total, count) in family_totals.items()}
+    return prices, family_index, table['default_price_per_large']
+
+
+def size_factor(size):
+    """
+    Size multiplier relative to .large (e.g. '4xlarge' -> 8)
+
+    Args:
+        size: Instance size suffix
+
+    Returns:
+        float: Multiplier, or None for sizes like 'metal'
+    """
+    if size in SIZE_FACTORS:
+        return SIZE_FACTORS[size]
+    if size.endswith('xlarge') and size[:-6].isdigit():
+        return 2 * int(size[:-6])
+    return None
+
+
+def estimate_hourly_cost(instance_type, price_index=None):
+    """
+    Estimated On-Demand hourly cost for an instance type
+
+    RDS classes ('db.m5.large') are priced as the matching EC2 type, which
+    is close enough for ranking stops.
+
+    Args:
+        instance_type: EC2 instance type (e.g. 'm5.large') or RDS class
+        price_index: Result of load_price_index (loaded on demand if omitted)
+
+    Returns:
+        float: USD per hour
+    """
+    prices, family_index, default_large = price_index or load_price_index()
+    if instance_type.startswith('db.'):
+        instance_type = instance_type[3:]
+
+    price = prices.get(instance_type)
+    if price is not None:
+        return price
+
+    family, _, size = instance_type.partition('.')
+    return family_index.get(family, default_large) * (size_factor(size) or 1)
+
+
+def load_budget_limit(budget_name=None, path=BUDGET_FILE):
+    """
+    Read the BudgetLimit amount from a budgets/*.json definition
+
+    With budget_name, the definition whose BudgetName matches is used: path
+    if it is that budget, otherwise another *.json file beside it. A limit
+    is never taken from a different budget.
+
+    Args:
+        budget_name: Budget to look up, or None to read path as is
+        path: Path to the budget file
+
+    Returns:
+        float: Budget limit, or None if no readable definition matches (a
+               plan then stops every candidate)
+    """
+    candidates = [path]
+    if budget_name is not None:
+        candidates += [
+            other for other in sorted(glob.glob(os.path.join(os.path.dirname(path), '*.json')))
+            if os.path.abspath(other) != os.path.abspath(path)
+        ]
+
+    for candidate in candidates:
+        try:
+            with open(candidate) as budget_file:
+                definition = json.load(budget_file)
+            if budget_name is not None and definition.get('BudgetName') != budget_name:
+                continue
+            return float(definition['BudgetLimit']['Amount'])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            if candidate == path:
+                log('ERROR', 'Could not read budget limit; package budgets/*.json with the function '
+                    'or set BUDGET_FILE', path=candidate, error=str(e))
+
+    if budget_name is not None:
+        log('WARNING', 'No budget file defines this budget', budget_name=budget_name,
+            directory=os.path.dirname(path))
+    return None
+
+
+def parse_amount(value):
+    """
+    USD amount from an event or API field
+
+    Args:
+        value: Number or numeric string (e.g. '1234.5')
+
+    Returns:
+        float: Amount, or None if missing or not a finite number
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        return None
+    return amount if math.isfinite(amount) else None
+
+
+def hours_left_in_month(now=None):
+    """
+    Hours remaining in the current (UTC) budget month
+
+    Args:
+        now: Timezone-aware datetime (defaults to the current time)
+
+    Returns:
+        float: Hours until the end of the month
+    """
+    now = now or datetime.now(timezone.utc)
+    days_in_month = calendar.monthrange(now.year, now.month)[1]
+    month_end = now.replace(day=days_in_month, hour=0, minute=0, second=0, microsecond=0)
+    return (month_end - now).total_seconds() / 3600 + 24
+
+
+def build_stop_plan(instances, current_spend, budget_limit, now=None, growth_allowance_pct=PLAN_GROWTH_ALLOWANCE_PCT):
+    """
+    Pick the fewest instances whose stop brings projected spend under budget
+
+    Projected spend is the current spend plus the fleet's hourly cost for
+    the rest of the month. Taking the most expensive instances first gives
+    the smallest set whose savings cover the overage.
+
+    The overage is projected spend above the larger of the budget limit and
+    current spend plus growth_allowance_pct of the limit. Well under the
+    limit that keeps the month under budget ('month-end' basis); near or
+    past the limit, where no set of stops can do that any more, it caps
+    further growth at the allowance ('growth-cap' basis). If the spend or
+    the limit is unknown, every candidate is selected ('unknown' basis).
+
+    Args:
+        instances: Instance detail dicts with 'instance_type'
+        current_spend: Month-to-date spend in USD, or None if unknown
+        budget_limit: Budget limit in USD, or None
+        now: Timezone-aware datetime used for the month boundary
+        growth_allowance_pct: Further spend always allowed, as a percentage
+                              of the limit (0 stops everything once over)
+
+    Returns:
+        dict: Plan summary with the 'selected' instances (annotated with
+              'hourly_cost'), highest cost first, and the 'target_basis'
+    """
+    price_index = load_price_index()
+    hours_left = hours_left_in_month(now)
+
+    # Fleets use a handful of types, so price each type once
+    type_costs = {}
+    costs = []
+    for instance in instances:
+        instance_type = instance['instance_type']
+        cost = type_costs.get(instance_type)
+        if cost is None:
+            cost = type_costs[instance_type] = estimate_hourly_cost(instance_type, price_index)
+        costs.append(cost)
+    fleet_hourly_cost = sum(costs)
+    remaining_spend = fleet_hourly_cost * hours_left
+    current_spend = parse_amount(current_spend)
+    budget_limit = parse_amount(budget_limit)
+    projected_spend = None if current_spend is None else current_spend + remaining_spend
+
+    if current_spend is None or budget_limit is None:
+        target_basis = 'unknown'
+        target_savings = float('inf')
+    else:
+        growth_cap = current_spend + budget_limit * growth_allowance_pct / 100
+        target_basis = 'month-end' if growth_cap <= budget_limit else 'growth-cap'
+        target_savings = max(0.0, projected_spend - max(budget_limit, growth_cap))
+
+    selected = []
+    savings = 0.0
+    for index in sorted(range(len(costs)), key=costs.__getitem__, reverse=True):
+        if savings >= target_savings:
+            break
+        savings += costs[index] * hours_left
+        instance = instances[index]
+        instance['hourly_cost'] = costs[index]
+        selected.append(instance)
+
+    return {
+        'candidates': len(instances),
+        'hours_left': round(hours_left, 2),
+        'fleet_hourly_cost': round(fleet_hourly_cost, 4),
+        'current_spend': current_spend,
+        'budget_limit': budget_limit,
+        'projected_spend': round(projected_spend, 2) if projected_spend is not None else None,
+        'target_basis': target_basis,
+        'target_savings': round(target_savings, 2) if target_savings != float('inf') else None,
+        'projected_savings': round(savings, 2),
+        'selected': selected
+    }
@@ -0,0 +1,143 @@
+"""
+Module: Environment Tag Normalization
+Purpose: Build EC2 tag filters and a precompiled matcher for an environment
+         tag value from the allowed values declared in the tag SCPs
+Used by: budget-action-stop-dev.py
+Author: Excipient Technologies Cloud Team
+"""
+
+import glob
+import json
+import os
+import re
+from functools import lru_cache
+
+from instrumentation import log
+
+# Policies are read from policies/ packaged next to the function, falling back to
+# the repository copy when run from a checkout; TAG_POLICY_DIR overrides both
+LAMBDA_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGED_POLICY_DIR = os.path.join(LAMBDA_DIR, 'policies')
+REPOSITORY_POLICY_DIR = os.path.join(LAMBDA_DIR, '..', '..', 'policies')
+DEFAULT_POLICY_DIR = (
+    REPOSITORY_POLICY_DIR
+    if not os.path.isdir(PACKAGED_POLICY_DIR) and os.path.isdir(REPOSITORY_POLICY_DIR)
+    else PACKAGED_POLICY_DIR
+)
+
+# Used when no SCP files are packaged with the function (mirrors scp-require-tags-ec2.json)
+FALLBACK_ALLOWED_VALUES = {
+    'Environment': ['Production', 'Development', 'Testing', 'Staging']
+}
+
+# Common shorthands people type instead of the canonical value
+ENVIRONMENT_ALIASES = {
+    'Production': ['prod', 'prd'],
+    'Development': ['dev'],
+    'Testing': ['test'],
+    'Staging': ['stage', 'stg']
+}
+
+
+@lru_cache(maxsize=None)
+def load_allowed_values(tag_key='Environment', policy_dir=None):
+    """
+    Collect the allowed values for a tag from the StringNotLike conditions
+    on aws:RequestTag/<tag_key> in policies/scp-require-tags-*.json
+
+    Args:
+        tag_key: Tag key to look up
+        policy_dir: Directory holding the SCP files (defaults to TAG_POLICY_DIR)
+
+    Returns:
+        tuple: Allowed values in policy order, without duplicates
+
+    Raises:
+        FileNotFoundError: If TAG_POLICY_DIR is set but holds no SCP files
+    """
+    configured = policy_dir or os.environ.get('TAG_POLICY_DIR')
+    policy_dir = configured or DEFAULT_POLICY_DIR
+    condition_key = f'aws:RequestTag/{tag_key}'
+    allowed = []
+
+    paths = sorted(glob.glob(os.path.join(policy_dir, 'scp-require-tags-*.json')))
+    if not paths:
+        if configured:
+            raise FileNotFoundError(f"No scp-require-tags-*.json files in {policy_dir}")
+        log('WARNING', 'No SCP files found; package policies/ with the function or set TAG_POLICY_DIR. '
+            'Using built-in allowed values', policy_dir=policy_dir, tag_key=tag_key)
+
+    for path in paths:
+        with open(path) as policy_file:
+            policy = json.load(policy_file)
+
+        for statement in policy.get('Statement', []):
+            values = statement.get('Condition', {}).get('StringNotLike', {}).get(condition_key, [])
+            if isinstance(values, str):
+                values = [values]
+            for value in values:
+                if value not in allowed:
+                    allowed.append(value)
+
+    return tuple(allowed or FALLBACK_ALLOWED_VALUES.get(tag_key, []))
+
+
+def canonical_value(value, tag_key='Environment', policy_dir=None):
+    """
+    Map any spelling or alias of a tag value to its canonical SCP value
+
+    Args:
+        value: Raw tag value such as ' DEV' or 'development'
+        tag_key: Tag key the value belongs to
+        policy_dir: Directory holding the SCP files
+
+    Returns:
+        str: Canonical value, or None if the value is not recognised
+    """
+    cleaned = value.strip().lower()
+    for allowed in load_allowed_values(tag_key, policy_dir):
+        aliases = [allowed] + ENVIRONMENT_ALIASES.get(allowed, [])
+        if cleaned in (alias.lower() for alias in aliases):
+            return allowed
+    return None
+
+
+@lru_cache(maxsize=None)
+def build_tag_filter(target, tag_key='Environment', policy_dir=None, normalize=False):
+    """
+    Build a server-side EC2 tag filter and a client-side matcher for a value
+
+    EC2 tag filters match exact, case-sensitive values, so the filter only
+    lists the SCP-allowed canonical value and its declared aliases (e.g.
+    'Development' and 'dev'); the SCPs reject any other spelling on new
+    resources. With normalize, the filter selects every resource carrying
+    tag_key instead, and the matcher does the matching client-side. The
+    matcher is a precompiled regex that trims whitespace and ignores case.
+
+    Args:
+        target: Environment to match, in any spelling (e.g. 'Development')
+        tag_key: Tag key to filter on
+        policy_dir: Directory holding the SCP files
+        normalize: Filter on the tag key only, for resources tagged before
+                   the SCPs with other spellings
+
+    Returns:
+        tuple: (filter dict for describe_* Filters, matcher callable)
+    """
+    canonical = canonical_value(target, tag_key, policy_dir)
+    if canonical is None:
+        raise ValueError(f"{target!r} is not an allowed {tag_key} value: {load_allowed_values(tag_key, policy_dir)}")
+
+    aliases = [canonical] + ENVIRONMENT_ALIASES.get(canonical, [])
+
+    pattern = re.compile(
+        r'^\s*(?:' + '|'.join(re.escape(alias) for alias in aliases) + r')\s*$',
+        re.IGNORECASE
+    )
+
+    if normalize:
+        tag_filter = {'Name': 'tag-key', 'Values': [tag_key]}
+    else:
+        tag_filter = {'Name': f'tag:{tag_key}', 'Values': aliases}
+
+    return tag_filter, lambda value: value is not None and pattern.match(value) is not None
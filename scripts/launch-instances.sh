@@ -27,6 +27,8 @@ INSTANCE_TYPE="t2.micro"
 ENV_TAG="Testing"
 COST_CENTER="IT-Network"
 OWNER="cloud-team@excipient.com"
+APPLICATION="connectivity-test"
+DATA_CLASSIFICATION="Internal"
 
 # Default key pair names (can be overridden by command line arguments)
 KEY_NAME_EAST="excipient-keypair-east"
@@ -80,6 +82,23 @@ fi
 echo -e "${GREEN}✓ VPC configuration loaded${NC}"
 echo ""
 
+# Pre-flight: check the launch tags against the tag SCPs and Config rules locally,
+# instead of waiting for RunInstances to be denied
+if command -v python3 >/dev/null 2>&1; then
+    echo -e "${YELLOW}Checking launch tags against policies/...${NC}"
+    if ! python3 "$(dirname "$0")/tag_policy_engine.py" check --type ec2 \
+        "Environment=$ENV_TAG" "CostCenter=$COST_CENTER" "Owner=$OWNER" \
+        "Application=$APPLICATION" "DataClassification=$DATA_CLASSIFICATION"; then
+        echo -e "${RED}Error: Launch tags would be denied by the tag policies${NC}"
+        echo "Update the tag values at the top of this script"
+        exit 1
+    fi
+    echo -e "${GREEN}✓ Launch tags comply with tag policies${NC}"
+else
+    echo -e "${YELLOW}⚠ python3 not found, skipping tag pre-flight check${NC}"
+fi
+echo ""
+
 # Step 1: Create or verify SSH key pairs
 echo -e "${YELLOW}Step 1: Setting up SSH key pairs${NC}"
 echo "=================================================="
@@ -203,7 +222,7 @@ EAST_INSTANCE_ID=$(aws ec2 run-instances \
     --subnet-id $EAST_SUBNET_ID \
     --associate-public-ip-address \
     --region $EAST_REGION \
-    --tag-specifications "ResourceType=instance,Tags=[{Key=Name,Value=excipient-test-east},{Key=Environment,Value=$ENV_TAG},{Key=CostCenter,Value=$COST_CENTER},{Key=Owner,Value=$OWNER}]" \
+    --tag-specifications "ResourceType=instance,Tags=[{Key=Name,Value=excipient-test-east},{Key=Environment,Value=$ENV_TAG},{Key=CostCenter,Value=$COST_CENTER},{Key=Owner,Value=$OWNER},{Key=Application,Value=$APPLICATION},{Key=DataClassification,Value=$DATA_CLASSIFICATION}]" \
     --query 'Instances[0].InstanceId' \
     --output text)
 
@@ -228,7 +247,7 @@ WEST_INSTANCE_ID=$(aws ec2 run-instances \
     --subnet-id $WEST_SUBNET_ID \
     --associate-public-ip-address \
     --region $WEST_REGION \
-    --tag-specifications "ResourceType=instance,Tags=[{Key=Name,Value=excipient-test-west},{Key=Environment,Value=$ENV_TAG},{Key=CostCenter,Value=$COST_CENTER},{Key=Owner,Value=$OWNER}]" \
+    --tag-specifications "ResourceType=instance,Tags=[{Key=Name,Value=excipient-test-west},{Key=Environment,Value=$ENV_TAG},{Key=CostCenter,Value=$COST_CENTER},{Key=Owner,Value=$OWNER},{Key=Application,Value=$APPLICATION},{Key=DataClassification,Value=$DATA_CLASSIFICATION}]" \
     --query 'Instances[0].InstanceId' \
     --output text)
 
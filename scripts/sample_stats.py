@@ -0,0 +1,18 @@
+"""
+Script: sample_stats.py
+Purpose: Summary statistics shared by the measurement tools
+Usage: from sample_stats import percentile
+Author: Excipient Technologies Cloud Team
+
+Imported by benchmark-lambdas.py and connectivity-probe.py so latency
+percentiles are computed the same way in both reports.
+"""
+
+import math
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""
+Script: spend-forecast.py
+Purpose: Forecast month-end spend for many cost series at once and fire the
+         budget actions before a threshold is actually crossed
+Usage: python3 spend-forecast.py --input costs.csv [--invoke local|lambda] [--json report.json]
+       python3 spend-forecast.py --synthetic 5000
+Author: Excipient Technologies Cloud Team
+
+Input is daily cost per series (tag values such as Environment$Development,
+cost centers, services...) from a CSV export or a saved Cost Explorer
+GetCostAndUsage response; --synthetic generates a local stand-in. All series
+are loaded into one series x days matrix and modelled together with numpy:
+a least-squares trend over the recent window projects the rest of the month,
+and a robust (median/MAD) z-score flags days that break from the window.
+Series are matched to the budgets/*.json definitions through their
+TagKeyValue cost filters. When projected spend crosses a threshold that
+actual spend has not reached yet, the budget Lambdas are invoked with a
+FORECASTED payload: budget-action-slack for every crossing and
+budget-action-stop-dev for the stop budgets at the stop threshold.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(SCRIPT_DIR, 'lambda')
+BUDGET_DIR = os.path.join(SCRIPT_DIR, '..', 'budgets')
+
+# Crossings already fired, so a daily run doesn't repeat them all month; kept in
+# the user's state directory, never next to the code
+STATE_FILE = os.path.join(
+    os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state'),
+    'excipient', 'spend-forecast-fired.json'
+)
+
+# Series holding the whole account's spend, used by budgets without cost filters
+TOTAL_SERIES = 'Total'
+
+# Thresholds for --limits series, matching the development budget
+DEFAULT_THRESHOLDS = [80, 100, 120]
+
+# Column names recognised in long-format CSV files
+DATE_COLUMNS = {'date', 'day', 'start', 'timeperiod', 'usage_date'}
+SERIES_COLUMNS = {'series', 'key', 'group', 'tag', 'cost_center', 'costcenter'}
+COST_COLUMNS = {'cost', 'amount', 'unblendedcost', 'blendedcost', 'amortizedcost', 'netunblendedcost'}
+
+# One-sided 95% quantile of the normal distribution, for projected_high
+HIGH_QUANTILE = 1.645
+
+# Iglewicz-Hoaglin constant: 0.6745 * (x - median) / MAD ~ standard z-score,
+# and the matching mean-absolute-deviation factor used when the MAD is zero
+MAD_SCALE = 0.6745
+MEAN_AD_SCALE = 1.253314
+MAX_ZSCORE = 1000.0
+
+
+def build_matrix(series_names, day_values, costs):
+    """
+    Scatter (series, day, cost) observations into a dense matrix
+
+    Days may be 'YYYY-MM-DD' strings; they are converted in one pass.
+
+    Returns:
+        tuple: (series names, np.datetime64 days, float matrix [series, days])
+               with every calendar day between the first and last present
+    """
+    names, series_index = np.unique(np.asarray(series_names, dtype=str), return_inverse=True)
+    days = np.asarray(day_values, dtype='datetime64[D]')
+    first = days.min()
+    span = int((days.max() - first).astype(int)) + 1
+    matrix = np.zeros((len(names), span))
+    np.add.at(matrix, (series_index, (days - first).astype(int)), np.asarray(costs, dtype=float))
+    return list(names), first + np.arange(span), matrix
+
+
+def load_csv(path):
+    """
+    Read a long (date, series, cost) or wide (date, one column per series) CSV
+
+    Returns:
+        tuple: See build_matrix
+    """
+    with open(path, newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        header = [column.strip() for column in next(reader)]
+        rows = [row for row in reader if row and row[0].strip()]
+
+    normalized = [column.lower().replace(' ', '').replace('-', '_') for column in header]
+
+    def column(names):
+        return next((index for index, name in enumerate(normalized) if name in names), None)
+
+    date_at, series_at, cost_at = column(DATE_COLUMNS), column(SERIES_COLUMNS), column(COST_COLUMNS)
+    if date_at is not None and series_at is not None and cost_at is not None:
+        return build_matrix(
+            [row[series_at] for row in rows],
+            [row[date_at].strip()[:10] for row in rows],
+            [float(row[cost_at] or 0) for row in rows]
+        )
+
+    # Wide format, as exported from the Cost Explorer console: skip total
+    # rows that don't start with a date
+    rows = [row for row in rows if row[0].strip()[:4].isdigit()]
+    series = header[1:]
+    values = np.array([[float(value or 0) for value in row[1:len(header)]] for row in rows])
+    days = np.array([row[0].strip()[:10] for row in rows], dtype='datetime64[D]')
+    return build_matrix(np.tile(series, len(rows)), np.repeat(days, len(series)), values.ravel())
+
+
+def load_cost_explorer(path, metric=None):
+    """
+    Read saved GetCostAndUsage responses (DAILY granularity)
+
+    A file may hold one response or a list of them, e.g. one grouped by the
+    Environment tag and one by CostCenter. Group keys become series names
+    (multiple keys joined with '|'); ungrouped totals become TOTAL_SERIES.
+
+    Returns:
+        tuple: See build_matrix
+    """
+    with open(path) as json_file:
+        data = json.load(json_file)
+    responses = data if isinstance(data, list) else [data]
+
+    series, days, costs = [], [], []
+
+    def amount(metrics):
+        chosen = metrics.get(metric) if metric else next(iter(metrics.values()), None)
+        return float(chosen['Amount']) if chosen else 0.0
+
+    for response in responses:
+        for result in response.get('ResultsByTime', []):
+            day = result['TimePeriod']['Start'][:10]
+            groups = result.get('Groups', [])
+            for group in groups:
+                series.append('|'.join(group['Keys']))
+                days.append(day)
+                costs.append(amount(group['Metrics']))
+            if not groups and result.get('Total'):
+                series.append(TOTAL_SERIES)
+                days.append(day)
+                costs.append(amount(result['Total']))
+    if not series:
+        raise ValueError(f"No daily results in {path}")
+    return build_matrix(series, days, costs)
+
+
+def synthetic_series(count, days=60, end=None, seed=7):
+    """
+    Local stand-in for Cost Explorer data
+
+    Generates count series with a base level, a linear trend, weekly
+    seasonality and noise, plus spikes in a share of them on the last day.
+    The budget series (Environment$Development, Environment$Production) and
+    TOTAL_SERIES are included so the budgets have something to match.
+
+    Returns:
+        tuple: See build_matrix
+    """
+    rng = np.random.default_rng(seed)
+    end = np.datetime64(end or date.today().isoformat(), 'D')
+    day_values = end - np.arange(days)[::-1]
+
+    names = ['Environment$Development', 'Environment$Production'] + [
+        f"CostCenter$CC-{index:05d}" for index in range(max(0, count - 2))
+    ]
+    names = names[:max(count, 2)]
+    level = rng.gamma(2.0, 40.0, len(names))
+    level[0], level[1] = 150.0, 600.0
+    trend = rng.normal(0.0, 0.01, len(names)) * level
+    trend[0] = 2.5  # development spend creeping up
+    steps = np.arange(days)
+    weekly = 1 + 0.1 * np.sin(2 * np.pi * (steps / 7.0))
+    matrix = (level[:, None] + trend[:, None] * steps) * weekly * rng.normal(1.0, 0.05, (len(names), days))
+    spikes = rng.random(len(names)) < 0.01
+    matrix[spikes, -1] *= rng.uniform(3, 6, spikes.sum())
+    matrix = np.clip(matrix, 0, None)
+
+    names.append(TOTAL_SERIES)
+    matrix = np.vstack([matrix, matrix[:2].sum(0) * 1.2])
+    return names, day_values, matrix
+
+
+def forecast(matrix, days, as_of=None, window=14, z_threshold=3.5):
+    """
+    Project month-end spend and score anomalies for every series at once
+
+    The trend is an ordinary least-squares line through each series' last
+    `window` days, evaluated for the days left in the month (negative
+    predictions clipped to zero). The anomaly score compares the latest day
+    with the median and MAD of the days before it in the window.
+
+    Args:
+        matrix: Daily costs [series, days]
+        days: np.datetime64 day of each column
+        as_of: Last day to use (default: the last day in the data)
+        window: Trailing days in the trend and anomaly models
+        z_threshold: Robust z-score beyond which the latest day is an anomaly
+
+    Returns:
+        dict: Per-series arrays (month_to_date, projected, projected_high,
+              slope, level, sigma, zscore, anomaly, latest) plus the as_of
+              date, days_left and the window actually used
+    """
+    as_of = np.datetime64(as_of, 'D') if as_of is not None else days[-1]
+    matrix = matrix[:, days <= as_of]
+    days = days[days <= as_of]
+    if len(days) < 3:
+        raise ValueError("Need at least three days of data up to the as-of date")
+
+    as_of_date = as_of.astype(object)
+    month_start = np.datetime64(as_of_date.replace(day=1), 'D')
+    next_month = (month_start.astype('datetime64[M]') + 1).astype('datetime64[D]')
+    days_left = int((next_month - as_of).astype(int)) - 1
+    month_to_date = matrix[:, days >= month_start].sum(axis=1)
+
+    width = min(window, len(days))
+    recent = matrix[:, -width:]
+    x = np.arange(width) - (width - 1) / 2.0
+    level = recent.mean(axis=1)
+    slope = (recent - level[:, None]) @ x / (x @ x)
+    residuals = recent - (level[:, None] + slope[:, None] * x)
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / max(1, width - 2))
+
+    ahead = (width - 1) / 2.0 + np.arange(1, days_left + 1)
+    daily = np.clip(level[:, None] + slope[:, None] * ahead, 0, None)
+    projected = month_to_date + daily.sum(axis=1)
+    projected_high = projected + HIGH_QUANTILE * sigma * np.sqrt(days_left)
+
+    history = recent[:, :-1]
+    median = np.median(history, axis=1)
+    absolute = np.abs(history - median[:, None])
+    mad = np.median(absolute, axis=1)
+    # Mostly-flat series have a zero MAD; fall back to the mean absolute
+    # deviation, and treat any change from a constant history as MAX_ZSCORE
+    mean_ad = absolute.mean(axis=1) * MEAN_AD_SCALE
+    scale = np.where(mad > 0, mad / MAD_SCALE, mean_ad)
+    deviation = recent[:, -1] - median
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zscore = np.where(scale > 0, deviation / scale, np.sign(deviation) * MAX_ZSCORE)
+    zscore = np.clip(zscore, -MAX_ZSCORE, MAX_ZSCORE)
+
+    return {
+        'as_of': str(as_of),
+        'days_left': days_left,
+        'window': width,
+        'latest': recent[:, -1],
+        'month_to_date': month_to_date,
+        'projected': projected,
+        'projected_high': projected_high,
+        'level': level,
+        'slope': slope,
+        'sigma': sigma,
+        'zscore': zscore,
+        'anomaly': np.abs(zscore) > z_threshold
+    }
+
+
+def load_budgets(directory=BUDGET_DIR):
+    """
+    Budget definitions with the series each one tracks
+
+    Returns:
+        list: Dicts with name, limit, ACTUAL percentage thresholds and the
+              series name (tag filter without the 'user:' prefix, or
+              TOTAL_SERIES for unfiltered budgets)
+    """
+    budgets = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as budget_file:
+            definition = json.load(budget_file)
+        thresholds = sorted({
+            item['Notification']['Threshold']
+            for item in definition.get('NotificationsWithSubscribers', [])
+            if item['Notification'].get('NotificationType') == 'ACTUAL'
+            and item['Notification'].get('ThresholdType', 'PERCENTAGE') == 'PERCENTAGE'
+        })
+        filters = definition.get('CostFilters', {}).get('TagKeyValue', [])
+        for series in [value.split(':', 1)[-1] for value in filters] or [TOTAL_SERIES]:
+            budgets.append({
+                'name': definition['BudgetName'],
+                'limit': float(definition['BudgetLimit']['Amount']),
+                'thresholds': thresholds,
+                'series': series
+            })
+    return budgets
+
+
+def evaluate_budgets(budgets, names, result):
+    """
+    Budgets whose projected spend crosses a threshold actual spend hasn't
+
+    Returns:
+        tuple: (evaluations for every matched budget, alerts to fire) where
+               each alert carries the highest projected-only threshold
+    """
+    index = {name: position for position, name in enumerate(names)}
+    evaluations = []
+    alerts = []
+    for budget in budgets:
+        position = index.get(budget['series'])
+        if position is None:
+            continue
+        actual = float(result['month_to_date'][position])
+        projected = float(result['projected'][position])
+        actual_pct = 100.0 * actual / budget['limit']
+        projected_pct = 100.0 * projected / budget['limit']
+        crossed = [threshold for threshold in budget['thresholds'] if actual_pct < float(threshold) <= projected_pct]
+        evaluation = {
+            'budget_name': budget['name'],
+            'series': budget['series'],
+            'limit': budget['limit'],
+            'month_to_date': round(actual, 2),
+            'projected': round(projected, 2),
+            'projected_high': round(float(result['projected_high'][position]), 2),
+            'actual_pct': round(actual_pct, 1),
+            'projected_pct': round(projected_pct, 1),
+            'anomaly': bool(result['anomaly'][position]),
+            'thresholds_projected': crossed
+        }
+        evaluations.append(evaluation)
+        if crossed:
+            alerts.append(dict(evaluation, threshold=max(crossed)))
+    return evaluations, alerts
+
+
+def crossing_key(alert, as_of):
+    """(budget, threshold, month) identifying one projected crossing"""
+    return (alert['budget_name'], float(alert['threshold']), as_of[:7])
+
+
+def load_fired(path):
+    """Crossings recorded by earlier runs; empty when the file is missing or unreadable"""
+    if not path:
+        return set()
+    try:
+        with open(path) as state_file:
+            return {tuple(key) for key in json.load(state_file)}
+    except (OSError, ValueError, TypeError):
+        return set()
+
+
+def save_fired(path, fired, month):
+    """Persist fired crossings, dropping months before the current one"""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as state_file:
+        json.dump(sorted(list(key) for key in fired if key[2] >= month), state_file)
+    os.replace(temp_path, path)
+
+
+def stop_event(alert, as_of, mode=None):
+    """budget-action-stop-dev event for a projected crossing"""
+    detail = {
+        'budgetName': alert['budget_name'],
+        'threshold': alert['threshold'],
+        'notificationType': 'FORECASTED',
+        'budgetAmount': alert['limit'],
+        'currentSpend': alert['month_to_date'],
+        'forecastedSpend': alert['projected'],
+        'asOf': as_of
+    }
+    if mode:
+        detail['mode'] = mode
+    return {'source': 'excipient.spend-forecast', 'detail-type': 'Budget Forecast Threshold', 'detail': detail}
+
+
+def slack_event(alerts, as_of):
+    """budget-action-slack SNS-shaped event, one record per crossing"""
+    return {'Records': [{'Sns': {'Message': json.dumps({
+        'budgetName': alert['budget_name'],
+        'threshold': alert['threshold'],
+        'notificationType': 'FORECASTED',
+        'budgetLimit': alert['limit'],
+        'currentSpend': alert['month_to_date'],
+        'forecastedSpend': alert['projected'],
+        'percentage': alert['projected_pct'],
+        'asOf': as_of
+    })}} for alert in alerts]}
+
+
+def load_lambda(filename):
+    """Import a Lambda source file (the names contain hyphens)"""
+    import importlib.util
+    if LAMBDA_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_DIR)
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace('-', '_'), os.path.join(LAMBDA_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def invoke_handlers(invocations, how, functions):
+    """
+    Deliver events to the budget Lambdas
+
+    Args:
+        invocations: (function key, event) pairs; keys are 'stop' and 'slack'
+        how: 'local' runs handle_event in-process; 'lambda' invokes the
+             deployed functions asynchronously
+        functions: Function key -> deployed function name
+
+    Returns:
+        list: {'function', 'status', 'response' or 'error'} per invocation;
+              status is 'error' when the handler raised or reported an
+              error, or the asynchronous invoke was not accepted
+    """
+    results = []
+    if how == 'lambda':
+        import boto3
+        client = boto3.client('lambda')
+    for key, event in invocations:
+        try:
+            if how == 'local':
+                filename = {'stop': 'budget-action-stop-dev.py', 'slack': 'budget-action-slack.py'}[key]
+                module = load_lambda(filename)
+                try:
+                    response = module.handle_event(event)
+                finally:
+                    module.emit_metrics()
+                error = handler_error(response)
+            else:
+                # Asynchronous: only whether the event was accepted is known here
+                reply = client.invoke(FunctionName=functions[key], InvocationType='Event',
+                                      Payload=json.dumps(event).encode())
+                response = reply['StatusCode']
+                error = reply.get('FunctionError') or (None if response == 202 else f'StatusCode {response}')
+            if error:
+                results.append({'function': key, 'status': 'error', 'error': error, 'response': response})
+            else:
+                results.append({'function': key, 'status': 'ok', 'response': response})
+        except Exception as e:
+            results.append({'function': key, 'status': 'error', 'error': str(e)})
+    return results
+
+
+def handler_error(response):
+    """Error reported in a handler's Lambda response, or None"""
+    try:
+        body = json.loads(response.get('body') or '{}')
+    except (TypeError, ValueError):
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+    if body.get('error'):
+        return str(body['error'])
+    status_code = response.get('statusCode', 200)
+    if status_code >= 400:
+        return body.get('message') or f'statusCode {status_code}'
+    return None
+
+
+def write_series_report(path, names, result):
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['series', 'latest', 'month_to_date', 'projected', 'projected_high', 'slope_per_day', 'zscore', 'anomaly'])
+        columns = [result[key] for key in ('latest', 'month_to_date', 'projected', 'projected_high', 'slope', 'zscore')]
+        for position, name in enumerate(names):
+            writer.writerow([name] + [f'{column[position]:.2f}' for column in columns] + [int(result['anomaly'][position])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecast month-end spend per series and fire budget actions early')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input', help='Daily costs: .csv (long or wide) or saved Cost Explorer .json responses')
+    source.add_argument('--synthetic', type=int, metavar='SERIES', help='Generate this many stand-in series instead')
+    parser.add_argument('--metric', help='Cost Explorer metric to read (default: the first in each result)')
+    parser.add_argument('--as-of', help='Forecast as of this day, YYYY-MM-DD (default: last day in the data)')
+    parser.add_argument('--window', type=int, default=14, help='Trailing days used by the trend and anomaly models')
+    parser.add_argument('--z-threshold', type=float, default=3.5, help='Robust z-score that marks an anomaly')
+    parser.add_argument('--budget-dir', default=BUDGET_DIR, help='Directory of budget definitions')
+    parser.add_argument('--limits', help='JSON {series: monthly limit} for series without a budget file')
+    parser.add_argument('--stop-budgets', default='Development-Account-Monthly-Budget',
+                        help='Comma-separated budgets whose crossings also trigger budget-action-stop-dev')
+    parser.add_argument('--stop-threshold', type=float, default=100,
+                        help='Lowest projected threshold that triggers a stop')
+    parser.add_argument('--stop-mode', choices=['all', 'plan', 'dry-run'], help='Stop mode passed to budget-action-stop-dev')
+    parser.add_argument('--invoke', choices=['none', 'local', 'lambda'], default='none',
+                        help='Deliver alerts: print only, run the handlers in-process, or invoke the deployed functions')
+    parser.add_argument('--stop-function', default='budget-action-stop-dev', help='Deployed stop function name')
+    parser.add_argument('--slack-function', default='budget-action-slack', help='Deployed Slack function name')
+    parser.add_argument('--state', default=STATE_FILE,
+                        help="File recording the crossings already fired ('' to fire on every run)")
+    parser.add_argument('--output', help='Per-series forecast CSV')
+    parser.add_argument('--json', help='Write the summary, alerts and handler responses to this JSON file')
+    args = parser.parse_args()
+
+    timings = {}
+    started = time.perf_counter()
+    if args.synthetic:
+        names, days, matrix = synthetic_series(args.synthetic, end=args.as_of)
+    elif args.input.endswith('.json'):
+        names, days, matrix = load_cost_explorer(args.input, args.metric)
+    else:
+        names, days, matrix = load_csv(args.input)
+    timings['load'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = forecast(matrix, days, args.as_of, args.window, args.z_threshold)
+    timings['model'] = time.perf_counter() - started
+
+    budgets = load_budgets(args.budget_dir)
+    if args.limits:
+        with open(args.limits) as limits_file:
+            budgets += [
+                {'name': series, 'limit': float(limit), 'thresholds': DEFAULT_THRESHOLDS, 'series': series}
+                for series, limit in json.load(limits_file).items()
+            ]
+    evaluations, alerts = evaluate_budgets(budgets, names, result)
+
+    # A projection usually stays over a threshold for days; fire each crossing once a month
+    fired = load_fired(args.state)
+    repeated = [alert for alert in alerts if crossing_key(alert, result['as_of']) in fired]
+    alerts = [alert for alert in alerts if crossing_key(alert, result['as_of']) not in fired]
+
+    stop_budgets = {name.strip() for name in args.stop_budgets.split(',') if name.strip()}
+    invocations = [
+        ('stop', stop_event(alert, result['as_of'], args.stop_mode))
+        for alert in alerts
+        if alert['budget_name'] in stop_budgets and float(alert['threshold']) >= args.stop_threshold
+    ]
+    if alerts:
+        invocations.append(('slack', slack_event(alerts, result['as_of'])))
+
+    anomalies = np.flatnonzero(result['anomaly'])
+    anomalies = anomalies[np.argsort(-np.abs(result['zscore'][anomalies]))]
+
+    print(f"{len(names)} series x {matrix.shape[1]} days, as of {result['as_of']} ({result['days_left']} days left, "
+          f"{result['window']}-day window)")
+    print(f"Timings: load {timings['load'] * 1000:.1f} ms, model {timings['model'] * 1000:.1f} ms")
+    print(f"\n{'Budget':<40} {'MTD':>12} {'Projected':>12} {'Actual%':>8} {'Proj%':>8}  Projected thresholds")
+    for evaluation in evaluations:
+        print(f"{evaluation['budget_name']:<40} {evaluation['month_to_date']:>12,.2f} {evaluation['projected']:>12,.2f} "
+              f"{evaluation['actual_pct']:>7.1f}% {evaluation['projected_pct']:>7.1f}%  "
+              f"{', '.join(f'{t:g}%' for t in evaluation['thresholds_projected']) or '-'}")
+    if repeated:
+        skipped = ', '.join(f"{alert['budget_name']} {alert['threshold']:g}%" for alert in repeated)
+        print(f"\nAlready fired this month, skipped: {skipped}")
+    print(f"\nAnomalous latest day in {len(anomalies)} series")
+    for position in anomalies[:10]:
+        print(f"  {names[position]:<40} latest {result['latest'][position]:>10,.2f}  z {result['zscore'][position]:>7.1f}")
+
+    responses = []
+    if invocations:
+        print(f"\n{len(invocations)} handler invocation(s):")
+        if args.invoke == 'none':
+            for key, event in invocations:
+                print(f"  {key}: {json.dumps(event)}")
+            print("  (not sent; use --invoke local or --invoke lambda)")
+        else:
+            functions = {'stop': args.stop_function, 'slack': args.slack_function}
+            responses = invoke_handlers(invocations, args.invoke, functions)
+            for response in responses:
+                print(f"  {response['function']}: {response['status']} {response.get('error', '')}")
+
+            # Record a crossing only when every invocation carrying it succeeded
+            failed = {
+                (key, event['detail']['budgetName'] if key == 'stop' else None)
+                for (key, event), response in zip(invocations, responses) if response['status'] == 'error'
+            }
+            fired.update(
+                crossing_key(alert, result['as_of']) for alert in alerts
+                if ('slack', None) not in failed and ('stop', alert['budget_name']) not in failed
+            )
+            save_fired(args.state, fired, result['as_of'][:7])
+
+    if args.output:
+        write_series_report(args.output, names, result)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({
+                'as_of': result['as_of'],
+                'days_left': result['days_left'],
+                'series': len(names),
+                'timings_ms': {phase: round(seconds * 1000, 3) for phase, seconds in timings.items()},
+                'budgets': evaluations,
+                'alerts': alerts,
+                'repeated_alerts': repeated,
+                'anomalies': [
+                    {'series': names[position], 'latest': round(float(result['latest'][position]), 2),
+                     'zscore': round(float(result['zscore'][position]), 2)}
+                    for position in anomalies
+                ],
+                'invocations': [{'function': key, 'event': event} for key, event in invocations],
+                'responses': responses
+            }, json_file, indent=2, default=str)
+
+    return 1 if any(response['status'] == 'error' for response in responses) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Script: tag_policy_engine.py
+Purpose: Evaluate proposed or exported resource tags locally against the tag
+         SCPs and Config REQUIRED_TAGS rules in policies/
+Usage: python3 tag_policy_engine.py check --type ec2 Environment=Development CostCenter=IT ...
+       python3 tag_policy_engine.py scan inventory.json [--type ec2] [--json report.json]
+Author: Excipient Technologies Cloud Team
+
+The SCP conditions (StringNotLike, Null and the other string operators) and
+the Config rules' required keys are compiled once into matchers indexed by
+action and resource type: exact value lists become set lookups, wildcard
+lists a single regex, and all Null checks of a statement one set difference.
+A missing tag is then reported before RunInstances is denied server-side,
+and exported inventories can be checked in bulk. Import TagPolicyEngine
+to reuse the compiled policies from other tools.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+from fnmatch import fnmatchcase
+
+DEFAULT_POLICY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'policies')
+
+# Shorthand resource types: the create action the SCPs guard and the Config resource type
+RESOURCE_TYPES = {
+    'ec2': {'action': 'ec2:RunInstances', 'config_type': 'AWS::EC2::Instance'},
+    'rds': {'action': 'rds:CreateDBInstance', 'config_type': 'AWS::RDS::DBInstance'},
+    'rds-cluster': {'action': 'rds:CreateDBCluster', 'config_type': 'AWS::RDS::DBCluster'},
+    's3': {'action': 's3:CreateBucket', 'config_type': 'AWS::S3::Bucket'}
+}
+
+REQUEST_TAG_PREFIX = 'aws:RequestTag/'
+
+# String condition operators: (negated, ignore case, wildcard)
+STRING_OPERATORS = {
+    'StringEquals': (False, False, False),
+    'StringNotEquals': (True, False, False),
+    'StringEqualsIgnoreCase': (False, True, False),
+    'StringNotEqualsIgnoreCase': (True, True, False),
+    'StringLike': (False, False, True),
+    'StringNotLike': (True, False, True)
+}
+
+
+def tag_dict(tags):
+    """
+    Normalise tags to a plain key -> value dict
+
+    Args:
+        tags: Dict, or a list of {'Key', 'Value'} entries as returned by AWS APIs
+
+    Returns:
+        dict: Tag key -> value
+    """
+    if isinstance(tags, dict):
+        return tags
+    return {tag['Key']: tag.get('Value', '') for tag in tags or []}
+
+
+def compile_values(values, ignore_case, wildcard):
+    """
+    Build a fast membership test for a condition's value list
+
+    Args:
+        values: Allowed values from the policy
+        ignore_case: Compare case-insensitively
+        wildcard: Treat * and ? as IAM wildcards
+
+    Returns:
+        callable: value -> True if it matches any of the values
+    """
+    if isinstance(values, str):
+        values = [values]
+    values = [str(value) for value in values]
+
+    if wildcard and any('*' in value or '?' in value for value in values):
+        pattern = '|'.join(
+            ''.join('.*' if char == '*' else '.' if char == '?' else re.escape(char) for char in value)
+            for value in values
+        )
+        regex = re.compile(f'(?:{pattern})', re.DOTALL | (re.IGNORECASE if ignore_case else 0))
+        return lambda value: regex.fullmatch(value) is not None
+
+    if ignore_case:
+        folded = frozenset(value.casefold() for value in values)
+        return lambda value: value.casefold() in folded
+    exact = frozenset(values)
+    return exact.__contains__
+
+
+class CompiledStatement:
+    """
+    One SCP Deny statement reduced to matchers
+
+    A statement denies when every condition holds. Null conditions on
+    request tags are folded into required/forbidden key sets; every other
+    condition becomes a (source, key, test) check.
+    """
+
+    def __init__(self, statement, policy_name):
+        self.policy = policy_name
+        self.sid = statement.get('Sid', '')
+        self.actions = [action.lower() for action in as_list(statement.get('Action', []))]
+        self.resources = as_list(statement.get('Resource', '*'))
+        self.missing_keys = set()    # Null "true": denies when the tag is absent
+        self.present_keys = set()    # Null "false": denies when the tag is present
+        self.checks = []
+        self.descriptions = []
+
+        if 'NotAction' in statement or 'NotResource' in statement:
+            raise ValueError(f"{policy_name} {self.sid}: NotAction/NotResource are not supported")
+
+        for operator, conditions in statement.get('Condition', {}).items():
+            base, if_exists = (operator[:-8], True) if operator.endswith('IfExists') else (operator, False)
+            for condition_key, values in conditions.items():
+                source, key = split_condition_key(condition_key)
+                if base == 'Null':
+                    if source != 'tag':
+                        self.checks.append((source, key, null_test(values)))
+                    elif str(values).lower() == 'true':
+                        self.missing_keys.add(key)
+                    else:
+                        self.present_keys.add(key)
+                    self.descriptions.append(describe_null(condition_key, values))
+                elif base in STRING_OPERATORS:
+                    negated, ignore_case, wildcard = STRING_OPERATORS[base]
+                    matches = compile_values(values, ignore_case, wildcard)
+                    self.checks.append((source, key, string_test(matches, negated, if_exists)))
+                    self.descriptions.append(describe_string(condition_key, base, values))
+                else:
+                    raise ValueError(f"{policy_name} {self.sid}: condition operator {operator} is not supported")
+
+        self.missing_keys = frozenset(self.missing_keys)
+        self.present_keys = frozenset(self.present_keys)
+
+    def applies_to(self, action, resource=None):
+        """Whether the statement covers an action (and resource ARN, if given)"""
+        action = action.lower()
+        if not any(fnmatchcase(action, pattern) for pattern in self.actions):
+            return False
+        return resource is None or any(fnmatchcase(resource, pattern) for pattern in self.resources)
+
+    def denies(self, tags, context):
+        """Whether every condition of the statement holds for these tags"""
+        if self.missing_keys and not self.missing_keys.isdisjoint(tags.keys()):
+            # Null "true" needs every listed key absent (conditions are ANDed)
+            return False
+        if self.present_keys and not self.present_keys <= tags.keys():
+            return False
+        for source, key, test in self.checks:
+            if not test((tags if source == 'tag' else context).get(key)):
+                return False
+        return True
+
+    def violation(self):
+        return {
+            'source': 'scp',
+            'policy': self.policy,
+            'rule': self.sid,
+            'reason': '; '.join(self.descriptions)
+        }
+
+
+def as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def split_condition_key(condition_key):
+    """Split a condition key into ('tag', tag key) or ('context', condition key)"""
+    if condition_key.lower().startswith(REQUEST_TAG_PREFIX.lower()):
+        return 'tag', condition_key[len(REQUEST_TAG_PREFIX):]
+    return 'context', condition_key
+
+
+def null_test(values):
+    expect_missing = str(values).lower() == 'true'
+    return lambda value: (value is None) == expect_missing
+
+
+def string_test(matches, negated, if_exists):
+    def test(value):
+        if value is None:
+            # Negated operators and ...IfExists hold when the key is absent
+            return negated or if_exists
+        return matches(value) != negated
+    return test
+
+
+def describe_null(condition_key, values):
+    name = condition_key[len(REQUEST_TAG_PREFIX):] if split_condition_key(condition_key)[0] == 'tag' else condition_key
+    return f"{name} is missing" if str(values).lower() == 'true' else f"{name} must not be set"
+
+
+def describe_string(condition_key, operator, values):
+    name = condition_key[len(REQUEST_TAG_PREFIX):] if split_condition_key(condition_key)[0] == 'tag' else condition_key
+    listed = ', '.join(as_list(values))
+    if STRING_OPERATORS[operator][0]:
+        return f"{name} must be one of {listed}"
+    return f"{name} must not be one of {listed}"
+
+
+class RequiredTagsRule:
+    """
+    One Config REQUIRED_TAGS rule: tagNKey must be present and, when
+    tagNValue is given, hold one of its comma-separated values
+    """
+
+    def __init__(self, rule, policy_name):
+        self.policy = policy_name
+        self.name = rule.get('ConfigRuleName', policy_name)
+        self.resource_types = set(rule.get('Scope', {}).get('ComplianceResourceTypes', []))
+        parameters = rule.get('InputParameters', {})
+        if isinstance(parameters, str):
+            parameters = json.loads(parameters)
+
+        self.required = []
+        for index in range(1, 51):
+            key = parameters.get(f'tag{index}Key')
+            if not key:
+                continue
+            allowed = parameters.get(f'tag{index}Value')
+            allowed = frozenset(value.strip() for value in allowed.split(',')) if allowed else None
+            self.required.append((key, allowed))
+        self.required_keys = frozenset(key for key, _ in self.required)
+        self.value_checks = [(key, allowed) for key, allowed in self.required if allowed]
+
+    def violations(self, tags):
+        """Violations of this rule, one per offending key"""
+        found = []
+        missing = self.required_keys - tags.keys()
+        for key in sorted(missing):
+            found.append(self.violation(key, f"{key} is missing"))
+        for key, allowed in self.value_checks:
+            if key not in missing and tags[key] not in allowed:
+                found.append(self.violation(key, f"{key} must be one of {', '.join(sorted(allowed))}"))
+        return found
+
+    def violation(self, key, reason):
+        return {'source': 'config', 'policy': self.policy, 'rule': self.name, 'key': key, 'reason': reason}
+
+
+class TagPolicyEngine:
+    """
+    Compiled SCP statements and Config rules with per-action and
+    per-resource-type indexes
+
+    Statements are compiled once; the statements that apply to an action,
+    and the rules for a Config resource type, are looked up once and cached,
+    so evaluating a tag set only runs the matchers that can deny it.
+    """
+
+    def __init__(self, statements=(), rules=()):
+        self.statements = list(statements)
+        self.rules = list(rules)
+        self._by_action = {}
+        self._by_config_type = {}
+
+    @classmethod
+    def from_directory(cls, policy_dir=None):
+        """
+        Load scp-require-tags-*.json and config-rule-required-tags-*.json
+
+        Args:
+            policy_dir: Directory holding the policies (defaults to TAG_POLICY_DIR or policies/)
+
+        Returns:
+            TagPolicyEngine: Compiled engine
+        """
+        policy_dir = policy_dir or os.environ.get('TAG_POLICY_DIR', DEFAULT_POLICY_DIR)
+        statements = []
+        rules = []
+
+        for path in sorted(glob.glob(os.path.join(policy_dir, 'scp-require-tags-*.json'))):
+            with open(path) as policy_file:
+                policy = json.load(policy_file)
+            policy_statements = policy.get('Statement', [])
+            if isinstance(policy_statements, dict):
+                policy_statements = [policy_statements]
+            for statement in policy_statements:
+                if statement.get('Effect') == 'Deny':
+                    statements.append(CompiledStatement(statement, os.path.basename(path)))
+
+        for path in sorted(glob.glob(os.path.join(policy_dir, 'config-rule-required-tags-*.json'))):
+            with open(path) as rule_file:
+                rule = json.load(rule_file)
+            if rule.get('Source', {}).get('SourceIdentifier') == 'REQUIRED_TAGS':
+                rules.append(RequiredTagsRule(rule, os.path.basename(path)))
+
+        if not statements and not rules:
+            raise ValueError(f"No tag policies found in {policy_dir}")
+        return cls(statements, rules)
+
+    def statements_for(self, action, resource=None):
+        """Compiled statements that apply to an action (and resource ARN)"""
+        key = (action.lower(), resource)
+        if key not in self._by_action:
+            self._by_action[key] = [s for s in self.statements if s.applies_to(action, resource)]
+        return self._by_action[key]
+
+    def rules_for(self, config_type):
+        """Config rules whose scope includes a resource type"""
+        if config_type not in self._by_config_type:
+            self._by_config_type[config_type] = [r for r in self.rules if config_type in r.resource_types]
+        return self._by_config_type[config_type]
+
+    def required_keys(self, resource_type):
+        """
+        Tag keys a resource type must carry, from Null conditions on its
+        create action and its Config rules, in policy order
+
+        Args:
+            resource_type: Shorthand from RESOURCE_TYPES
+
+        Returns:
+            list: Tag keys
+        """
+        defaults = RESOURCE_TYPES[resource_type]
+        keys = []
+        for statement in self.statements_for(defaults['action']):
+            if len(statement.missing_keys) == 1 and not statement.checks and not statement.present_keys:
+                keys.extend(statement.missing_keys)
+            for source, key, denies in statement.checks:
+                # A lone negated condition (e.g. StringNotLike) also denies an absent tag
+                if source == 'tag' and len(statement.checks) == 1 and not statement.missing_keys and denies(None):
+                    keys.append(key)
+        for rule in self.rules_for(defaults['config_type']):
+            keys.extend(key for key, _ in rule.required)
+        return list(dict.fromkeys(keys))
+
+    def value_tests(self, resource_type):
+        """
+        Per-key tests for the values a resource type's tags may hold
+
+        Only single-condition statements on one tag (such as the
+        StringNotLike allow-lists) and Config tagNValue lists qualify, so a
+        value can be judged on its own.
+
+        Args:
+            resource_type: Shorthand from RESOURCE_TYPES
+
+        Returns:
+            dict: Tag key -> callable(value) returning True if the value is allowed
+        """
+        defaults = RESOURCE_TYPES[resource_type]
+        tests = {}
+
+        def combine(key, allowed):
+            previous = tests.get(key)
+            tests[key] = allowed if previous is None else (lambda value: previous(value) and allowed(value))
+
+        for statement in self.statements_for(defaults['action']):
+            if len(statement.checks) == 1 and not statement.missing_keys and not statement.present_keys:
+                source, key, denies = statement.checks[0]
+                if source == 'tag':
+                    combine(key, lambda value, denies=denies: not denies(value))
+        for rule in self.rules_for(defaults['config_type']):
+            for key, allowed in rule.value_checks:
+                combine(key, allowed.__contains__)
+        return tests
+
+    def evaluate(self, tags, resource_type=None, action=None, config_type=None, resource=None, context=None):
+        """
+        Check one tag set against the SCPs and Config rules for a resource
+
+        Args:
+            tags: Dict or AWS-style tag list
+            resource_type: Shorthand from RESOURCE_TYPES ('ec2', 'rds', 's3', ...)
+            action: SCP action to check, overriding the resource type's
+            config_type: Config resource type to check, overriding the resource type's
+            resource: Optional resource ARN for statements scoped by Resource
+            context: Values for other condition keys (e.g. aws:RequestedRegion)
+
+        Returns:
+            list: Violation dicts with source, policy, rule and reason; empty if compliant
+        """
+        if resource_type:
+            defaults = RESOURCE_TYPES[resource_type]
+            action = action or defaults['action']
+            config_type = config_type or defaults['config_type']
+        if not action and not config_type:
+            raise ValueError('A resource type, action or Config resource type is required')
+        tags = tag_dict(tags)
+        context = context or {}
+
+        violations = []
+        if action:
+            for statement in self.statements_for(action, resource):
+                if statement.denies(tags, context):
+                    violations.append(statement.violation())
+        if config_type:
+            for rule in self.rules_for(config_type):
+                violations.extend(rule.violations(tags))
+        return violations
+
+    def evaluate_many(self, records, resource_type=None):
+        """
+        Lazily evaluate many records
+
+        Args:
+            records: Iterable of tag dicts/lists, or dicts with 'tags' and
+                     optional 'resource_type', 'id' and 'arn'
+            resource_type: Default shorthand type for records that don't set one
+
+        Yields:
+            tuple: (record, violations)
+        """
+        for record in records:
+            if isinstance(record, dict) and 'tags' in record:
+                violations = self.evaluate(
+                    record['tags'],
+                    record.get('resource_type', resource_type),
+                    resource=record.get('arn')
+                )
+            else:
+                violations = self.evaluate(record, resource_type)
+            yield record, violations
+
+
+def load_records(path):
+    """
+    Read an exported inventory: a JSON array, {"resources": [...]}, or JSON lines
+
+    Args:
+        path: File path, or '-' for stdin
+
+    Returns:
+        iterator: Records
+    """
+    handle = sys.stdin if path == '-' else open(path)
+    with handle:
+        text = handle.read()
+    stripped = text.lstrip()
+    if stripped.startswith('['):
+        return iter(json.loads(text))
+    if stripped.startswith('{') and '\n{' not in stripped.rstrip():
+        document = json.loads(text)
+        return iter(document.get('resources', [document]))
+    return (json.loads(line) for line in text.splitlines() if line.strip())
+
+
+def parse_tag_arguments(pairs):
+    tags = {}
+    for pair in pairs:
+        key, separator, value = pair.partition('=')
+        if not separator:
+            raise ValueError(f"Tag {pair!r} must be Key=Value")
+        tags[key] = value
+    return tags
+
+
+def command_check(engine, args):
+    violations = engine.evaluate(parse_tag_arguments(args.tags), args.type)
+    if args.json:
+        print(json.dumps({'compliant': not violations, 'violations': violations}, indent=2))
+    elif violations:
+        for violation in violations:
+            print(f"DENY  {violation['policy']} {violation['rule']}: {violation['reason']}")
+    else:
+        print(f"OK    Tags comply with the {args.type} tag policies")
+    return 1 if violations else 0
+
+
+def command_scan(engine, args):
+    started = time.perf_counter()
+    total = 0
+    noncompliant = []
+    by_reason = {}
+
+    for record, violations in engine.evaluate_many(load_records(args.inventory), args.type):
+        total += 1
+        if violations:
+            noncompliant.append({'resource': record.get('id') if isinstance(record, dict) else None, 'violations': violations})
+            for violation in violations:
+                by_reason[violation['reason']] = by_reason.get(violation['reason'], 0) + 1
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'resources': total,
+        'noncompliant': len(noncompliant),
+        'by_reason': dict(sorted(by_reason.items(), key=lambda item: -item[1])),
+        'elapsed_seconds': round(elapsed, 3),
+        'resources_per_second': round(total / elapsed) if elapsed else None
+    }
+
+    print(f"Checked {total} resources in {elapsed:.2f}s: {len(noncompliant)} non-compliant")
+    for reason, count in summary['by_reason'].items():
+        print(f"  {count:>8}  {reason}")
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump({'summary': summary, 'noncompliant': noncompliant}, report_file, indent=2)
+        print(f"Report written to {args.json}")
+    return 1 if noncompliant else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate resource tags against the tag SCPs and Config rules')
+    parser.add_argument('--policy-dir', help='Directory holding the policies (default: TAG_POLICY_DIR or ../policies)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    check = commands.add_parser('check', help='Check one proposed tag set (exit 1 if it would be denied)')
+    check.add_argument('--type', choices=sorted(RESOURCE_TYPES), default='ec2', help='Resource type being created')
+    check.add_argument('--json', action='store_true', help='Print the result as JSON')
+    check.add_argument('tags', nargs='*', help='Tags as Key=Value')
+
+    scan = commands.add_parser('scan', help='Check an exported inventory (exit 1 if anything is non-compliant)')
+    scan.add_argument('inventory', help="JSON array, {\"resources\": [...]} or JSON lines file ('-' for stdin)")
+    scan.add_argument('--type', choices=sorted(RESOURCE_TYPES), help='Type for records that do not set resource_type')
+    scan.add_argument('--json', help='Write the full report to this JSON file')
+
+    args = parser.parse_args()
+    try:
+        engine = TagPolicyEngine.from_directory(args.policy_dir)
+        if args.command == 'check':
+            return command_check(engine, args)
+        return command_scan(engine, args)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
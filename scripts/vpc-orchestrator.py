@@ -0,0 +1,797 @@
+#!/usr/bin/env python3
+"""
+Script: vpc-orchestrator.py
+Purpose: Build and tear down the East/West VPCs and their peering as one
+         dependency graph, replacing create-vpcs.sh, setup-peering.sh and
+         cleanup-resources.sh
+Usage: python3 vpc-orchestrator.py up
+       python3 vpc-orchestrator.py down [--yes]
+       python3 vpc-orchestrator.py status
+Author: Excipient Technologies Cloud Team
+
+Every resource (VPC, Internet Gateway, subnet, route table, routes, security
+group, peering connection) is a node that names the nodes it depends on.
+Nodes whose dependencies are satisfied run concurrently, so the two regions
+are built side by side, and teardown walks the same graph in reverse.
+Progress is written to a JSON state file after every node, and each node
+adopts an existing resource (by recorded ID or Name tag) before creating
+one, so an interrupted run is finished by simply running it again.
+vpc-ids.txt is kept up to date for launch-instances.sh and
+enable-flow-logs.sh.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Configuration (same values as the shell scripts)
+SIDES = {
+    'east': {
+        'region': 'us-east-1',
+        'vpc_cidr': '10.0.0.0/16',
+        'subnet_cidr': '10.0.1.0/24',
+        'peer': 'west'
+    },
+    'west': {
+        'region': 'us-west-2',
+        'vpc_cidr': '192.168.0.0/16',
+        'subnet_cidr': '192.168.1.0/24',
+        'peer': 'east'
+    }
+}
+
+ENV_TAG = 'Production'
+COST_CENTER = 'IT-Network'
+OWNER = 'cloud-team@excipient.com'
+PEERING_NAME = 'excipient-peering-east-west'
+
+STATE_FILE = 'vpc-state.json'
+LEGACY_FILE = 'vpc-ids.txt'
+INSTANCE_FILE = 'instance-ids.txt'
+
+# Node -> variable in vpc-ids.txt, in the order create-vpcs.sh writes them
+LEGACY_KEYS = {
+    'east.vpc': 'EAST_VPC_ID',
+    'east.subnet': 'EAST_SUBNET_ID',
+    'east.sg': 'EAST_SG_ID',
+    'east.rtb': 'EAST_RTB_ID',
+    'west.vpc': 'WEST_VPC_ID',
+    'west.subnet': 'WEST_SUBNET_ID',
+    'west.sg': 'WEST_SG_ID',
+    'west.rtb': 'WEST_RTB_ID',
+    'peering': 'PEERING_ID'
+}
+
+# Peering states that no longer count as an existing connection
+PEERING_GONE = {'deleted', 'deleting', 'rejected', 'failed', 'expired'}
+
+INSTANCE_STATES = ['pending', 'running', 'stopping', 'stopped']
+
+WAIT_TIMEOUT_SECONDS = 300
+WAIT_INTERVAL_SECONDS = 3
+
+# Deletes that fail with DependencyViolation are retried for this long; ENIs
+# of terminated instances and peering routes are released asynchronously
+DEPENDENCY_TIMEOUT_SECONDS = 300
+
+ALREADY_DONE_CODES = {
+    'InvalidPermission.Duplicate',
+    'Resource.AlreadyAssociated',
+    'Gateway.NotAttached',
+    'InvalidVpcPeeringConnectionID.NotFound'
+}
+
+
+def error_code(error):
+    """AWS error code of a botocore ClientError, '' for anything else"""
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code', '')
+
+
+def is_not_found(error):
+    code = error_code(error)
+    return code.endswith('NotFound') or code == 'ResourceNotFoundException'
+
+
+def name_tags(resource_type, name, **extra):
+    tags = [{'Key': 'Name', 'Value': name}, {'Key': 'Environment', 'Value': ENV_TAG}]
+    tags.extend({'Key': key, 'Value': value} for key, value in extra.items())
+    return [{'ResourceType': resource_type, 'Tags': tags}]
+
+
+def name_filter(name, **filters):
+    result = [{'Name': 'tag:Name', 'Values': [name]}]
+    result.extend({'Name': key, 'Values': [value]} for key, value in filters.items())
+    return result
+
+
+def wait_until(check, description, timeout=WAIT_TIMEOUT_SECONDS):
+    """
+    Poll check() until it returns a truthy value
+
+    Raises:
+        TimeoutError: check() stayed falsy for timeout seconds
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        result = check()
+        if result:
+            return result
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Timed out waiting for {description}")
+        time.sleep(WAIT_INTERVAL_SECONDS)
+
+
+def retry_dependency(action, timeout=DEPENDENCY_TIMEOUT_SECONDS):
+    """Run a delete call, retrying while AWS reports DependencyViolation"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return action()
+        except Exception as e:
+            if error_code(e) != 'DependencyViolation' or time.monotonic() >= deadline:
+                raise
+        time.sleep(WAIT_INTERVAL_SECONDS * 2)
+
+
+def ignore_codes(action, codes):
+    """Run an API call, treating the given error codes (or NotFound) as done"""
+    try:
+        return action()
+    except Exception as e:
+        if error_code(e) not in codes and not is_not_found(e):
+            raise
+        return None
+
+
+class ProvisioningState:
+    """
+    Resource IDs and node progress, persisted after every change
+
+    The JSON file maps node name to {'id', 'status'} where status is
+    'created' or 'deleted'. Writes go to a temporary file that replaces
+    the original, so an interrupted run never leaves a torn file. The legacy
+    vpc-ids.txt is rewritten alongside it for the shell scripts.
+    """
+
+    def __init__(self, path=STATE_FILE, legacy_path=LEGACY_FILE):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.lock = threading.Lock()
+        self.nodes = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as state_file:
+                self.nodes = json.load(state_file).get('nodes', {})
+            return
+        except (OSError, ValueError):
+            self.nodes = {}
+
+        # Adopt IDs from an environment built by the shell scripts. Their
+        # status is unknown, so every node is re-checked on the next run.
+        try:
+            with open(self.legacy_path) as legacy_file:
+                variables = dict(line.strip().split('=', 1) for line in legacy_file if '=' in line)
+        except OSError:
+            return
+        for node, variable in LEGACY_KEYS.items():
+            if variables.get(variable):
+                self.nodes[node] = {'id': variables[variable]}
+
+    def resource_id(self, node):
+        with self.lock:
+            return self.nodes.get(node, {}).get('id')
+
+    def status(self, node):
+        with self.lock:
+            return self.nodes.get(node, {}).get('status')
+
+    def update(self, node, **fields):
+        """Merge fields into a node's entry and persist"""
+        with self.lock:
+            entry = self.nodes.setdefault(node, {})
+            entry.update(fields)
+            if entry.get('id') is None:
+                entry.pop('id', None)
+            self.save()
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as state_file:
+            json.dump({'version': 1, 'updated': int(time.time()), 'nodes': self.nodes}, state_file, indent=2)
+        os.replace(temp_path, self.path)
+
+        lines = [
+            f"{variable}={self.nodes[node]['id']}"
+            for node, variable in LEGACY_KEYS.items()
+            if self.nodes.get(node, {}).get('id') and self.nodes[node].get('status') != 'deleted'
+        ]
+        with open(self.legacy_path, 'w') as legacy_file:
+            legacy_file.write(''.join(f"{line}\n" for line in lines))
+
+    def remove_files(self):
+        for path in (self.path, self.legacy_path, INSTANCE_FILE):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class Node:
+    """One resource in the graph: its dependencies and how to build and remove it"""
+
+    def __init__(self, name, deps, create, delete):
+        self.name = name
+        self.deps = deps
+        self.create = create
+        self.delete = delete
+
+
+class Orchestrator:
+    """
+    Resource graph for the two VPCs and the operations on each node
+
+    Create operations adopt an existing resource before creating a new one;
+    delete operations treat a resource that is already gone as deleted.
+    Both record IDs through ProvisioningState as soon as they are known.
+    """
+
+    def __init__(self, session, state, ssh_cidr=None, workers=8):
+        self.session = session
+        self.state = state
+        self.ssh_cidr = ssh_cidr
+        self.workers = workers
+        self.clients = {}
+        self.client_lock = threading.Lock()
+        self.print_lock = threading.Lock()
+        self.started = time.monotonic()
+        self.nodes = self.build_graph()
+
+    def build_graph(self):
+        nodes = []
+        for side in SIDES:
+            def node(suffix, deps, create, delete, side=side):
+                nodes.append(Node(
+                    f'{side}.{suffix}', [dep.format(side=side) for dep in deps],
+                    create and (lambda: create(side)), delete and (lambda: delete(side))
+                ))
+
+            node('vpc', [], self.create_vpc, self.delete_vpc)
+            node('igw', ['{side}.vpc'], self.create_igw, self.delete_igw)
+            node('subnet', ['{side}.vpc'], self.create_subnet, self.delete_subnet)
+            node('rtb', ['{side}.vpc'], self.create_route_table, self.delete_route_table)
+            node('rtb-assoc', ['{side}.rtb', '{side}.subnet'], self.associate_route_table, self.disassociate_route_table)
+            node('default-route', ['{side}.rtb', '{side}.igw'], self.create_default_route, self.delete_default_route)
+            node('sg', ['{side}.vpc'], self.create_security_group, self.delete_security_group)
+            node('peering-route', ['peering', '{side}.rtb'], self.create_peering_route, self.delete_peering_route)
+            # Created by launch-instances.sh; only torn down here, before
+            # anything they use
+            node('instances', ['{side}.subnet', '{side}.sg', '{side}.igw'], None, self.terminate_instances)
+            # Created by enable-flow-logs.sh
+            node('log-group', [], None, self.delete_log_group)
+
+        nodes.append(Node('peering', ['east.vpc', 'west.vpc'], self.create_peering, self.delete_peering))
+        return nodes
+
+    def ec2(self, side):
+        return self.client('ec2', SIDES[side]['region'])
+
+    def client(self, service, region):
+        with self.client_lock:
+            key = (service, region)
+            if key not in self.clients:
+                from botocore.config import Config
+                self.clients[key] = self.session.client(service, region_name=region, config=Config(
+                    retries={'mode': 'adaptive', 'max_attempts': 10},
+                    max_pool_connections=max(10, self.workers)
+                ))
+            return self.clients[key]
+
+    def report(self, message):
+        with self.print_lock:
+            print(f"[{time.monotonic() - self.started:6.1f}s] {message}", flush=True)
+
+    def resolve(self, node, exists, find):
+        """
+        ID of a node's live resource: the recorded one if it still exists,
+        otherwise one found by its tags, otherwise None
+        """
+        recorded = self.state.resource_id(node)
+        if recorded:
+            try:
+                if exists(recorded):
+                    return recorded
+            except Exception as e:
+                if not is_not_found(e):
+                    raise
+        found = find()
+        if found:
+            self.state.update(node, id=found)
+        return found
+
+    def vpc_id(self, side):
+        vpc_id = self.resolve(
+            f'{side}.vpc',
+            lambda id: self.ec2(side).describe_vpcs(VpcIds=[id])['Vpcs'],
+            lambda: next((vpc['VpcId'] for vpc in self.ec2(side).describe_vpcs(
+                Filters=name_filter(f'excipient-vpc-{side}'))['Vpcs']), None)
+        )
+        return vpc_id
+
+    def require_vpc(self, side):
+        vpc_id = self.vpc_id(side)
+        if not vpc_id:
+            raise RuntimeError(f"VPC for {side} not found")
+        return vpc_id
+
+    # VPC
+
+    def create_vpc(self, side):
+        ec2 = self.ec2(side)
+        vpc_id = self.vpc_id(side)
+        if not vpc_id:
+            vpc_id = ec2.create_vpc(
+                CidrBlock=SIDES[side]['vpc_cidr'],
+                TagSpecifications=name_tags('vpc', f'excipient-vpc-{side}', CostCenter=COST_CENTER, Owner=OWNER)
+            )['Vpc']['VpcId']
+            self.state.update(f'{side}.vpc', id=vpc_id)
+            ec2.get_waiter('vpc_available').wait(VpcIds=[vpc_id])
+        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsSupport={'Value': True})
+        return vpc_id
+
+    def delete_vpc(self, side):
+        vpc_id = self.vpc_id(side)
+        if vpc_id:
+            retry_dependency(lambda: ignore_codes(lambda: self.ec2(side).delete_vpc(VpcId=vpc_id), set()))
+        return vpc_id
+
+    # Internet Gateway
+
+    def igw_id(self, side):
+        ec2 = self.ec2(side)
+        return self.resolve(
+            f'{side}.igw',
+            lambda id: ec2.describe_internet_gateways(InternetGatewayIds=[id])['InternetGateways'],
+            lambda: next((igw['InternetGatewayId'] for igw in ec2.describe_internet_gateways(
+                Filters=name_filter(f'excipient-igw-{side}'))['InternetGateways']), None)
+        )
+
+    def create_igw(self, side):
+        ec2 = self.ec2(side)
+        vpc_id = self.require_vpc(side)
+        igw_id = self.igw_id(side)
+        if not igw_id:
+            igw_id = ec2.create_internet_gateway(
+                TagSpecifications=name_tags('internet-gateway', f'excipient-igw-{side}')
+            )['InternetGateway']['InternetGatewayId']
+            self.state.update(f'{side}.igw', id=igw_id)
+        attachments = ec2.describe_internet_gateways(InternetGatewayIds=[igw_id])['InternetGateways'][0].get('Attachments', [])
+        if not any(attachment['VpcId'] == vpc_id for attachment in attachments):
+            ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+        return igw_id
+
+    def delete_igw(self, side):
+        ec2 = self.ec2(side)
+        igw_id = self.igw_id(side)
+        if igw_id:
+            try:
+                attachments = ec2.describe_internet_gateways(InternetGatewayIds=[igw_id])['InternetGateways'][0].get('Attachments', [])
+            except Exception as e:
+                if not is_not_found(e):
+                    raise
+                return igw_id
+            for attachment in attachments:
+                retry_dependency(lambda: ignore_codes(
+                    lambda: ec2.detach_internet_gateway(InternetGatewayId=igw_id, VpcId=attachment['VpcId']),
+                    ALREADY_DONE_CODES
+                ))
+            ignore_codes(lambda: ec2.delete_internet_gateway(InternetGatewayId=igw_id), set())
+        return igw_id
+
+    # Subnet
+
+    def subnet_id(self, side):
+        ec2 = self.ec2(side)
+        return self.resolve(
+            f'{side}.subnet',
+            lambda id: ec2.describe_subnets(SubnetIds=[id])['Subnets'],
+            lambda: next((subnet['SubnetId'] for subnet in ec2.describe_subnets(
+                Filters=name_filter(f'excipient-subnet-{side}-public'))['Subnets']), None)
+        )
+
+    def create_subnet(self, side):
+        ec2 = self.ec2(side)
+        vpc_id = self.require_vpc(side)
+        subnet_id = self.subnet_id(side)
+        if not subnet_id:
+            subnet_id = ec2.create_subnet(
+                VpcId=vpc_id,
+                CidrBlock=SIDES[side]['subnet_cidr'],
+                AvailabilityZone=f"{SIDES[side]['region']}a",
+                TagSpecifications=name_tags('subnet', f'excipient-subnet-{side}-public')
+            )['Subnet']['SubnetId']
+            self.state.update(f'{side}.subnet', id=subnet_id)
+        ec2.modify_subnet_attribute(SubnetId=subnet_id, MapPublicIpOnLaunch={'Value': True})
+        return subnet_id
+
+    def delete_subnet(self, side):
+        subnet_id = self.subnet_id(side)
+        if subnet_id:
+            retry_dependency(lambda: ignore_codes(lambda: self.ec2(side).delete_subnet(SubnetId=subnet_id), set()))
+        return subnet_id
+
+    # Route table and routes
+
+    def route_table(self, side):
+        """The side's route table description, or None"""
+        ec2 = self.ec2(side)
+        tables = {}
+
+        def exists(id):
+            tables['found'] = ec2.describe_route_tables(RouteTableIds=[id])['RouteTables']
+            return tables['found']
+
+        def find():
+            tables['found'] = ec2.describe_route_tables(Filters=name_filter(f'excipient-rtb-{side}-public'))['RouteTables']
+            return tables['found'][0]['RouteTableId'] if tables['found'] else None
+
+        return tables['found'][0] if self.resolve(f'{side}.rtb', exists, find) else None
+
+    def require_route_table(self, side):
+        table = self.route_table(side)
+        if not table:
+            raise RuntimeError(f"Route table for {side} not found")
+        return table
+
+    def create_route_table(self, side):
+        table = self.route_table(side)
+        if table:
+            return table['RouteTableId']
+        rtb_id = self.ec2(side).create_route_table(
+            VpcId=self.require_vpc(side),
+            TagSpecifications=name_tags('route-table', f'excipient-rtb-{side}-public')
+        )['RouteTable']['RouteTableId']
+        self.state.update(f'{side}.rtb', id=rtb_id)
+        return rtb_id
+
+    def delete_route_table(self, side):
+        table = self.route_table(side)
+        if table:
+            retry_dependency(lambda: ignore_codes(
+                lambda: self.ec2(side).delete_route_table(RouteTableId=table['RouteTableId']), set()
+            ))
+            return table['RouteTableId']
+        return None
+
+    def associate_route_table(self, side):
+        table = self.require_route_table(side)
+        subnet_id = self.subnet_id(side)
+        for association in table.get('Associations', []):
+            if association.get('SubnetId') == subnet_id:
+                return association['RouteTableAssociationId']
+        return self.ec2(side).associate_route_table(
+            RouteTableId=table['RouteTableId'], SubnetId=subnet_id
+        )['AssociationId']
+
+    def disassociate_route_table(self, side):
+        table = self.route_table(side)
+        for association in (table or {}).get('Associations', []):
+            if association.get('SubnetId') and not association.get('Main'):
+                ignore_codes(lambda: self.ec2(side).disassociate_route_table(
+                    AssociationId=association['RouteTableAssociationId']), set())
+        return None
+
+    def ensure_route(self, side, destination, **target):
+        """Create a route, or repoint it if the destination already has one"""
+        ec2 = self.ec2(side)
+        table = self.require_route_table(side)
+        rtb_id = table['RouteTableId']
+        wanted = dict(target, DestinationCidrBlock=destination)
+        for route in table.get('Routes', []):
+            if all(route.get(key) == value for key, value in wanted.items()) and route.get('State', 'active') == 'active':
+                return None
+        try:
+            ec2.create_route(RouteTableId=rtb_id, DestinationCidrBlock=destination, **target)
+        except Exception as e:
+            if error_code(e) != 'RouteAlreadyExists':
+                raise
+            ec2.replace_route(RouteTableId=rtb_id, DestinationCidrBlock=destination, **target)
+        return None
+
+    def remove_route(self, side, destination):
+        table = self.route_table(side)
+        if table and any(route.get('DestinationCidrBlock') == destination for route in table.get('Routes', [])):
+            ignore_codes(lambda: self.ec2(side).delete_route(
+                RouteTableId=table['RouteTableId'], DestinationCidrBlock=destination), set())
+        return None
+
+    def create_default_route(self, side):
+        igw_id = self.igw_id(side)
+        if not igw_id:
+            raise RuntimeError(f"Internet Gateway for {side} not found")
+        return self.ensure_route(side, '0.0.0.0/0', GatewayId=igw_id)
+
+    def delete_default_route(self, side):
+        return self.remove_route(side, '0.0.0.0/0')
+
+    def create_peering_route(self, side):
+        peer_cidr = SIDES[SIDES[side]['peer']]['vpc_cidr']
+        return self.ensure_route(side, peer_cidr, VpcPeeringConnectionId=self.state.resource_id('peering'))
+
+    def delete_peering_route(self, side):
+        return self.remove_route(side, SIDES[SIDES[side]['peer']]['vpc_cidr'])
+
+    # Security group
+
+    def security_group_id(self, side):
+        ec2 = self.ec2(side)
+        vpc_id = self.vpc_id(side)
+        if not vpc_id:
+            return None
+        return self.resolve(
+            f'{side}.sg',
+            lambda id: ec2.describe_security_groups(GroupIds=[id])['SecurityGroups'],
+            lambda: next((group['GroupId'] for group in ec2.describe_security_groups(Filters=[
+                {'Name': 'vpc-id', 'Values': [vpc_id]},
+                {'Name': 'group-name', 'Values': [f'excipient-sg-{side}']}
+            ])['SecurityGroups']), None)
+        )
+
+    def get_ssh_cidr(self):
+        if not self.ssh_cidr:
+            with urllib.request.urlopen('https://checkip.amazonaws.com', timeout=10) as response:
+                self.ssh_cidr = f"{response.read().decode().strip()}/32"
+            self.report(f"SSH allowed from {self.ssh_cidr}")
+        return self.ssh_cidr
+
+    def create_security_group(self, side):
+        ec2 = self.ec2(side)
+        group_id = self.security_group_id(side)
+        if not group_id:
+            group_id = ec2.create_security_group(
+                GroupName=f'excipient-sg-{side}',
+                Description=f"Security group for VPC {side.capitalize()} EC2 instances",
+                VpcId=self.require_vpc(side),
+                TagSpecifications=name_tags('security-group', f'excipient-sg-{side}')
+            )['GroupId']
+            self.state.update(f'{side}.sg', id=group_id)
+
+        peer_cidr = SIDES[SIDES[side]['peer']]['vpc_cidr']
+        rules = [
+            {'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22, 'IpRanges': [{'CidrIp': self.get_ssh_cidr()}]},
+            {'IpProtocol': 'icmp', 'FromPort': -1, 'ToPort': -1, 'IpRanges': [{'CidrIp': peer_cidr}]},
+            {'IpProtocol': '-1', 'IpRanges': [{'CidrIp': peer_cidr}]}
+        ]
+        for rule in rules:
+            ignore_codes(lambda: ec2.authorize_security_group_ingress(GroupId=group_id, IpPermissions=[rule]),
+                         ALREADY_DONE_CODES)
+        return group_id
+
+    def delete_security_group(self, side):
+        group_id = self.security_group_id(side)
+        if group_id:
+            retry_dependency(lambda: ignore_codes(lambda: self.ec2(side).delete_security_group(GroupId=group_id), set()))
+        return group_id
+
+    # Peering
+
+    def peering(self, side='east'):
+        """The peering connection as seen from one side, or None"""
+        ec2 = self.ec2(side)
+
+        def live(connections):
+            return [c for c in connections if c['Status']['Code'] not in PEERING_GONE]
+
+        found = {}
+
+        def exists(id):
+            found['connections'] = live(ec2.describe_vpc_peering_connections(VpcPeeringConnectionIds=[id])['VpcPeeringConnections'])
+            return found['connections']
+
+        def find():
+            found['connections'] = live(ec2.describe_vpc_peering_connections(Filters=name_filter(PEERING_NAME))['VpcPeeringConnections'])
+            return found['connections'][0]['VpcPeeringConnectionId'] if found['connections'] else None
+
+        return found['connections'][0] if self.resolve('peering', exists, find) else None
+
+    def create_peering(self):
+        connection = self.peering()
+        if connection:
+            peering_id = connection['VpcPeeringConnectionId']
+        else:
+            peering_id = self.ec2('east').create_vpc_peering_connection(
+                VpcId=self.require_vpc('east'),
+                PeerVpcId=self.require_vpc('west'),
+                PeerRegion=SIDES['west']['region'],
+                TagSpecifications=name_tags('vpc-peering-connection', PEERING_NAME)
+            )['VpcPeeringConnection']['VpcPeeringConnectionId']
+            self.state.update('peering', id=peering_id)
+
+        west = self.ec2('west')
+
+        def accepter_status():
+            try:
+                connections = west.describe_vpc_peering_connections(VpcPeeringConnectionIds=[peering_id])['VpcPeeringConnections']
+            except Exception as e:
+                if not is_not_found(e):
+                    raise
+                return None  # not visible in the accepter region yet
+            return connections[0]['Status']['Code'] if connections else None
+
+        def acceptable():
+            status = accepter_status()
+            return status if status in ('pending-acceptance', 'active') else None
+
+        status = wait_until(acceptable, f"peering {peering_id} to reach {SIDES['west']['region']}")
+        if status == 'pending-acceptance':
+            west.accept_vpc_peering_connection(VpcPeeringConnectionId=peering_id)
+        wait_until(lambda: accepter_status() == 'active', f"peering {peering_id} to become active")
+        return peering_id
+
+    def delete_peering(self):
+        connection = self.peering()
+        if connection:
+            ignore_codes(lambda: self.ec2('east').delete_vpc_peering_connection(
+                VpcPeeringConnectionId=connection['VpcPeeringConnectionId']), ALREADY_DONE_CODES)
+            return connection['VpcPeeringConnectionId']
+        return None
+
+    # Teardown-only nodes
+
+    def terminate_instances(self, side):
+        ec2 = self.ec2(side)
+        vpc_id = self.vpc_id(side)
+        if not vpc_id:
+            return None
+        instance_ids = [
+            instance['InstanceId']
+            for page in ec2.get_paginator('describe_instances').paginate(Filters=[
+                {'Name': 'vpc-id', 'Values': [vpc_id]},
+                {'Name': 'instance-state-name', 'Values': INSTANCE_STATES}
+            ])
+            for reservation in page['Reservations']
+            for instance in reservation['Instances']
+        ]
+        if instance_ids:
+            self.report(f"  {side}: terminating {' '.join(instance_ids)}")
+            ec2.terminate_instances(InstanceIds=instance_ids)
+            ec2.get_waiter('instance_terminated').wait(InstanceIds=instance_ids)
+        return ' '.join(instance_ids) or None
+
+    def delete_log_group(self, side):
+        name = f'/aws/vpc/flowlogs/excipient-vpc-{side}'
+        logs = self.client('logs', SIDES[side]['region'])
+        ignore_codes(lambda: logs.delete_log_group(logGroupName=name), set())
+        return None
+
+    # Graph execution
+
+    def run(self, action, refresh=False):
+        """
+        Run every node's create or delete operation in dependency order
+
+        On create a node waits for its dependencies; on delete it waits for
+        every node that depends on it. Independent nodes run concurrently.
+        Nodes already completed according to the state file are skipped
+        unless refresh is set. After a failure no new nodes are started.
+
+        Args:
+            action: 'create' or 'delete'
+            refresh: Re-check nodes the state file marks as done
+
+        Returns:
+            tuple: (completed node names, {failed node: error}, blocked node names)
+        """
+        done_status = 'created' if action == 'create' else 'deleted'
+        if action == 'create':
+            waits_on = {node.name: set(node.deps) for node in self.nodes}
+        else:
+            waits_on = {node.name: {other.name for other in self.nodes if node.name in other.deps} for node in self.nodes}
+        by_name = {node.name: node for node in self.nodes}
+
+        def execute(node):
+            operation = node.create if action == 'create' else node.delete
+            if operation is None or (not refresh and self.state.status(node.name) == done_status):
+                return False
+            started = time.monotonic()
+            resource_id = operation()
+            fields = {'status': done_status}
+            if action == 'delete':
+                fields['id'] = None
+            elif resource_id:
+                fields['id'] = resource_id
+            self.state.update(node.name, **fields)
+            self.report(f"✓ {node.name} {done_status}{f' ({resource_id})' if resource_id else ''} in {time.monotonic() - started:.1f}s")
+            return True
+
+        pending = dict(waits_on)
+        completed = set()
+        failed = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                if not failed:
+                    for name in [name for name, deps in pending.items() if deps <= completed]:
+                        del pending[name]
+                        running[executor.submit(execute, by_name[name])] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                        completed.add(name)
+                    except Exception as e:
+                        failed[name] = e
+                        self.report(f"✗ {name} failed: {e}")
+        return completed, failed, sorted(pending)
+
+
+def print_status(state):
+    print(f"State file: {state.path}")
+    for side in SIDES:
+        print(f"{SIDES[side]['region'].upper()}:")
+        for suffix in ('vpc', 'igw', 'subnet', 'rtb', 'rtb-assoc', 'default-route', 'sg', 'peering-route'):
+            entry = state.nodes.get(f'{side}.{suffix}', {})
+            print(f"  {suffix:<15} {entry.get('status') or '-':<8} {entry.get('id', '')}")
+    entry = state.nodes.get('peering', {})
+    print(f"Peering:            {entry.get('status') or '-':<8} {entry.get('id', '')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or tear down the East/West VPCs and peering as a dependency graph')
+    parser.add_argument('command', choices=['up', 'down', 'status'])
+    parser.add_argument('--state', default=STATE_FILE, help='JSON state file')
+    parser.add_argument('--legacy-file', default=LEGACY_FILE, help='Shell-format ID file kept for the other scripts')
+    parser.add_argument('--profile', help='AWS CLI profile')
+    parser.add_argument('--workers', type=int, default=8, help='Nodes run concurrently')
+    parser.add_argument('--ssh-cidr', help='CIDR allowed to SSH in (default: this machine\'s public IP /32)')
+    parser.add_argument('--refresh', action='store_true', help='Re-check nodes the state file marks as done')
+    parser.add_argument('--yes', action='store_true', help='Skip the teardown confirmation prompt')
+    args = parser.parse_args()
+
+    state = ProvisioningState(args.state, args.legacy_file)
+    if args.command == 'status':
+        print_status(state)
+        return 0
+
+    if args.command == 'down' and not args.yes:
+        print("WARNING: This will DELETE all AWS resources created for this project!")
+        print("Make sure you have captured all required screenshots before proceeding.")
+        if input("Are you sure you want to continue? (yes/no): ") != 'yes':
+            print("Cleanup cancelled.")
+            return 0
+
+    import boto3
+    orchestrator = Orchestrator(boto3.session.Session(profile_name=args.profile), state, args.ssh_cidr, args.workers)
+    action = 'create' if args.command == 'up' else 'delete'
+    completed, failed, blocked = orchestrator.run(action, refresh=args.refresh)
+    elapsed = time.monotonic() - orchestrator.started
+
+    if failed:
+        print(f"\n{len(failed)} node(s) failed, {len(blocked)} not started after {elapsed:.1f}s:")
+        for name, error in failed.items():
+            print(f"  {name}: {error}")
+        print(f"Progress is saved in {state.path}; run the same command again to resume.")
+        return 1
+
+    if action == 'delete':
+        state.remove_files()
+        print(f"\nTeardown complete in {elapsed:.1f}s; removed {state.path}, {state.legacy_path} and {INSTANCE_FILE}.")
+    else:
+        print(f"\nBuild complete in {elapsed:.1f}s; IDs saved to {state.path} and {state.legacy_path}.\n")
+        print_status(state)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
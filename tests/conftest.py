@@ -0,0 +1,70 @@
+"""
+Shared pytest setup: puts scripts/ and scripts/lambda/ on sys.path and loads
+the hyphenated script and Lambda files as modules
+"""
+
+import importlib.util
+import os
+import sys
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(ROOT, 'scripts')
+LAMBDA_DIR = os.path.join(SCRIPTS_DIR, 'lambda')
+
+for directory in (LAMBDA_DIR, SCRIPTS_DIR):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+# Helper modules read these once at import; nothing may reach real AWS or /tmp state
+os.environ.update({
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_REGION': 'us-east-1',
+    'ALERT_STATE_BACKEND': 'memory'
+})
+
+
+def load_module(path, name=None):
+    """Import a source file whose name isn't a valid module name"""
+    name = name or os.path.basename(path)[:-3].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def stop_dev(tmp_path, monkeypatch):
+    """A fresh budget-action-stop-dev module with its state files under tmp_path"""
+    monkeypatch.setenv('REGION_CACHE_PATH', str(tmp_path / 'regions.json'))
+    monkeypatch.setenv('INVENTORY_PATH', str(tmp_path / 'inventory.json'))
+    monkeypatch.setenv('RESUME_JOURNAL_PATH', str(tmp_path / 'resume-journal.json'))
+    monkeypatch.setenv('NOTIFICATION_REPORT_URI', '')
+    monkeypatch.setenv('SNS_TOPIC_ARN', '')
+    return load_module(os.path.join(LAMBDA_DIR, 'budget-action-stop-dev.py'))
+
+
+@pytest.fixture
+def stub_client(stop_dev):
+    """
+    Factory that pools a real boto3 client with a Stubber attached in
+    stop_dev's client pool, so the function's own calls hit the stubs
+    """
+    stubbers = []
+
+    def install(service, region, account=None):
+        client = boto3.client(service, region_name=region)
+        stubber = Stubber(client)
+        stubber.activate()
+        stop_dev._client_pool[(service, region, account)] = client
+        stubbers.append(stubber)
+        return client, stubber
+
+    yield install
+    for stubber in stubbers:
+        stubber.deactivate()
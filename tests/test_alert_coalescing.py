@@ -0,0 +1,155 @@
+"""
+Alert coalescing must report each threshold crossing once per key, never
+hide newly stopped resources, and forget a digest whose delivery failed
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from botocore.stub import ANY
+
+from alert_coalescing import AlertCoalescer, MemoryStateBackend, idempotency_key
+
+BUDGET = 'Development-Account-Monthly-Budget'
+REGION = 'us-east-1'
+TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:budget-alerts'
+NOW = datetime(2026, 10, 17, tzinfo=timezone.utc).timestamp()
+
+
+def alert(threshold, resources=None):
+    return {'budget_name': BUDGET, 'threshold': threshold, 'resources': resources}
+
+
+@pytest.fixture
+def coalescer():
+    return AlertCoalescer('test', backend=MemoryStateBackend(), window_seconds=900)
+
+
+def test_key_names_budget_threshold_and_period():
+    assert idempotency_key(BUDGET, 100, '2026-10') == f'{BUDGET}|100|2026-10'
+    assert idempotency_key(BUDGET, 100, None) == f'{BUDGET}|100|-'
+
+
+def test_repeat_is_suppressed_with_a_stable_key(coalescer):
+    digests, suppressed = coalescer.coalesce([alert(80)], now=NOW)
+    assert [d['idempotency_key'] for d in digests] == [f'{BUDGET}|80|2026-10']
+    assert suppressed == []
+
+    # Still the same month, long after the window: the key alone suppresses it
+    digests, suppressed = coalescer.coalesce([alert(80)], now=NOW + 86400)
+    assert digests == []
+    assert suppressed == [alert(80)]
+
+
+def test_new_period_reports_again(coalescer):
+    coalescer.coalesce([alert(80)], now=NOW)
+    digests, _ = coalescer.coalesce([alert(80)], now=NOW + 31 * 86400)
+    assert [d['idempotency_key'] for d in digests] == [f'{BUDGET}|80|2026-11']
+
+
+def test_escalation_goes_out_inside_the_window(coalescer):
+    coalescer.coalesce([alert(80)], now=NOW)
+    digests, suppressed = coalescer.coalesce([alert(50), alert(100)], now=NOW + 60)
+    assert [d['threshold'] for d in digests] == [100]
+    assert suppressed == [alert(50)]
+
+
+def test_batch_merges_into_one_digest_per_budget(coalescer):
+    digests, suppressed = coalescer.coalesce([alert(50), alert(80), alert(80)], now=NOW)
+    assert len(digests) == 1
+    assert digests[0]['thresholds'] == [50, 80]
+    assert digests[0]['idempotency_key'] == f'{BUDGET}|80|2026-10'
+    assert suppressed == [alert(80)]
+
+
+def test_new_resources_are_never_suppressed(coalescer):
+    coalescer.coalesce([alert(100, ['ec2|i-1'])], now=NOW)
+    digests, _ = coalescer.coalesce([alert(100, ['ec2|i-1'])], now=NOW + 60)
+    assert digests == []
+    digests, _ = coalescer.coalesce([alert(100, ['ec2|i-1', 'ec2|i-2'])], now=NOW + 120)
+    assert [d['threshold'] for d in digests] == [100]
+
+
+def test_release_lets_a_failed_digest_go_out_again(coalescer):
+    coalescer.coalesce([alert(50)], now=NOW)
+    digests, _ = coalescer.coalesce([alert(80)], now=NOW + 60)
+
+    coalescer.release(digests)
+
+    retried, suppressed = coalescer.coalesce([alert(80)], now=NOW + 120)
+    assert [d['idempotency_key'] for d in retried] == [digests[0]['idempotency_key']]
+    assert suppressed == []
+    # The digest that was delivered stays reported
+    assert coalescer.coalesce([alert(50)], now=NOW + 180)[0] == []
+
+
+def test_release_leaves_later_digests_alone(coalescer):
+    failed, _ = coalescer.coalesce([alert(80)], now=NOW)
+    coalescer.release(failed)
+    coalescer.coalesce([alert(80)], now=NOW + 60)
+
+    # A late release of the first attempt must not undo the delivered retry
+    coalescer.release(failed)
+    assert coalescer.coalesce([alert(80)], now=NOW + 120)[0] == []
+
+
+def publish_params(stopped):
+    return {
+        'TopicArn': TOPIC_ARN,
+        'Subject': ANY,
+        'Message': ANY,
+        'MessageAttributes': {
+            'budget_name': {'DataType': 'String', 'StringValue': BUDGET},
+            'instances_stopped': {'DataType': 'Number', 'StringValue': str(stopped)},
+            'severity': {'DataType': 'String', 'StringValue': 'HIGH'},
+            'idempotency_key': {'DataType': 'String', 'StringValue': f'{BUDGET}|100|-'}
+        }
+    }
+
+
+def stub_stop(ec2, instance_ids):
+    instances = [
+        {
+            'InstanceId': instance_id,
+            'InstanceType': 't3.micro',
+            'LaunchTime': datetime(2026, 1, 1, tzinfo=timezone.utc),
+            'State': {'Name': 'running'},
+            'Tags': [{'Key': 'Environment', 'Value': 'Development'}]
+        }
+        for instance_id in instance_ids
+    ]
+    ec2.add_response('describe_instances', {'Reservations': [{'Instances': instances}]})
+    ec2.add_response('stop_instances', {}, {'InstanceIds': instance_ids})
+    ec2.add_response('create_tags', {})
+
+
+def test_failed_notification_is_sent_on_the_next_invocation(stop_dev, stub_client, monkeypatch):
+    monkeypatch.setenv('SNS_TOPIC_ARN', TOPIC_ARN)
+    monkeypatch.setattr(stop_dev, 'ENABLED_ENFORCERS', ['ec2'])
+    monkeypatch.setattr(stop_dev, 'RESUME_ENABLED', False)
+    monkeypatch.setattr(stop_dev, 'get_sweep_targets', lambda: [(None, REGION)])
+    _, ec2 = stub_client('ec2', REGION)
+    _, sns = stub_client('sns', stop_dev.HOME_REGION)
+    event = {'detail': {'budgetName': BUDGET, 'threshold': 100}}
+
+    stub_stop(ec2, ['i-1'])
+    sns.add_client_error('publish', 'AuthorizationError', http_status_code=403, expected_params=publish_params(1))
+    assert stop_dev.handle_event(event)['statusCode'] == 500
+
+    # Released after the failure, so the retry publishes under the same key
+    stub_stop(ec2, ['i-1'])
+    sns.add_response('publish', {'MessageId': 'm-1'}, publish_params(1))
+    assert stop_dev.handle_event(event)['statusCode'] == 200
+
+    # Delivered: the same stop is now suppressed and nothing is published
+    stub_stop(ec2, ['i-1'])
+    response = stop_dev.handle_event(event)
+    assert '"notification": "suppressed"' in response['body']
+
+    # A newly stopped resource is reported even inside the window
+    stub_stop(ec2, ['i-2'])
+    sns.add_response('publish', {'MessageId': 'm-2'}, publish_params(1))
+    assert '"notification": "sent"' in stop_dev.handle_event(event)['body']
+
+    ec2.assert_no_pending_responses()
+    sns.assert_no_pending_responses()
@@ -0,0 +1,99 @@
+"""
+Throttled EC2 calls are retried with jittered exponential backoff while the
+region's token bucket halves its rate, then recovers additively (AIMD)
+"""
+
+import pytest
+
+REGION = 'us-east-1'
+TAGS = [{'Key': 'AutoStoppedBy', 'Value': 'BudgetAction'}]
+
+
+@pytest.fixture
+def backoff_ceilings(stop_dev, monkeypatch):
+    """Record each backoff's full-jitter ceiling and retry without waiting"""
+    ceilings = []
+    monkeypatch.setattr(stop_dev.random, 'uniform', lambda low, high: ceilings.append(high) or 0)
+    return ceilings
+
+
+def test_bucket_halves_on_throttle_and_recovers_additively(stop_dev):
+    bucket = stop_dev.AdaptiveTokenBucket(10)
+    bucket.on_throttle()
+    assert bucket.rate == 5
+    assert bucket.tokens <= 0
+    bucket.on_throttle()
+    assert bucket.rate == 2.5
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(3)
+    for _ in range(100):
+        bucket.on_success()
+    assert bucket.rate == 10
+
+
+def test_bucket_rate_never_drops_below_minimum(stop_dev):
+    bucket = stop_dev.AdaptiveTokenBucket(1, min_rate=0.5)
+    for _ in range(5):
+        bucket.on_throttle()
+    assert bucket.rate == 0.5
+
+
+def test_request_limit_exceeded_is_retried(stop_dev, stub_client, backoff_ceilings):
+    client, stubber = stub_client('ec2', REGION)
+    stubber.add_client_error('stop_instances', 'RequestLimitExceeded', expected_params={'InstanceIds': ['i-1', 'i-2']})
+    stubber.add_client_error('stop_instances', 'RequestLimitExceeded', expected_params={'InstanceIds': ['i-1', 'i-2']})
+    stubber.add_response('stop_instances', {}, {'InstanceIds': ['i-1', 'i-2']})
+    stubber.add_response('create_tags', {}, {'Resources': ['i-1', 'i-2'], 'Tags': TAGS})
+    bucket = stop_dev.AdaptiveTokenBucket(10)
+
+    outcomes = stop_dev.stop_instance_chunk(client, ['i-1', 'i-2'], TAGS, bucket)
+
+    assert outcomes == {'i-1': {'status': 'stopped'}, 'i-2': {'status': 'stopped'}}
+    # Full-jitter ceilings double per attempt: 0.2s, then 0.4s
+    assert backoff_ceilings == [stop_dev.BACKOFF_BASE_SECONDS, stop_dev.BACKOFF_BASE_SECONDS * 2]
+    # Two halvings, then two successful calls each recover 5% of the configured rate
+    assert bucket.rate == pytest.approx(2.5 + 2 * 0.5)
+    stubber.assert_no_pending_responses()
+
+
+def test_backoff_delay_is_capped(stop_dev, stub_client, backoff_ceilings, monkeypatch):
+    monkeypatch.setattr(stop_dev, 'MAX_THROTTLE_RETRIES', 8)
+    client, stubber = stub_client('ec2', REGION)
+    for _ in range(8):
+        stubber.add_client_error('stop_instances', 'RequestLimitExceeded')
+    stubber.add_response('stop_instances', {})
+
+    stop_dev.call_with_backoff(stop_dev.AdaptiveTokenBucket(1000), client.stop_instances, InstanceIds=['i-1'])
+
+    assert max(backoff_ceilings) == stop_dev.BACKOFF_CAP_SECONDS
+    stubber.assert_no_pending_responses()
+
+
+def test_throttled_chunk_fails_whole_after_last_retry(stop_dev, stub_client, backoff_ceilings, monkeypatch):
+    monkeypatch.setattr(stop_dev, 'MAX_THROTTLE_RETRIES', 2)
+    client, stubber = stub_client('ec2', REGION)
+    for _ in range(3):
+        stubber.add_client_error('stop_instances', 'RequestLimitExceeded', expected_params={'InstanceIds': ['i-1', 'i-2']})
+
+    outcomes = stop_dev.stop_instance_chunk(client, ['i-1', 'i-2'], TAGS, stop_dev.AdaptiveTokenBucket(10))
+
+    # A throttled chunk is not split, which would only multiply the calls
+    assert {outcome['status'] for outcome in outcomes.values()} == {'failed'}
+    assert 'RequestLimitExceeded' in outcomes['i-1']['error']
+    stubber.assert_no_pending_responses()
+
+
+def test_other_errors_split_the_chunk(stop_dev, stub_client, backoff_ceilings):
+    client, stubber = stub_client('ec2', REGION)
+    stubber.add_client_error('stop_instances', 'IncorrectInstanceState', expected_params={'InstanceIds': ['i-1', 'i-2']})
+    stubber.add_response('stop_instances', {}, {'InstanceIds': ['i-1']})
+    stubber.add_response('create_tags', {}, {'Resources': ['i-1'], 'Tags': TAGS})
+    stubber.add_client_error('stop_instances', 'IncorrectInstanceState', expected_params={'InstanceIds': ['i-2']})
+    bucket = stop_dev.AdaptiveTokenBucket(10)
+
+    outcomes = stop_dev.stop_instance_chunk(client, ['i-1', 'i-2'], TAGS, bucket)
+
+    assert outcomes['i-1'] == {'status': 'stopped'}
+    assert outcomes['i-2']['status'] == 'failed'
+    assert backoff_ceilings == [] and bucket.rate == 10
+    stubber.assert_no_pending_responses()
@@ -0,0 +1,81 @@
+"""
+The resume trigger restarts every resource a budget action stopped, so it
+must only fire when spend is known to be under the threshold
+"""
+
+import pytest
+
+DEVELOPMENT = 'Development-Account-Monthly-Budget'
+PRODUCTION = 'Production-Workload-Monthly-Budget'
+
+
+@pytest.mark.parametrize('detail, threshold, expected', [
+    ({'currentSpend': 3000, 'budgetAmount': 5000}, 80, True),
+    ({'currentSpend': '3999.99', 'budgetAmount': '5000'}, '80', True),
+    ({'currentSpend': 4000, 'budgetAmount': 5000}, 80, False),
+    ({'currentSpend': 6000, 'budgetAmount': 5000}, 100, False),
+    ({'budgetAmount': 5000}, 100, False),
+    ({'currentSpend': 10, 'budgetAmount': 5000, 'notificationType': 'FORECASTED'}, 100, False),
+])
+def test_under_threshold(stop_dev, detail, threshold, expected):
+    assert stop_dev.is_under_threshold(detail, threshold, DEVELOPMENT) is expected
+
+
+@pytest.mark.parametrize('detail, threshold', [
+    ({'currentSpend': 'n/a', 'budgetAmount': 5000}, 100),
+    ({'currentSpend': None, 'budgetAmount': 5000}, 100),
+    ({'currentSpend': 'NaN', 'budgetAmount': 5000}, 100),
+    ({'currentSpend': 10, 'budgetAmount': 'unknown'}, 100),
+    ({'currentSpend': 10, 'budgetAmount': 0}, 100),
+    ({'currentSpend': 10, 'budgetAmount': {'Amount': 5000}}, 100),
+    ({'currentSpend': 10, 'budgetAmount': 5000}, 'high'),
+])
+def test_unparsable_figures_do_not_resume(stop_dev, detail, threshold):
+    assert stop_dev.is_under_threshold(detail, threshold, DEVELOPMENT) is False
+
+
+def test_limit_comes_from_the_named_budget(stop_dev):
+    # 6000 is over half the development limit (5000) but under half the production one (20000)
+    detail = {'currentSpend': 6000}
+    assert stop_dev.is_under_threshold(detail, 50, PRODUCTION) is True
+    assert stop_dev.is_under_threshold(detail, 50, DEVELOPMENT) is False
+
+
+def test_unknown_budget_does_not_resume(stop_dev):
+    assert stop_dev.is_under_threshold({'currentSpend': 1}, 100, 'No-Such-Budget') is False
+
+
+def handler_calls(stop_dev, monkeypatch, event):
+    """Run the handler with discovery stubbed out; returns what it did"""
+    calls = []
+    monkeypatch.setattr(stop_dev, 'RESUME_ENABLED', True)
+    monkeypatch.setattr(stop_dev, 'pending_restarts', lambda *args, **kwargs: calls.append('pending') or [])
+    monkeypatch.setattr(stop_dev, 'resume_stopped_resources',
+                        lambda entries, deadline=None: calls.append('resume') or {'statusCode': 200})
+    monkeypatch.setattr(stop_dev, 'get_sweep_targets', lambda: calls.append('stop') or [])
+    stop_dev.handle_event(event)
+    return calls
+
+
+def test_handler_resumes_when_under_threshold(stop_dev, monkeypatch):
+    event = {'detail': {'budgetName': DEVELOPMENT, 'threshold': 100, 'currentSpend': 100, 'budgetAmount': 5000}}
+    assert handler_calls(stop_dev, monkeypatch, event) == ['pending', 'resume']
+
+
+@pytest.mark.parametrize('detail', [
+    {'budgetName': DEVELOPMENT, 'threshold': 100, 'currentSpend': 'pending', 'budgetAmount': 5000},
+    {'budgetName': DEVELOPMENT, 'threshold': 100, 'currentSpend': 6000, 'budgetAmount': 5000},
+    {'budgetName': DEVELOPMENT, 'threshold': 100},
+])
+def test_handler_stops_instead_of_resuming(stop_dev, monkeypatch, detail):
+    assert handler_calls(stop_dev, monkeypatch, {'detail': detail}) == ['stop']
+
+
+def test_handler_does_not_resume_when_disabled(stop_dev, monkeypatch):
+    event = {'detail': {'budgetName': DEVELOPMENT, 'threshold': 100, 'currentSpend': 100, 'budgetAmount': 5000}}
+    calls = []
+    monkeypatch.setattr(stop_dev, 'RESUME_ENABLED', False)
+    monkeypatch.setattr(stop_dev, 'resume_stopped_resources', lambda *args, **kwargs: calls.append('resume'))
+    monkeypatch.setattr(stop_dev, 'get_sweep_targets', lambda: calls.append('stop') or [])
+    stop_dev.handle_event(event)
+    assert calls == ['stop']
@@ -0,0 +1,143 @@
+"""
+Resumes rebuild their work from the AutoStopped tags on stopped resources,
+so a fresh container with an empty journal still restarts everything a
+budget action stopped, in rate-limited waves
+"""
+
+import json
+import time
+from datetime import datetime, timezone
+
+import pytest
+from botocore.stub import ANY
+
+from resume_journal import stop_tags
+
+BUDGET = 'Development-Account-Monthly-Budget'
+REGION = 'us-east-1'
+REASON = 'Development budget threshold exceeded'
+STOPPED_AT = datetime(2026, 9, 30, tzinfo=timezone.utc).timestamp()
+STOPPED_FILTERS = [
+    {'Name': 'tag:AutoStoppedBy', 'Values': ['BudgetAction']},
+    {'Name': 'instance-state-name', 'Values': ['stopping', 'stopped']}
+]
+UNTAG = [{'Key': key} for key in ['AutoStoppedBy', 'AutoStoppedAt', 'AutoStoppedReason', 'AutoStoppedBudget', 'AutoStoppedThreshold']]
+
+
+def stopped_instance(instance_id, minutes_after=0, budget_name=BUDGET, tags=None):
+    if tags is None:
+        tags = stop_tags(budget_name, 100, REASON, now=STOPPED_AT + minutes_after * 60)
+    return {
+        'InstanceId': instance_id,
+        'InstanceType': 't3.micro',
+        'State': {'Name': 'stopped'},
+        'Tags': [{'Key': 'Environment', 'Value': 'Development'}] + tags
+    }
+
+
+def stub_discovery(ec2, instances):
+    ec2.add_response(
+        'describe_instances',
+        {'Reservations': [{'Instances': instances}]},
+        {'Filters': STOPPED_FILTERS, 'MaxResults': ANY}
+    )
+
+
+def stub_start(ec2, instance_ids):
+    ec2.add_response('start_instances', {}, {'InstanceIds': instance_ids})
+    ec2.add_response('delete_tags', {}, {'Resources': instance_ids, 'Tags': UNTAG})
+
+
+@pytest.fixture
+def resume(stop_dev, monkeypatch):
+    monkeypatch.setattr(stop_dev, 'ENABLED_ENFORCERS', ['ec2'])
+    monkeypatch.setattr(stop_dev, 'get_sweep_targets', lambda: [(None, REGION)])
+    monkeypatch.setattr(stop_dev, 'RESUME_WAVE_SIZE', 2)
+    monkeypatch.setattr(stop_dev, 'RESUME_WAVE_INTERVAL_SECONDS', 0)
+    return stop_dev
+
+
+def test_waves_are_rebuilt_from_tags_with_an_empty_journal(resume, stub_client):
+    _, ec2 = stub_client('ec2', REGION)
+    stub_discovery(ec2, [
+        stopped_instance('i-3', minutes_after=30),
+        stopped_instance('i-1'),
+        stopped_instance('i-other', budget_name='Production-Workload-Monthly-Budget'),
+        stopped_instance('i-manual', tags=[{'Key': 'AutoStoppedBy', 'Value': 'Someone'}]),
+        stopped_instance('i-2', minutes_after=10)
+    ])
+    assert resume.get_resume_journal().entries == {}
+
+    entries = resume.pending_restarts(BUDGET)
+    assert [entry['instance_id'] for entry in entries] == ['i-1', 'i-2', 'i-3']
+    assert {entry['period'] for entry in entries} == {'2026-09'}
+
+    # Oldest stops first, RESUME_WAVE_SIZE per wave
+    stub_start(ec2, ['i-1', 'i-2'])
+    stub_start(ec2, ['i-3'])
+    body = json.loads(resume.resume_stopped_resources(entries)['body'])
+
+    assert (body['waves'], body['remaining']) == (2, 0)
+    assert [entry['instance_id'] for entry in body['resumed']] == ['i-1', 'i-2', 'i-3']
+    assert [entry['instance_id'] for entry in resume.get_resume_journal().pending()] == ['i-other']
+    ec2.assert_no_pending_responses()
+
+
+def test_scheduled_resume_only_restarts_earlier_periods(resume, stub_client, monkeypatch):
+    monkeypatch.setattr(resume, 'budget_period', lambda: '2026-10')
+    _, ec2 = stub_client('ec2', REGION)
+    this_period = stop_tags(BUDGET, 100, REASON, now=datetime(2026, 10, 2, tzinfo=timezone.utc).timestamp())
+    stub_discovery(ec2, [stopped_instance('i-1'), stopped_instance('i-now', tags=this_period)])
+    stub_start(ec2, ['i-1'])
+
+    body = json.loads(resume.handle_event({'action': 'resume'})['body'])
+
+    assert [entry['instance_id'] for entry in body['resumed']] == ['i-1']
+    assert [entry['instance_id'] for entry in resume.get_resume_journal().pending()] == ['i-now']
+    ec2.assert_no_pending_responses()
+
+
+def test_deadline_leaves_later_waves_journaled(resume, stub_client, monkeypatch):
+    monkeypatch.setattr(resume, 'RESUME_WAVE_INTERVAL_SECONDS', 60)
+    _, ec2 = stub_client('ec2', REGION)
+    stub_discovery(ec2, [stopped_instance('i-1'), stopped_instance('i-2', 10), stopped_instance('i-3', 20)])
+    entries = resume.pending_restarts(BUDGET)
+    stub_start(ec2, ['i-1', 'i-2'])
+
+    body = json.loads(resume.resume_stopped_resources(entries, deadline=time.monotonic() + 5)['body'])
+
+    assert (body['waves'], body['remaining']) == (1, 1)
+    assert [entry['instance_id'] for entry in resume.get_resume_journal().pending()] == ['i-3']
+    ec2.assert_no_pending_responses()
+
+
+def test_missing_instance_is_dropped_and_failures_are_retried(resume, stub_client):
+    _, ec2 = stub_client('ec2', REGION)
+    stub_discovery(ec2, [stopped_instance('i-gone'), stopped_instance('i-stuck', 10)])
+    entries = resume.pending_restarts(BUDGET)
+    ec2.add_client_error('start_instances', 'InvalidInstanceID.NotFound', expected_params={'InstanceIds': ['i-gone', 'i-stuck']})
+    ec2.add_client_error('start_instances', 'InvalidInstanceID.NotFound', expected_params={'InstanceIds': ['i-gone']})
+    ec2.add_client_error('start_instances', 'IncorrectInstanceState', expected_params={'InstanceIds': ['i-stuck']})
+
+    body = json.loads(resume.resume_stopped_resources(entries)['body'])
+
+    assert [(entry['instance_id'], entry.get('missing')) for entry in body['resumed']] == [('i-gone', True)]
+    assert [entry['instance_id'] for entry in body['failed']] == ['i-stuck']
+    [pending] = resume.get_resume_journal().pending()
+    assert (pending['instance_id'], pending['attempts']) == ('i-stuck', 1)
+    ec2.assert_no_pending_responses()
+
+
+def test_unswept_region_keeps_its_journal_entries(resume, stub_client):
+    resume.get_resume_journal().record_stops(
+        [{'resource_type': 'ec2-instance', 'instance_id': 'i-1', 'region': REGION}], BUDGET, 100, REASON, now=STOPPED_AT
+    )
+    _, ec2 = stub_client('ec2', REGION)
+    ec2.add_client_error('describe_instances', 'UnauthorizedOperation', http_status_code=403)
+
+    assert [entry['instance_id'] for entry in resume.pending_restarts(BUDGET)] == ['i-1']
+
+    # Once the region is swept and the tags are gone (restarted by hand), the entry goes
+    stub_discovery(ec2, [])
+    assert resume.pending_restarts(BUDGET) == []
+    ec2.assert_no_pending_responses()
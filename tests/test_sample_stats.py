@@ -0,0 +1,17 @@
+import pytest
+
+from sample_stats import percentile
+
+
+@pytest.mark.parametrize('samples, pct, expected', [
+    (range(1, 11), 50, 5),
+    (range(1, 21), 95, 19),
+    (range(1, 101), 99, 99),
+    (range(1, 101), 100, 100),
+    (range(1, 11), 0, 1),
+    (range(1, 12), 50, 6),
+    ([7], 99, 7),
+    ([3, 1, 2], 50, 2),
+])
+def test_nearest_rank(samples, pct, expected):
+    assert percentile(list(samples), pct) == expected
@@ -0,0 +1,131 @@
+"""
+Region sweeps must report every account/region pair, and a pair that runs
+past its timeout must stop making API calls while still reporting what it
+already stopped
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+REGION = 'us-east-1'
+
+
+def instance(instance_id):
+    return {
+        'InstanceId': instance_id,
+        'InstanceType': 't3.micro',
+        'LaunchTime': datetime(2026, 1, 1, tzinfo=timezone.utc),
+        'State': {'Name': 'running'},
+        'Tags': [{'Key': 'Environment', 'Value': 'Development'}]
+    }
+
+
+@pytest.fixture
+def ec2_only(stop_dev, monkeypatch):
+    monkeypatch.setattr(stop_dev, 'ENABLED_ENFORCERS', ['ec2'])
+    monkeypatch.setattr(stop_dev, 'INVENTORY_ENABLED', False)
+    return stop_dev
+
+
+def test_results_keep_target_order(stop_dev):
+    targets = [(None, 'us-east-1'), ('111111111111', 'eu-west-1'), (None, 'ap-south-1')]
+    results = stop_dev.sweep_targets(targets, 2, 5, worker=lambda region, account: {'stopped': [region]})
+    assert [(r['account'], r['region'], r['status']) for r in results] == [
+        (None, 'us-east-1', 'ok'), ('111111111111', 'eu-west-1', 'ok'), (None, 'ap-south-1', 'ok')
+    ]
+    assert [r['stopped'] for r in results] == [['us-east-1'], ['eu-west-1'], ['ap-south-1']]
+
+
+def test_worker_error_is_reported_per_pair(stop_dev):
+    def worker(region, account):
+        if region == 'eu-west-1':
+            raise RuntimeError('boom')
+        return {'stopped': []}
+
+    results = stop_dev.sweep_targets([(None, 'us-east-1'), (None, 'eu-west-1')], 2, 5, worker=worker)
+    assert [r['status'] for r in results] == ['ok', 'error']
+    assert results[1]['error'] == 'boom'
+
+
+def test_timed_out_region_stops_calling_aws(ec2_only, stub_client, monkeypatch):
+    stop_dev = ec2_only
+    monkeypatch.setattr(stop_dev.EC2Enforcer, 'batch_size', 1)
+    monkeypatch.setattr(stop_dev, 'CHUNK_CONCURRENCY', 1)
+    client, stubber = stub_client('ec2', REGION)
+    stubber.add_response('describe_instances', {'Reservations': [{'Instances': [instance('i-1'), instance('i-2')]}]})
+    stubber.add_response('stop_instances', {}, {'InstanceIds': ['i-1']})
+    stubber.add_response('create_tags', {})
+    # The first stop outlasts the region timeout; no stub is queued for i-2
+    client.meta.events.register_first('before-parameter-build.ec2.StopInstances', lambda **kwargs: time.sleep(0.5))
+
+    [result] = stop_dev.sweep_targets([(None, REGION)], 1, 0.2)
+
+    assert result['status'] == 'timeout'
+    assert result['outcome'] == 'cancelled'
+    assert [r['instance_id'] for r in result['stopped']] == ['i-1']
+    assert [r['instance_id'] for r in result['failed']] == ['i-2']
+    assert 'Region timed out' in result['failed'][0]['error']
+    # i-1 was tagged after the cancel, so a resume can still find it
+    stubber.assert_no_pending_responses()
+
+
+def test_cancelled_discovery_fetches_no_more_pages(ec2_only, stub_client):
+    stop_dev = ec2_only
+    client, stubber = stub_client('ec2', REGION)
+    stubber.add_response('describe_instances', {'Reservations': [{'Instances': [instance('i-1')]}], 'NextToken': 'page-2'})
+    client.meta.events.register_first('before-parameter-build.ec2.DescribeInstances', lambda **kwargs: time.sleep(0.5))
+
+    [result] = stop_dev.sweep_targets([(None, REGION)], 1, 0.2)
+
+    assert (result['status'], result['outcome']) == ('timeout', 'cancelled')
+    assert 'Region timed out' in result['error']
+    stubber.assert_no_pending_responses()
+
+
+def test_region_still_running_after_join_is_unknown(stop_dev, monkeypatch):
+    monkeypatch.setattr(stop_dev, 'SWEEP_JOIN_SECONDS', 0.1)
+    release = threading.Event()
+
+    def stuck(region, account):
+        release.wait(5)
+        return {'stopped': []}
+
+    try:
+        [result] = stop_dev.sweep_targets([(None, REGION)], 1, 0.1, worker=stuck)
+    finally:
+        release.set()
+    assert (result['status'], result['outcome']) == ('timeout', 'unknown')
+
+
+def test_deadline_skips_regions_that_never_started(stop_dev, monkeypatch):
+    monkeypatch.setattr(stop_dev, 'SWEEP_JOIN_SECONDS', 1)
+    started = []
+
+    def worker(region, account):
+        started.append(region)
+        while True:
+            stop_dev.check_cancelled()
+            time.sleep(0.01)
+
+    targets = [(None, 'us-east-1'), (None, 'eu-west-1')]
+    results = stop_dev.sweep_targets(targets, 1, 60, worker=worker, deadline=time.monotonic() + 0.2)
+
+    assert started == ['us-east-1']
+    assert results[0]['outcome'] == 'cancelled'
+    assert (results[1]['status'], results[1]['outcome']) == ('timeout', 'not started')
+
+
+def test_cancel_raises_before_the_next_call(stop_dev):
+    cancel = threading.Event()
+    cancel.set()
+    token = stop_dev._sweep_cancel.set(cancel)
+    try:
+        with pytest.raises(stop_dev.SweepCancelled):
+            stop_dev.call_with_backoff(stop_dev.AdaptiveTokenBucket(10), lambda: pytest.fail('API called'))
+        with stop_dev.uncancellable():
+            assert stop_dev.call_with_backoff(stop_dev.AdaptiveTokenBucket(10), lambda: 'tagged') == 'tagged'
+    finally:
+        stop_dev._sweep_cancel.reset(token)